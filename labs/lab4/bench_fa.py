@@ -0,0 +1,113 @@
+import argparse
+import random
+import time
+from typing import List
+
+from fa import DFA, FA
+from grammar import Grammar, parse_grammar_file
+
+
+def with_redundant_copies(g: Grammar, copies: int, rng: random.Random) -> Grammar:
+    """
+    Same language, but every nonterminal is cloned `copies` times and each
+    production points to a random clone (like machine-generated grammars).
+    """
+    r = Grammar()
+    for name in g.terminals:
+        r.add_terminal(name)
+    clone = [[r.add_nonterminal(f"{name}#{k}") for k in range(copies)]
+             for name in g.nonterminals]
+    r.start_nt = clone[g.start_nt][0]
+    for p in g.prods:
+        for left in clone[p.left_nt]:
+            right = rng.choice(clone[p.right_nt]) if p.has_right_nt else -1
+            r.add_production(left, p.is_epsilon, p.has_terminal, p.terminal,
+                             p.has_right_nt, right)
+    return r
+
+
+def random_words(dfa: DFA, count: int, max_len: int, rng: random.Random) -> List[List[int]]:
+    """Random walks from the start state, cut at an accepting state."""
+    words = []
+    n = dfa.num_terminals
+    while len(words) < count:
+        s = dfa.start_state
+        word: List[int] = []
+        while len(word) < max_len:
+            choices = [t for t in range(n) if dfa.table[s * n + t] != -1]
+            if not choices:
+                break
+            t = rng.choice(choices)
+            word.append(t)
+            s = dfa.table[s * n + t]
+            if dfa.accepting[s] and rng.random() < 1 / max_len:
+                break
+        words.append(word)
+    return words
+
+
+def throughput(dfa: DFA, words: List[List[int]]) -> float:
+    symbols = sum(len(w) for w in words)
+    accepts = dfa.accepts_indices
+    start = time.perf_counter()
+    for w in words:
+        accepts(w)
+    return symbols / (time.perf_counter() - start)
+
+
+def batch_throughput(dfa: DFA, words: List[List[int]]) -> float:
+    import numpy as np
+
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in words], out=offsets[1:])
+    symbols = np.fromiter((t for w in words for t in w), dtype=np.int32, count=int(offsets[-1]))
+    start = time.perf_counter()
+    dfa.accepts_packed(symbols, offsets)
+    return int(offsets[-1]) / (time.perf_counter() - start)
+
+
+def bench(path: str, copies: int, words: int, max_len: int, seed: int,
+          batch: bool = False) -> None:
+    rng = random.Random(seed)
+    g = parse_grammar_file(path)
+    if copies > 1:
+        g = with_redundant_copies(g, copies, rng)
+
+    start = time.perf_counter()
+    fa = FA.from_grammar(g)
+    dfa = fa.to_dfa()
+    t_dfa = time.perf_counter() - start
+    start = time.perf_counter()
+    minimal = dfa.minimize()
+    t_min = time.perf_counter() - start
+
+    sample = random_words(minimal, words, max_len, rng)
+    print(f"{path} (x{copies} nonterminal copies)")
+    print(f"  states: NFA {fa.num_states}, DFA {dfa.num_states}, minimal {minimal.num_states}")
+    print(f"  build:  determinise {t_dfa * 1000:.2f} ms, minimise {t_min * 1000:.2f} ms")
+    print(f"  DFA     {throughput(dfa, sample) / 1e6:.2f} M symbols/s")
+    print(f"  minimal {throughput(minimal, sample) / 1e6:.2f} M symbols/s")
+    if batch:
+        try:
+            rate = batch_throughput(minimal, sample)
+        except ImportError:
+            print("  batch   skipped (numpy not installed)")
+        else:
+            print(f"  batch   {rate / 1e6:.2f} M symbols/s (NumPy, all words at once)")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="State counts and matching throughput of the lab4 automata")
+    arg_parser.add_argument("grammars", nargs="*",
+                            default=["grammar_identifiers.txt", "grammar_strings.txt"])
+    arg_parser.add_argument("--copies", type=int, default=1,
+                            help="clone every nonterminal this many times first")
+    arg_parser.add_argument("--words", type=int, default=20000)
+    arg_parser.add_argument("--max-len", type=int, default=64)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--batch", action="store_true",
+                            help="also time the vectorised accepts_packed path")
+    args = arg_parser.parse_args()
+
+    for path in args.grammars:
+        bench(path, args.copies, args.words, args.max_len, args.seed, args.batch)
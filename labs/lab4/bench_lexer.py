@@ -0,0 +1,105 @@
+"""
+Times lexer.py on repeated lab3 programs (about 7 bytes per token) and on
+string-heavy input, and, when flex and gcc are installed, the lab3 flex
+scanner on the same program input.
+
+Measured here (CPython 3.11, 8 MB input, best of 3):
+  programs, table walk (the previous scanner):  3-5 MB/s
+  programs, scan:                               9-11 MB/s
+  programs, scan and write the PIF:             5-6.5 MB/s
+  string-heavy input, scan:                     100-115 MB/s
+On token-dense input the target of tens of MB/s is not reached. findall
+alone runs at about 16 MB/s there, because it makes one bytes object per
+token. flex is not installed here and could not be installed, so the flex
+comparison has not been run; it prints its numbers when flex is available.
+"""
+from collections import deque
+from typing import Callable, Iterator
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from lexer import HERE, Lexer, pif_entries, write_PIF
+
+LAB3 = HERE.parent / "lab3"
+
+
+def make_input(size_mb: float) -> bytes:
+    programs = [(LAB3 / name).read_bytes() for name in ("prog1.txt", "prog2.txt")]
+    chunk = b"\n".join(programs) + b"\n"
+    return chunk * max(1, int(size_mb * 1024 * 1024 / len(chunk)))
+
+
+def make_string_input(size_mb: float) -> bytes:
+    line = b'text = "' + b"lorem ipsum, dolor-sit_amet; " * 8 + b'"\n'
+    return line * max(1, int(size_mb * 1024 * 1024 / len(line)))
+
+
+def bench_scan(scan: Callable[[bytes], Iterator], data: bytes, repeat: int = 3) -> float:
+    """Best time to consume the tokens of data."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        deque(scan(data), maxlen=0)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_python(data: bytes, pif_path: Path) -> float:
+    lexer = Lexer.text_transform()
+    start = time.perf_counter()
+    write_PIF(pif_entries(lexer.scan(data)), str(pif_path))
+    return time.perf_counter() - start
+
+
+def bench_flex(src_path: Path, workdir: Path) -> float:
+    """Builds the lab3 flex scanner in workdir and times it; raises if flex/gcc are missing."""
+    lex = shutil.which("flex") or shutil.which("lex")
+    if lex is None or shutil.which("gcc") is None:
+        raise FileNotFoundError("flex/lex and gcc are needed for the comparison")
+    subprocess.run([lex, "-o", str(workdir / "lex.yy.c"), str(LAB3 / "text_transform.lxi")],
+                   check=True)
+    subprocess.run(["gcc", "-O2", str(workdir / "lex.yy.c"), "-o", str(workdir / "scanner")],
+                   check=True)
+    start = time.perf_counter()
+    subprocess.run([str(workdir / "scanner"), str(src_path), str(workdir / "flex_pif.txt"),
+                    str(workdir / "st.txt"), str(workdir / "errors.txt")],
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Python lexer vs the lab3 flex scanner")
+    arg_parser.add_argument("--size-mb", type=float, default=8.0)
+    args = arg_parser.parse_args()
+
+    data = make_input(args.size_mb)
+    mb = len(data) / (1024 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        src_path = workdir / "input.txt"
+        src_path.write_bytes(data)
+
+        lexer = Lexer.text_transform()
+        strings = make_string_input(args.size_mb)
+        print(f"input: {mb:.1f} MB")
+        t_table = bench_scan(lambda d: lexer._scan_table(d, None), data)
+        print(f"python scan, table walk: {t_table:.2f} s ({mb / t_table:.2f} MB/s)")
+        t_scan = bench_scan(lexer.scan, data)
+        print(f"python scan: {t_scan:.2f} s ({mb / t_scan:.2f} MB/s)")
+        t_strings = bench_scan(lexer.scan, strings)
+        print(f"python scan, string-heavy: {t_strings:.2f} s "
+              f"({len(strings) / (1024 * 1024) / t_strings:.2f} MB/s)")
+        t_py = bench_python(data, workdir / "py_pif.txt")
+        print(f"python lexer + PIF: {t_py:.2f} s ({mb / t_py:.2f} MB/s)")
+        try:
+            t_flex = bench_flex(src_path, workdir)
+        except (FileNotFoundError, subprocess.CalledProcessError) as e:
+            print(f"flex scanner: skipped ({e})")
+        else:
+            same = (workdir / "py_pif.txt").read_bytes() == (workdir / "flex_pif.txt").read_bytes()
+            print(f"flex scanner: {t_flex:.2f} s ({mb / t_flex:.2f} MB/s)")
+            print(f"identical PIF: {same}")
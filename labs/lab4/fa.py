@@ -1,7 +1,7 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from grammar import Grammar
+from grammar import Grammar, describe_bytes
 
 
 @dataclass
@@ -16,6 +16,9 @@ class FA:
     accepting: List[int]
     transitions: List[List[int]]
 
+    # byte -> terminal index, set when the terminals are byte classes
+    byte_lut: Optional[bytes] = None
+
 
     @staticmethod
     def from_grammar(g: Grammar) -> "FA":
@@ -97,4 +100,403 @@ class FA:
                 )
 
         lines.append("=== END FA ===")
+        return "\n".join(lines)
+
+    def with_byte_classes(self) -> "FA":
+        """
+        Same automaton over byte classes instead of grammar terminals: bytes
+        matched by exactly the same set of terminals share a class, so the
+        alphabet is as narrow as the number of distinct classes. byte_lut maps
+        every byte to its class (a class with no terminals has no transitions).
+        """
+        byte_lut, class_terminals = byte_classes(self.grammar)
+        n_classes = len(class_terminals)
+        transitions = [[0] * n_classes for _ in range(self.num_states)]
+        for s in range(self.num_states):
+            row = self.transitions[s]
+            for c, terminals in enumerate(class_terminals):
+                mask = 0
+                for t in terminals:
+                    mask |= row[t]
+                transitions[s][c] = mask
+
+        names = []
+        for c in range(n_classes):
+            members = [b for b in range(256) if byte_lut[b] == c]
+            names.append(describe_bytes(members))
+
+        return FA(
+            grammar=self.grammar,
+            num_states=self.num_states,
+            start_state=self.start_state,
+            num_terminals=n_classes,
+            terminal_names=names,
+            accepting=list(self.accepting),
+            transitions=transitions,
+            byte_lut=byte_lut,
+        )
+
+    def to_dfa(self) -> "DFA":
+        """
+        Subset construction over the bitmask encoding: every DFA state is a
+        bitmask of NFA states and only subsets reachable from the start state
+        are explored. The empty subset is the dead state (-1), not stored.
+        """
+        accepting_mask = 0
+        for s in range(self.num_states):
+            if self.accepting[s]:
+                accepting_mask |= 1 << s
+
+        start_subset = 1 << self.start_state
+        subset_id: Dict[int, int] = {start_subset: 0}
+        subsets: List[int] = [start_subset]
+        table: List[int] = []
+
+        i = 0
+        while i < len(subsets):
+            subset = subsets[i]
+            i += 1
+            members = [s for s in range(self.num_states) if subset >> s & 1]
+            for t in range(self.num_terminals):
+                dest = 0
+                for s in members:
+                    dest |= self.transitions[s][t]
+                if dest == 0:
+                    table.append(-1)
+                    continue
+                d = subset_id.get(dest)
+                if d is None:
+                    d = len(subsets)
+                    subset_id[dest] = d
+                    subsets.append(dest)
+                table.append(d)
+
+        return DFA(
+            num_states=len(subsets),
+            start_state=0,
+            num_terminals=self.num_terminals,
+            terminal_names=list(self.terminal_names),
+            accepting=[1 if subset & accepting_mask else 0 for subset in subsets],
+            table=table,
+            subsets=subsets,
+            byte_lut=self.byte_lut,
+        )
+
+
+def byte_classes(g: Grammar) -> Tuple[bytes, List[List[int]]]:
+    """
+    Partitions the 256 byte values by the set of terminals matching them.
+    Returns (lut, class_terminals): lut[b] is the class of byte b and
+    class_terminals[c] the terminals matched by class c.
+    """
+    membership = [0] * 256
+    for t in range(len(g.terminals)):
+        for b in g.terminal_bytes(t):
+            membership[b] |= 1 << t
+
+    class_of: Dict[int, int] = {}
+    class_terminals: List[List[int]] = []
+    lut = bytearray(256)
+    for b in range(256):
+        mask = membership[b]
+        c = class_of.get(mask)
+        if c is None:
+            c = len(class_terminals)
+            class_of[mask] = c
+            class_terminals.append([t for t in range(mask.bit_length()) if mask >> t & 1])
+        lut[b] = c
+    return bytes(lut), class_terminals
+
+
+@dataclass
+class DFA:
+    num_states: int
+    start_state: int
+    num_terminals: int
+
+    terminal_names: List[str]
+    accepting: List[int]
+    # table[s * num_terminals + t] = next state, -1 = dead
+    table: List[int]
+    # NFA states (bitmask) behind every DFA state
+    subsets: List[int]
+    # byte -> terminal (class) index, when built from FA.with_byte_classes
+    byte_lut: Optional[bytes] = None
+
+    terminal_index: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.terminal_index = {name: t for t, name in enumerate(self.terminal_names)}
+
+    def encode(self, symbols: Sequence[str]) -> List[int]:
+        try:
+            return [self.terminal_index[x] for x in symbols]
+        except KeyError as e:
+            raise ValueError(f"Symbol {e.args[0]} is not a terminal of the automaton")
+
+    def run(self, indices: Sequence[int]) -> int:
+        """State reached after consuming the terminal indices (-1 = rejected)."""
+        table = self.table
+        n = self.num_terminals
+        s = self.start_state
+        for t in indices:
+            s = table[s * n + t]
+            if s < 0:
+                return -1
+        return s
+
+    def accepts_indices(self, indices: Sequence[int]) -> bool:
+        s = self.run(indices)
+        return s >= 0 and self.accepting[s] == 1
+
+    def accepts(self, symbols: Sequence[str]) -> bool:
+        return self.accepts_indices(self.encode(symbols))
+
+    def match_prefix_indices(self, indices: Sequence[int]) -> int:
+        """Length of the longest accepted prefix, -1 if there is none."""
+        table = self.table
+        accepting = self.accepting
+        n = self.num_terminals
+        s = self.start_state
+        longest = 0 if accepting[s] else -1
+        for i, t in enumerate(indices):
+            s = table[s * n + t]
+            if s < 0:
+                break
+            if accepting[s]:
+                longest = i + 1
+        return longest
+
+    def match_prefix(self, symbols: Sequence[str]) -> int:
+        return self.match_prefix_indices(self.encode(symbols))
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        """Runs on raw bytes: one class lookup and one table lookup per byte."""
+        lut = self.byte_lut
+        if lut is None:
+            raise ValueError("DFA has no byte classes (use FA.with_byte_classes)")
+        table = self.table
+        n = self.num_terminals
+        s = self.start_state
+        for b in data:
+            s = table[s * n + lut[b]]
+            if s < 0:
+                return False
+        return self.accepting[s] == 1
+
+    def match_bytes(self, data: bytes, start: int = 0) -> int:
+        """End of the longest accepted match of data[start:], -1 if none."""
+        lut = self.byte_lut
+        if lut is None:
+            raise ValueError("DFA has no byte classes (use FA.with_byte_classes)")
+        table = self.table
+        accepting = self.accepting
+        n = self.num_terminals
+        s = self.start_state
+        longest = start if accepting[s] else -1
+        for i in range(start, len(data)):
+            s = table[s * n + lut[data[i]]]
+            if s < 0:
+                break
+            if accepting[s]:
+                longest = i + 1
+        return longest
+
+    def accepts_batch(self, words: Sequence[Sequence[str]]):
+        """
+        Acceptance of many words (sequences of terminal names) at once.
+        Returns a NumPy bool array, see accepts_packed.
+        """
+        import numpy as np
+
+        lengths = np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words))
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        index = self.terminal_index
+        try:
+            symbols = np.fromiter((index[x] for w in words for x in w),
+                                  dtype=np.int32, count=int(offsets[-1]))
+        except KeyError as e:
+            raise ValueError(f"Symbol {e.args[0]} is not a terminal of the automaton")
+        return self.accepts_packed(symbols, offsets)
+
+    def accepts_packed(self, symbols, offsets):
+        """
+        Vectorised acceptance: word i is symbols[offsets[i]:offsets[i + 1]]
+        (terminal indices). All words advance through the table together, one
+        NumPy gather per position; words are sorted by length so the rows still
+        running are always a prefix and finished rows drop out.
+        """
+        import numpy as np
+
+        n_t = self.num_terminals
+        dead = self.num_states
+        table = np.asarray(self.table + [-1] * n_t, dtype=np.int64)
+        table[table < 0] = dead
+        accepting = np.asarray(self.accepting + [0], dtype=bool)
+
+        symbols = np.asarray(symbols)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if symbols.size and (symbols.min() < 0 or symbols.max() >= n_t):
+            raise ValueError("Terminal index out of range")
+        lengths = offsets[1:] - offsets[:-1]
+        order = np.argsort(-lengths, kind="stable")
+        starts = offsets[:-1][order]
+        sorted_lengths = lengths[order]
+
+        states = np.full(len(order), self.start_state, dtype=np.int64)
+        max_len = int(sorted_lengths[0]) if len(order) else 0
+        # number of words still running at step k
+        running = len(order) - np.searchsorted(sorted_lengths[::-1],
+                                               np.arange(max_len), side="right")
+        for k in range(max_len):
+            m = running[k]
+            states[:m] = table[states[:m] * n_t + symbols[starts[:m] + k]]
+
+        result = np.empty(len(order), dtype=bool)
+        result[order] = accepting[states]
+        return result
+
+    def minimize(self) -> "DFA":
+        """
+        Hopcroft's partition refinement (O(n k log n)). The missing transitions
+        go to an explicit dead state during refinement; the block containing it
+        becomes -1 again in the result. States are renumbered in BFS order.
+        """
+        n_t = self.num_terminals
+        dead = self.num_states
+        n = dead + 1
+
+        def delta(s: int, t: int) -> int:
+            if s == dead:
+                return dead
+            d = self.table[s * n_t + t]
+            return dead if d < 0 else d
+
+        inverse: List[List[List[int]]] = [[[] for _ in range(n)] for _ in range(n_t)]
+        for s in range(n):
+            for t in range(n_t):
+                inverse[t][delta(s, t)].append(s)
+
+        # blocks are contiguous slices first[b]:last[b] of elems; pos[q] is the
+        # index of q in elems, so marked states move to the front of their
+        # block in O(1) each and a split relabels only its smaller half
+        final = [s for s in range(self.num_states) if self.accepting[s]]
+        rest = [s for s in range(n) if s == dead or not self.accepting[s]]
+        elems = final + rest
+        pos = [0] * n
+        for i, q in enumerate(elems):
+            pos[q] = i
+        first: List[int] = []
+        last: List[int] = []
+        block_of = [0] * n
+        for lo, hi in ((0, len(final)), (len(final), n)):
+            if lo < hi:
+                for q in elems[lo:hi]:
+                    block_of[q] = len(first)
+                first.append(lo)
+                last.append(hi)
+        marked = [0] * len(first)
+
+        smallest = min(range(len(first)), key=lambda b: last[b] - first[b])
+        work = {(smallest, t) for t in range(n_t)}
+        while work:
+            splitter, t = work.pop()
+            touched: List[int] = []
+            for a in elems[first[splitter]:last[splitter]]:
+                for q in inverse[t][a]:
+                    b = block_of[q]
+                    if not marked[b]:
+                        touched.append(b)
+                    j = first[b] + marked[b]
+                    other = elems[j]
+                    elems[j], elems[pos[q]] = q, other
+                    pos[other], pos[q] = pos[q], j
+                    marked[b] += 1
+            for b in touched:
+                m, marked[b] = marked[b], 0
+                size = last[b] - first[b]
+                if m == size:
+                    continue
+                new_b = len(first)
+                if m <= size - m:  # the marked part is the new block
+                    lo, hi = first[b], first[b] + m
+                    first[b] = hi
+                else:
+                    lo, hi = first[b] + m, last[b]
+                    last[b] = lo
+                first.append(lo)
+                last.append(hi)
+                marked.append(0)
+                for q in elems[lo:hi]:
+                    block_of[q] = new_b
+                # the new block is the smaller half: it is enough whether or
+                # not (b, c) is still waiting
+                for c in range(n_t):
+                    work.add((new_b, c))
+
+        # renumber the live blocks in BFS order from the start block
+        dead_block = block_of[dead]
+        new_id: Dict[int, int] = {block_of[self.start_state]: 0}
+        order = [block_of[self.start_state]]
+        table: List[int] = []
+        i = 0
+        while i < len(order):
+            rep = elems[first[order[i]]]
+            i += 1
+            for t in range(n_t):
+                d = block_of[delta(rep, t)]
+                if d == dead_block:
+                    table.append(-1)
+                    continue
+                if d not in new_id:
+                    new_id[d] = len(order)
+                    order.append(d)
+                table.append(new_id[d])
+
+        subsets = []
+        for b in order:
+            mask = 0
+            for s in elems[first[b]:last[b]]:
+                if s != dead:
+                    mask |= self.subsets[s]
+            subsets.append(mask)
+
+        return DFA(
+            num_states=len(order),
+            start_state=0,
+            num_terminals=n_t,
+            terminal_names=list(self.terminal_names),
+            accepting=[self.accepting[elems[first[b]]] if elems[first[b]] != dead else 0
+                       for b in order],
+            table=table,
+            subsets=subsets,
+            byte_lut=self.byte_lut,
+        )
+
+    def toString(self) -> str:
+        lines: List[str] = [
+            "=== DFA ===",
+            f"States 0..{self.num_states - 1}:"
+        ]
+
+        for s in range(self.num_states):
+            members = [f"q{q}" for q in range(self.subsets[s].bit_length())
+                       if self.subsets[s] >> q & 1]
+            state_name = f"d{s} = {{ {' '.join(members)} }}"
+            if s == self.start_state:
+                state_name += " [START]"
+            if self.accepting[s]:
+                state_name += " [ACCEPT]"
+            lines.append("  " + state_name)
+
+        lines.append("")
+        lines.append("Transitions:")
+        for s in range(self.num_states):
+            for t in range(self.num_terminals):
+                d = self.table[s * self.num_terminals + t]
+                if d != -1:
+                    lines.append(f"  d{s} --{self.terminal_names[t]}--> d{d}")
+
+        lines.append("=== END DFA ===")
         return "\n".join(lines)
\ No newline at end of file
@@ -1,8 +1,8 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, FrozenSet, Iterable, List
 
 
-@dataclass
+@dataclass(slots=True)
 class Production:
     left_nt: int
     is_epsilon: bool
@@ -18,30 +18,57 @@ class Grammar:
         self.terminals: List[str] = []
         self.start_nt: int = -1
         self.prods: List[Production] = []
+        # name -> index into nonterminals / terminals
+        self._nt_index: Dict[str, int] = {}
+        self._t_index: Dict[str, int] = {}
+        # terminal index -> byte values it stands for (CLASS declarations)
+        self.char_classes: Dict[int, FrozenSet[int]] = {}
 
     # --- symbol table helpers ---
 
     def find_nonterminal(self, name: str) -> int:
-        try:
-            return self.nonterminals.index(name)
-        except ValueError:
-            return -1
+        return self._nt_index.get(name, -1)
 
     def find_terminal(self, name: str) -> int:
-        try:
-            return self.terminals.index(name)
-        except ValueError:
-            return -1
+        return self._t_index.get(name, -1)
 
     def add_nonterminal(self, name: str) -> int:
-        if name not in self.nonterminals:
+        idx = self._nt_index.get(name)
+        if idx is None:
+            idx = len(self.nonterminals)
+            self._nt_index[name] = idx
             self.nonterminals.append(name)
-        return self.find_nonterminal(name)
+        return idx
 
     def add_terminal(self, name: str) -> int:
-        if name not in self.terminals:
+        idx = self._t_index.get(name)
+        if idx is None:
+            idx = len(self.terminals)
+            self._t_index[name] = idx
             self.terminals.append(name)
-        return self.find_terminal(name)
+        return idx
+
+    def add_nonterminals(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.add_nonterminal(name)
+
+    def add_terminals(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.add_terminal(name)
+
+    def terminal_bytes(self, t: int) -> FrozenSet[int]:
+        """
+        Bytes matched by terminal t: its CLASS declaration, or the character
+        itself for quoted single-character terminals like '_' or ' '.
+        """
+        if t in self.char_classes:
+            return self.char_classes[t]
+        name = self.terminals[t]
+        if len(name) >= 3 and name[0] == "'" and name[-1] == "'":
+            chars = _unescape(name[1:-1])
+            if len(chars) == 1:
+                return frozenset(chars)
+        raise ValueError(f"Terminal {name} has no character class")
 
     def add_production(
         self,
@@ -53,14 +80,7 @@ class Grammar:
         right_nt: int,
     ):
         self.prods.append(
-            Production(
-                left_nt=left_nt,
-                is_epsilon=is_epsilon,
-                has_terminal=has_terminal,
-                terminal=terminal,
-                has_right_nt=has_right_nt,
-                right_nt=right_nt,
-            )
+            Production(left_nt, is_epsilon, has_terminal, terminal, has_right_nt, right_nt)
         )
 
     def __str__(self) -> str:
@@ -72,6 +92,9 @@ class Grammar:
         else:
             out.append("Start: <UNSET>")
 
+        for t, values in self.char_classes.items():
+            out.append(f"Class {self.terminals[t]}: {describe_bytes(values)}")
+
         out.append(f"Productions ({len(self.prods)}):")
         for p in self.prods:
             left_name = self.nonterminals[p.left_nt]
@@ -101,6 +124,69 @@ def _parse_comma_list(fragment: str) -> list[str]:
     return [p.strip() for p in parts if p.strip() != ""]
 
 
+def _unescape(text: str) -> List[int]:
+    """Characters of a class item as byte values; supports \\xNN, \\s and \\\\."""
+    values: List[int] = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt == "x" and i + 4 <= len(text):
+                values.append(int(text[i + 2:i + 4], 16))
+                i += 4
+                continue
+            if nxt == "s":
+                values.append(ord(" "))
+                i += 2
+                continue
+            values.append(ord(nxt))
+            i += 2
+            continue
+        values.extend(c.encode("utf-8"))
+        i += 1
+    return values
+
+
+def _parse_char_class(spec: str) -> FrozenSet[int]:
+    """
+    Whitespace-separated items; "a-z" is a range, anything else stands for
+    its own characters (so "_-" is '_' and '-').
+    """
+    values = set()
+    for item in spec.split():
+        chars = _unescape(item)
+        if len(chars) == 3 and chars[1] == ord("-"):
+            lo, hi = chars[0], chars[2]
+            if lo > hi:
+                raise ValueError(f"Bad range '{item}' in character class")
+            values.update(range(lo, hi + 1))
+        else:
+            values.update(chars)
+    if not values or max(values) > 255:
+        raise ValueError(f"Bad character class '{spec}'")
+    return frozenset(values)
+
+
+def describe_bytes(values: Iterable[int]) -> str:
+    def show(b: int) -> str:
+        return chr(b) if 33 <= b < 127 and chr(b) not in "\\[]-" else f"\\x{b:02x}"
+
+    values = sorted(values)
+    parts = []
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1] == values[j] + 1:
+            j += 1
+        if j - i >= 2:
+            parts.append(f"{show(values[i])}-{show(values[j])}")
+        else:
+            parts.extend(show(values[k]) for k in range(i, j + 1))
+        i = j + 1
+    return "[" + "".join(parts) + "]"
+
+
 def _handle_production_right(grammar: Grammar, left_idx: int, right_all: str):
     alts = [alt.strip() for alt in right_all.split("|")]
 
@@ -185,16 +271,12 @@ def parse_grammar_file(path: str) -> Grammar:
             if not in_productions:
                 if line.startswith("NONTERMINALS:"):
                     rest = line[len("NONTERMINALS:") :].strip()
-                    nts = _parse_comma_list(rest)
-                    for nt in nts:
-                        g.add_nonterminal(nt)
+                    g.add_nonterminals(_parse_comma_list(rest))
                     continue
 
                 if line.startswith("TERMINALS:"):
                     rest = line[len("TERMINALS:") :].strip()
-                    ts = _parse_comma_list(rest)
-                    for t in ts:
-                        g.add_terminal(t)
+                    g.add_terminals(_parse_comma_list(rest))
                     continue
 
                 if line.startswith("START:"):
@@ -207,6 +289,17 @@ def parse_grammar_file(path: str) -> Grammar:
                     g.start_nt = idx
                     continue
 
+                if line.startswith("CLASS "):
+                    colon = line.find(":")
+                    if colon == -1:
+                        raise ValueError(f"Bad class line: {line}")
+                    name = line[len("CLASS ") : colon].strip()
+                    t_idx = g.find_terminal(name)
+                    if t_idx == -1:
+                        raise ValueError(f"Class for undeclared terminal '{name}'")
+                    g.char_classes[t_idx] = _parse_char_class(line[colon + 1 :])
+                    continue
+
                 if line.startswith("PRODUCTIONS:"):
                     in_productions = True
                     continue
@@ -0,0 +1,556 @@
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import re
+
+from fa import DFA, FA
+from grammar import Grammar, parse_grammar_file
+
+HERE = Path(__file__).resolve().parent
+
+# token codes of the lab3 scanner (TokenCode in text_transform.lxi)
+KEYWORD_CODES = {
+    "LOAD": 256,
+    "REPLACE": 257,
+    "WITH": 258,
+    "SPLIT": 259,
+    "BY": 260,
+    "JOIN": 261,
+    "TRIM": 262,
+    "UPPERCASE": 263,
+    "LOWERCASE": 264,
+    "SAVE": 265,
+}
+T_ASSIGN = 266
+T_ID = 267
+T_STRING = 268
+
+ST_BUCKETS = 211
+MAX_PATTERN = 1 << 20  # bytes of the regex Lexer derives from its DFA
+SCAN_BLOCK = 1 << 20  # bytes scanned per findall
+CODE_CACHE = 1 << 16  # lexemes whose token code is remembered
+UNRECOGNIZED = -1
+
+
+@dataclass
+class TokenSpec:
+    name: str
+    code: Optional[int]  # None = skipped (whitespace)
+    dfa: DFA  # over byte classes (FA.with_byte_classes)
+
+
+@dataclass
+class LexError:
+    line: int
+    what: str
+
+
+def byte_dfa(g: Grammar) -> DFA:
+    return FA.from_grammar(g).with_byte_classes().to_dfa().minimize()
+
+
+def literal_grammar(text: str) -> Grammar:
+    """Regular grammar accepting exactly text (S0 -> 'c' S1 ... -> 'c')."""
+    g = Grammar()
+    data = text.encode()
+    for i in range(len(data)):
+        g.add_nonterminal(f"S{i}")
+    g.start_nt = 0
+    for i, b in enumerate(data):
+        t = g.add_terminal(f"c{i}")
+        g.char_classes[t] = frozenset([b])
+        if i + 1 < len(data):
+            g.add_production(i, False, True, t, True, i + 1)
+        else:
+            g.add_production(i, False, True, t, False, -1)
+    return g
+
+
+def repeated_class_grammar(values: bytes) -> Grammar:
+    """Regular grammar for one or more bytes of the given set."""
+    g = Grammar()
+    s = g.add_nonterminal("S")
+    a = g.add_nonterminal("A")
+    g.start_nt = s
+    t = g.add_terminal("w")
+    g.char_classes[t] = frozenset(values)
+    g.add_production(s, False, True, t, True, a)
+    g.add_production(a, False, True, t, True, a)
+    g.add_production(a, True, False, -1, False, -1)
+    return g
+
+
+def byte_set_pattern(values: Iterable[int]) -> bytes:
+    """Regex for one byte of a set: a literal, or a class with runs as ranges."""
+    values = sorted(values)
+    if len(values) == 1:
+        return re.escape(bytes(values))
+    parts = []
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1] == values[j] + 1:
+            j += 1
+        if j == i:
+            parts.append(b"\\x%02x" % values[i])
+        else:
+            parts.append(b"\\x%02x-\\x%02x" % (values[i], values[j]))
+        i = j + 1
+    return b"[" + b"".join(parts) + b"]"
+
+
+def reachable_accepts(table: List[int], n_classes: int, accept: List[int]) -> List[Set[int]]:
+    """Token indices accepted in each state or in a state reachable from it."""
+    found = [{k} if k >= 0 else set() for k in accept]
+    changed = True
+    while changed:
+        changed = False
+        for d in range(len(accept)):
+            for t in table[d * n_classes:(d + 1) * n_classes]:
+                if t >= 0 and not found[t] <= found[d]:
+                    found[d] |= found[t]
+                    changed = True
+    return found
+
+
+def dfa_pattern(table: List[int], lut: bytes, n_classes: int, accept: List[int],
+                start_bytes: Optional[Iterable[int]] = None, capture: bool = True,
+                max_size: int = MAX_PATTERN) -> Optional[Tuple[bytes, List[int]]]:
+    """
+    A regex for the longest prefix accepted from state 0 of a DFA
+    (table[d * n_classes + c], -1 = dead; accept[d] = token index or -1)
+    whose only cycles are self-loops. State d becomes
+    loop* (?: [bytes] <next state> | ... | ()), the empty group only when d
+    accepts. Transitions on different bytes never compete, so the greedy
+    regex backtracks only to the last accepting state, and the one group
+    that matched (lastindex) is that state's. start_bytes keeps only the
+    transitions of state 0 on those bytes; without capture the groups are
+    not capturing. Returns the pattern and the token index of each group,
+    or None for other DFAs, a state 0 that accepts, and patterns longer
+    than max_size.
+    """
+    n_states = len(accept)
+    if accept[0] >= 0:
+        return None
+    allowed = set(range(256) if start_bytes is None else start_bytes)
+    bytes_of: List[List[int]] = [[] for _ in range(n_classes)]
+    for b in range(256):
+        bytes_of[lut[b]].append(b)
+
+    loops: List[List[int]] = []
+    edges: List[List[Tuple[List[int], int]]] = []
+    for d in range(n_states):
+        row = table[d * n_classes:(d + 1) * n_classes]
+        loops.append([b for c in range(n_classes) if row[c] == d for b in bytes_of[c]])
+        targets: Dict[int, List[int]] = {}
+        for c in range(n_classes):
+            if row[c] >= 0 and row[c] != d:
+                values = bytes_of[c] if d else [b for b in bytes_of[c] if b in allowed]
+                if values:
+                    targets.setdefault(row[c], []).extend(values)
+        edges.append(list(targets.items()))
+
+    # size of each state's fragment (None = accepts nothing), children first
+    size: List[Optional[int]] = [None] * n_states
+    state = [0] * n_states  # 0 new, 1 on the DFS path, 2 done
+    stack = [(0, 0)]
+    state[0] = 1
+    while stack:
+        d, i = stack.pop()
+        if i < len(edges[d]):
+            stack.append((d, i + 1))
+            t = edges[d][i][0]
+            if state[t] == 1:
+                return None  # a cycle longer than a self-loop
+            if state[t] == 0:
+                state[t] = 1
+                stack.append((t, 0))
+            continue
+        state[d] = 2
+        alive = accept[d] >= 0
+        total = 8 + 4 * len(loops[d])
+        for t, values in edges[d]:
+            if size[t] is not None:
+                alive = True
+                total += 4 * len(values) + size[t]
+        if alive:
+            size[d] = total
+            if total > max_size:
+                return None
+    if size[0] is None:
+        return None
+
+    parts: List[bytes] = []
+    group_spec: List[int] = []
+
+    def emit(d: int) -> None:
+        if loops[d]:
+            parts.append(byte_set_pattern(loops[d]) + b"*")
+        branches = [(t, values) for t, values in edges[d] if size[t] is not None]
+        end = b"()" if capture else b""
+        if accept[d] >= 0:
+            group_spec.append(accept[d])
+            if not branches:
+                parts.append(end)
+                return
+        grouped = len(branches) > 1 or accept[d] >= 0
+        if grouped:
+            parts.append(b"(?:")
+        for t, values in branches:
+            parts.append(byte_set_pattern(values))
+            emit(t)
+            parts.append(b"|")
+        if accept[d] >= 0:
+            parts.append(end)
+        else:
+            parts.pop()  # the last "|"
+        if grouped:
+            parts.append(b")")
+
+    emit(0)
+    return b"".join(parts), (group_spec if capture else [])
+
+
+class LexemeCodes(dict):
+    """
+    Lexeme -> token code (None = skipped, UNRECOGNIZED = no token), found
+    with a full match on first use: the lexeme alone fixes the state the
+    DFA ends in. Cleared when it reaches CODE_CACHE entries.
+    """
+
+    def __init__(self, pattern: "re.Pattern", group_codes: List[Optional[int]]):
+        super().__init__()
+        self.pattern = pattern
+        self.group_codes = group_codes
+
+    def __missing__(self, lexeme: bytes) -> Optional[int]:
+        m = self.pattern.fullmatch(lexeme)
+        code = self.group_codes[m.lastindex] if m else UNRECOGNIZED
+        if len(self) >= CODE_CACHE:
+            self.clear()
+        self[lexeme] = code
+        return code
+
+
+class Lexer:
+    """
+    Maximal-munch scanner over a single union DFA of several token automata.
+    The union is the product of the component DFAs over a common byte-class
+    alphabet; when several tokens accept the same longest lexeme the one
+    listed first wins.
+    """
+
+    def __init__(self, specs: List[TokenSpec]):
+        self.specs = specs
+        comps = [spec.dfa for spec in specs]
+
+        # common byte classes: bytes that fall in the same class of every component
+        class_of: Dict[Tuple[int, ...], int] = {}
+        reps: List[int] = []
+        lut = bytearray(256)
+        for b in range(256):
+            sig = tuple(dfa.byte_lut[b] for dfa in comps)
+            c = class_of.get(sig)
+            if c is None:
+                c = len(reps)
+                class_of[sig] = c
+                reps.append(b)
+            lut[b] = c
+        n_classes = len(reps)
+        comp_class = [[dfa.byte_lut[b] for dfa in comps] for b in reps]
+
+        start = tuple(dfa.start_state for dfa in comps)
+        state_id: Dict[Tuple[int, ...], int] = {start: 0}
+        states = [start]
+        table: List[int] = []
+        i = 0
+        while i < len(states):
+            current = states[i]
+            i += 1
+            for c in range(n_classes):
+                nxt = []
+                alive = False
+                for k, dfa in enumerate(comps):
+                    s = current[k]
+                    if s >= 0:
+                        s = dfa.table[s * dfa.num_terminals + comp_class[c][k]]
+                        alive = alive or s >= 0
+                    nxt.append(s)
+                if not alive:
+                    table.append(-1)
+                    continue
+                key = tuple(nxt)
+                d = state_id.get(key)
+                if d is None:
+                    d = len(states)
+                    state_id[key] = d
+                    states.append(key)
+                table.append(d)
+
+        # states are stored premultiplied by n_classes: next = table[s + class]
+        self.n_classes = n_classes
+        self.num_states = len(states)
+        self.byte_lut = bytes(lut)
+        self.table = [d * n_classes if d >= 0 else -1 for d in table]
+        self.start = 0
+        # accept[s] = index of the winning spec for premultiplied state s, -1 if none
+        self.accept = [-1] * len(self.table)
+        for d, key in enumerate(states):
+            for k, dfa in enumerate(comps):
+                if key[k] >= 0 and dfa.accepting[key[k]]:
+                    self.accept[d * n_classes] = k
+                    break
+
+        # loop acceleration: a state that loops on a set of bytes (identifier
+        # tails, string contents, whitespace) skips the whole run with one
+        # regex match instead of one table step per byte
+        self.loop_match: List[Optional[Callable]] = [None] * len(self.table)
+        for d in range(len(states)):
+            base = d * n_classes
+            looping = bytes(b for b in range(256) if table[d * n_classes + lut[b]] == d)
+            if looping:
+                self.loop_match[base] = re.compile(byte_set_pattern(looping) + b"*").match
+
+        # the whole DFA as one regex, so a token costs one regex match step
+        # instead of a Python loop iteration per byte; None when it has other cycles
+        accept = [self.accept[d * n_classes] for d in range(len(states))]
+        token_regex = dfa_pattern(table, lut, n_classes, accept)
+        self.pattern = None
+        if token_regex is None:
+            return
+        pattern, group_spec = token_regex
+        self.pattern = re.compile(pattern)
+        self.codes = LexemeCodes(self.pattern, [None] + [specs[k].code for k in group_spec])
+
+        # blocks are scanned with one findall: a skipped token is folded into
+        # the token after it, and a byte no token starts with matches alone,
+        # so the lexemes cover the block
+        skipped = {k for k, spec in enumerate(specs) if spec.code is None}
+        reach = reachable_accepts(table, n_classes, accept)
+        lead_bytes = [b for b in range(256) if table[lut[b]] >= 0 and reach[table[lut[b]]] <= skipped]
+        lead = dfa_pattern(table, lut, n_classes, accept, lead_bytes, capture=False)
+        token = dfa_pattern(table, lut, n_classes, accept, capture=False)[0]
+        self.block_pattern = re.compile((b"(?:" + lead[0] + b")?" if lead else b"")
+                                        + b"(" + token + b"|[\\x00-\\xff])")
+
+        # blocks end after a newline followed by a byte every run that read
+        # the newline dies on: the runs stop there however the input goes on
+        after_newline = {table[d * n_classes + lut[10]] for d in range(len(states))} - {-1}
+        self.cut_before: Optional[bytes] = None
+        if all(accept[t] >= 0 for t in after_newline):
+            self.cut_before = bytes(all(table[t * n_classes + lut[b]] < 0 for t in after_newline)
+                                    for b in range(256))
+
+    @staticmethod
+    def text_transform() -> "Lexer":
+        """Lexer for the text-transform DSL, producing the lab3 scanner codes."""
+        specs = [TokenSpec(word, code, byte_dfa(literal_grammar(word)))
+                 for word, code in KEYWORD_CODES.items()]
+        specs.append(TokenSpec("ASSIGN", T_ASSIGN, byte_dfa(literal_grammar("="))))
+        specs.append(TokenSpec("ID", T_ID,
+                               byte_dfa(parse_grammar_file(str(HERE / "grammar_identifiers.txt")))))
+        specs.append(TokenSpec("STRING", T_STRING,
+                               byte_dfa(parse_grammar_file(str(HERE / "grammar_strings.txt")))))
+        specs.append(TokenSpec("WHITESPACE", None, byte_dfa(repeated_class_grammar(b" \t\r\n"))))
+        return Lexer(specs)
+
+    def scan(self, data: bytes,
+             errors: Optional[List[LexError]] = None) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yields (token code, lexeme) pairs with longest-match semantics.
+        Unrecognised bytes raise ValueError, or are skipped and recorded in
+        errors when a list is given (like the flex scanner).
+        """
+        if self.pattern is None:
+            return self._scan_table(data, errors)
+        return self._scan_blocks(data, errors)
+
+    def _blocks(self, data: bytes) -> Iterator[Tuple[int, int]]:
+        """Ranges of about SCAN_BLOCK bytes; a run of the DFA never crosses a cut."""
+        n = len(data)
+        start = 0
+        cut_before = self.cut_before
+        while cut_before is not None and n - start > SCAN_BLOCK:
+            end = data.find(b"\n", start + SCAN_BLOCK) + 1
+            while end and (end == n or not cut_before[data[end]]):
+                end = data.find(b"\n", end) + 1
+            if not end:
+                break
+            yield start, end
+            start = end
+        if start < n:
+            yield start, n
+
+    def _scan_blocks(self, data: bytes,
+                     errors: Optional[List[LexError]]) -> Iterator[Tuple[int, bytes]]:
+        where = [1, 0]  # line, offset its count is up to
+        return chain.from_iterable(self._scan_block(data, start, end, where, errors)
+                                   for start, end in self._blocks(data))
+
+    def _scan_block(self, data: bytes, start: int, end: int, where: List[int],
+                    errors: Optional[List[LexError]]) -> Iterator[Tuple[int, bytes]]:
+        lexemes = self.block_pattern.findall(data, start, end)
+        codes = list(map(self.codes.__getitem__, lexemes))
+        if UNRECOGNIZED in codes:
+            return self._scan_matches(data, start, end, where, errors)
+        if None in codes:
+            return [(code, lexeme) for code, lexeme in zip(codes, lexemes) if code is not None]
+        return zip(codes, lexemes)
+
+    def _scan_matches(self, data: bytes, start: int, end: int, where: List[int],
+                      errors: Optional[List[LexError]]) -> Iterator[Tuple[int, bytes]]:
+        """One match per token, for blocks with unrecognised bytes."""
+        codes = self.codes.group_codes
+        pos = start
+        for m in self.pattern.finditer(data, start, end):
+            while pos < m.start():  # finditer skipped bytes no token starts with
+                _unrecognized(data, pos, where, errors)
+                pos += 1
+            code = codes[m.lastindex]
+            if code is not None:
+                yield code, m.group()
+            pos = m.end()
+        while pos < end:
+            _unrecognized(data, pos, where, errors)
+            pos += 1
+
+    def _scan_table(self, data: bytes,
+                    errors: Optional[List[LexError]]) -> Iterator[Tuple[int, bytes]]:
+        classes = data.translate(self.byte_lut)
+        table = self.table
+        accept = self.accept
+        loop_match = self.loop_match
+        codes = [spec.code for spec in self.specs]
+        n = len(data)
+        pos = 0
+        where = [1, 0]
+
+        while pos < n:
+            s = self.start
+            i = pos
+            end = -1
+            winner = -1
+            while i < n:
+                s = table[s + classes[i]]
+                if s < 0:
+                    break
+                i += 1
+                skip = loop_match[s]
+                if skip is not None and i < n and table[s + classes[i]] == s:
+                    i = skip(data, i + 1).end()
+                k = accept[s]
+                if k >= 0:
+                    end = i
+                    winner = k
+
+            if end < 0:
+                _unrecognized(data, pos, where, errors)
+                pos += 1
+                continue
+
+            code = codes[winner]
+            if code is not None:
+                yield code, data[pos:end]
+            pos = end
+
+
+def _unrecognized(data: bytes, pos: int, where: List[int],
+                  errors: Optional[List[LexError]]) -> None:
+    """Reports the byte at pos; where holds the line number and the offset it was counted to."""
+    where[0] += data.count(b"\n", where[1], pos)
+    where[1] = pos
+    what = f"Unrecognized character: '{data[pos:pos + 1].decode('latin-1')}'"
+    if errors is None:
+        raise ValueError(f"Line {where[0]}: {what}")
+    errors.append(LexError(where[0], what))
+
+
+def st_hash(lexeme: bytes) -> int:
+    """djb2 modulo the bucket count, as in the flex scanner's symbol table."""
+    h = 5381
+    for c in lexeme:
+        if c >= 128:  # char is signed there, then cast to a 32-bit unsigned
+            c = (c - 256) & 0xFFFFFFFF
+        h = (h * 33 + c) & 0xFFFFFFFFFFFFFFFF  # unsigned long
+    return h % ST_BUCKETS
+
+
+class SymbolTable:
+    """Same (bucket, position) numbering as the flex scanner's symbol table."""
+
+    def __init__(self):
+        self.position: Dict[bytes, Tuple[int, int]] = {}
+        self.bucket_sizes = [0] * ST_BUCKETS
+
+    def insert(self, lexeme: bytes) -> Tuple[int, int]:
+        pos = self.position.get(lexeme)
+        if pos is None:
+            b = st_hash(lexeme)
+            pos = (b, self.bucket_sizes[b])
+            self.bucket_sizes[b] += 1
+            self.position[lexeme] = pos
+        return pos
+
+
+class PIFEntries(dict):
+    """
+    (code, lexeme) -> (code, bucket, position), inserting identifiers and
+    strings into the symbol table the first time they are seen.
+    """
+
+    def __init__(self, st: SymbolTable):
+        super().__init__()
+        self.st = st
+
+    def __missing__(self, token: Tuple[int, bytes]) -> Tuple[int, int, int]:
+        code, lexeme = token
+        if code == T_ID or code == T_STRING:
+            entry = (code,) + self.st.insert(lexeme)
+        else:
+            entry = (code, -1, -1)
+        self[token] = entry
+        return entry
+
+
+class PIFLines(dict):
+    """PIF entry -> its line in the flex scanner's text format."""
+
+    def __missing__(self, entry: Tuple[int, int, int]) -> bytes:
+        code, b, p = entry
+        line = (f"({code}, -)\n" if b < 0 else f"({code}, ({b},{p}))\n").encode()
+        self[entry] = line
+        return line
+
+
+def pif_entries(tokens: Iterator[Tuple[int, bytes]],
+                st: Optional[SymbolTable] = None) -> Iterator[Tuple[int, int, int]]:
+    """(code, bucket, position) entries; identifiers and strings go to the symbol table."""
+    return map(PIFEntries(SymbolTable() if st is None else st).__getitem__, tokens)
+
+
+def write_PIF(entries: Iterator[Tuple[int, int, int]], path: str) -> None:
+    with open(path, "wb") as f:
+        f.writelines(map(PIFLines().__getitem__, entries))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 lexer.py <source_file> [pif_out]", file=sys.stderr)
+        sys.exit(1)
+
+    with open(sys.argv[1], "rb") as f:
+        source = f.read()
+    lex_errors: List[LexError] = []
+    lexer = Lexer.text_transform()
+    entries = pif_entries(lexer.scan(source, lex_errors))
+    if len(sys.argv) >= 3:
+        write_PIF(entries, sys.argv[2])
+    else:
+        for code, b, p in entries:
+            print(f"({code}, -)" if b < 0 else f"({code}, ({b},{p}))")
+    for err in lex_errors:
+        print(f"Line {err.line}: {err.what}", file=sys.stderr)
+    sys.exit(2 if lex_errors else 0)
@@ -4,7 +4,7 @@ from fa import FA
 
 def main():
     if len(sys.argv) < 2:
-        print(f"Usage: python3 main.py <grammar_file>", file=sys.stderr)
+        print(f"Usage: python3 main.py <grammar_file> [word ...]", file=sys.stderr)
         sys.exit(1)
 
     grammar_path = sys.argv[1]
@@ -17,6 +17,24 @@ def main():
 
     fa = FA.from_grammar(g)
     print(fa.toString())
+    print()
+
+    dfa = fa.to_dfa()
+    print(dfa.toString())
+    print()
+
+    minimal = dfa.minimize()
+    print(f"Minimal DFA ({dfa.num_states} -> {minimal.num_states} states):")
+    print(minimal.toString())
+
+    words = sys.argv[2:]
+    if words:
+        matcher = fa.with_byte_classes().to_dfa().minimize()
+        print()
+        print(f"Byte classes: {matcher.num_terminals}")
+        for word in words:
+            verdict = "accepted" if matcher.accepts_bytes(word.encode()) else "rejected"
+            print(f"  {word!r}: {verdict}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from cache import load_compiled
+from ll1 import CompiledGrammar, iter_productions, parse_tree_ids, print_parse_tree
+from pif import open_PIF_ids
+
+# set in every worker by _init_worker
+_worker_cg: Optional[CompiledGrammar] = None
+
+
+def _init_worker(cg: CompiledGrammar) -> None:
+    global _worker_cg
+    _worker_cg = cg
+
+
+def parse_file(cg: CompiledGrammar, pif_path: Path, out_path: Path,
+               tree: bool) -> Tuple[str, Optional[str], int]:
+    """Returns (input path, error message or None, number of output records)."""
+    count = 0
+    try:
+        with open(out_path, "w") as out:
+            if tree:
+                nodes = parse_tree_ids(cg, open_PIF_ids(cg, pif_path))
+                print_parse_tree(nodes, file=out)
+                count = len(nodes)
+            else:
+                for p in iter_productions(cg, open_PIF_ids(cg, pif_path)):
+                    left, rhs = cg.prod_names[p]
+                    out.write(f"{left} -> {' '.join(rhs)}\n")
+                    count += 1
+    except (ValueError, OSError) as e:
+        return str(pif_path), str(e), count
+    return str(pif_path), None, count
+
+
+def _worker_parse(task: Tuple[Path, Path, bool]) -> Tuple[str, Optional[str], int]:
+    pif_path, out_path, tree = task
+    return parse_file(_worker_cg, pif_path, out_path, tree)
+
+
+def expand_inputs(inputs: List[str], pattern: str) -> List[Path]:
+    files: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.glob(pattern) if p.is_file()))
+        elif path.is_file():
+            files.append(path)
+        else:
+            files.extend(sorted(Path(p) for p in glob.glob(item, recursive=True)))
+    return files
+
+
+def output_paths(files: List[Path], out_dir: Path, tree: bool) -> List[Path]:
+    suffix = ".tree.txt" if tree else ".productions.txt"
+    used = set()
+    outs = []
+    for f in files:
+        name = f.stem + suffix
+        k = 1
+        while name in used:  # same file name in different directories
+            name = f"{f.stem}.{k}{suffix}"
+            k += 1
+        used.add(name)
+        outs.append(out_dir / name)
+    return outs
+
+
+def run_batch(grammar_path: Path, files: List[Path], out_dir: Path,
+              workers: Optional[int] = None, tree: bool = False) -> dict:
+    started = time.perf_counter()
+    cg = load_compiled(grammar_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tasks = list(zip(files, output_paths(files, out_dir, tree), [tree] * len(files)))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        results = [parse_file(cg, *task) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cg,)) as pool:
+            results = list(pool.map(_worker_parse, tasks, chunksize=chunksize))
+
+    failures = [{"file": path, "error": err} for path, err, _ in results if err is not None]
+    summary = {
+        "grammar": str(grammar_path),
+        "files": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "failures": failures,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(out_dir / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Parse many PIF files with one LL(1) table")
+    arg_parser.add_argument("grammar", type=Path)
+    arg_parser.add_argument("inputs", nargs="+", help="PIF files, directories or glob patterns")
+    arg_parser.add_argument("--out", type=Path, default=Path("batch_output"))
+    arg_parser.add_argument("--pattern", default="*.txt",
+                            help="file pattern used inside directories (default: *.txt)")
+    arg_parser.add_argument("--workers", type=int, default=None)
+    arg_parser.add_argument("--tree", action="store_true",
+                            help="write parse trees instead of productions")
+    args = arg_parser.parse_args()
+
+    files = expand_inputs(args.inputs, args.pattern)
+    if not files:
+        print("No input files found", file=sys.stderr)
+        sys.exit(1)
+
+    summary = run_batch(args.grammar, files, args.out, args.workers, args.tree)
+    print(f"{summary['succeeded']}/{summary['files']} parsed in {summary['seconds']}s "
+          f"({summary['workers']} workers)")
+    for failure in summary["failures"]:
+        print(f"  FAILED {failure['file']}: {failure['error']}")
+    sys.exit(1 if summary["failed"] else 0)
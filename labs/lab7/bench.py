@@ -0,0 +1,406 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from ll1 import (
+    EPSILON,
+    Grammar,
+    CompiledGrammar,
+    LL1Conflict,
+    ParserStats,
+    ParseTree,
+    build_ll1_table,
+    compile_grammar,
+    compute_first_sets,
+    compute_follow_sets,
+    iter_productions,
+    iter_productions_instrumented,
+    parse_sequence,
+    parse_tree_ids,
+    parse_tree_instrumented,
+    parse_with_tree,
+)
+from pif import open_PIF_ids
+
+LAB4_PATH = Path(__file__).resolve().parent.parent / "lab4"
+if str(LAB4_PATH) not in sys.path:
+    sys.path.append(str(LAB4_PATH))
+
+from fa import FA  # noqa: E402
+from grammar import Grammar as RegularGrammar  # noqa: E402
+from lexer import LexError, Lexer, pif_entries, write_PIF  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+# ---------------------------
+# Generators
+# ---------------------------
+
+def random_ll1_grammar(n_nonterminals: int, n_terminals: int, rng: random.Random,
+                       max_alternatives: int = 4, max_rhs: int = 5,
+                       epsilon_rate: float = 0.3) -> Grammar:
+    """
+    Random LL(1) grammar: the alternatives of a nonterminal start with
+    distinct terminals, the first one is that terminal alone (so every
+    nonterminal derives a short word) and the last one mentions N<i+1> (so
+    all of them are reachable). Epsilon alternatives that cause conflicts
+    are dropped.
+    """
+    if n_terminals < 2:
+        raise ValueError("need at least 2 terminals")
+    g = Grammar()
+    nts = [f"N{i}" for i in range(n_nonterminals)]
+    ts = [f"t{i}" for i in range(n_terminals)]
+    g.nonterminals = set(nts)
+    g.terminals = set(ts)
+    g.start_symbol = nts[0]
+    symbols = nts + ts
+    for i, A in enumerate(nts):
+        leads = rng.sample(ts, rng.randint(2, max(2, min(max_alternatives, n_terminals))))
+        prods = [[leads[0]]]
+        for lead in leads[1:]:
+            prods.append([lead] + [rng.choice(symbols) for _ in range(rng.randint(0, max_rhs - 1))])
+        if i + 1 < len(nts):
+            prods[-1].append(nts[i + 1])
+        if rng.random() < epsilon_rate:
+            prods.append([EPSILON])
+        g.productions[A] = prods
+
+    # alternatives start with distinct terminals, so only epsilon can conflict
+    while True:
+        try:
+            compile_grammar(g)
+            return g
+        except LL1Conflict as e:
+            prods = g.productions[e.nonterminal]
+            g.productions[e.nonterminal] = [rhs for rhs in prods if rhs != [EPSILON]]
+
+
+def random_sentence(cg: CompiledGrammar, length: int, rng: random.Random) -> List[str]:
+    """
+    Leftmost random derivation of about `length` terminals (fewer if the
+    language runs out): alternatives that mention nonterminals while the
+    word plus pending symbols is too short, then the shortest alternative
+    of every remaining nonterminal.
+    """
+    prods_of: Dict[int, List[int]] = {}
+    for p, A in enumerate(cg.prod_lhs):
+        prods_of.setdefault(A, []).append(p)
+    shortest = {A: min(ps, key=lambda p: len(cg.prod_rhs[p])) for A, ps in prods_of.items()}
+    for A, ps in prods_of.items():
+        growing = [p for p in ps if any(X >= cg.n_terminals for X in cg.prod_rhs[p])]
+        prods_of[A] = growing or ps
+    out: List[str] = []
+    stack = [cg.start]
+    while stack:
+        X = stack.pop()
+        if X < cg.n_terminals:
+            out.append(cg.symbols[X])
+        elif len(out) + len(stack) < length:
+            stack.extend(cg.prod_rhs_rev[rng.choice(prods_of[X])])
+        else:
+            stack.extend(cg.prod_rhs_rev[shortest[X]])
+    return out
+
+
+def random_regular_grammar(n_nonterminals: int, n_terminals: int, rng: random.Random,
+                           fanout: int = 3, accept_rate: float = 0.2) -> RegularGrammar:
+    """Random right-linear grammar (A -> aB | a | epsilon) in the lab4 representation."""
+    g = RegularGrammar()
+    g.add_nonterminals(f"S{i}" for i in range(n_nonterminals))
+    g.add_terminals(f"c{i}" for i in range(n_terminals))
+    g.start_nt = 0
+    for A in range(n_nonterminals):
+        for _ in range(fanout):
+            t = rng.randrange(n_terminals)
+            if rng.random() < 0.1:
+                g.add_production(A, False, True, t, False, -1)
+            else:
+                g.add_production(A, False, True, t, True, rng.randrange(n_nonterminals))
+        if rng.random() < accept_rate:
+            g.add_production(A, True, False, -1, False, -1)
+    return g
+
+
+def _random_word(rng: random.Random, letters: str, length: int) -> str:
+    return "".join(rng.choice(letters) for _ in range(length))
+
+
+def random_program(statements: int, rng: random.Random) -> str:
+    """Syntactically valid text-transform program (lab3 DSL) with this many statements."""
+    names = [_random_word(rng, "abcdefghijklmnopqrstuvwxyz", rng.randint(1, 10))
+             for _ in range(64)]
+
+    def string() -> str:
+        return '"' + _random_word(rng, "abcdefXYZ0123 ,;.-", rng.randint(0, 12)) + '"'
+
+    makers: List[Callable[[], str]] = [
+        lambda: f"LOAD {rng.choice(names)}",
+        lambda: f"REPLACE {string()} WITH {string()}",
+        lambda: f"SPLIT BY {string()}",
+        lambda: f"JOIN WITH {string()}",
+        lambda: "TRIM",
+        lambda: "UPPERCASE",
+        lambda: "LOWERCASE",
+        lambda: f"SAVE {rng.choice(names)}",
+        lambda: f"{rng.choice(names)} = {string()}",
+    ]
+    return "\n".join(rng.choice(makers)() for _ in range(statements)) + "\n"
+
+
+def program_tokens(source: str) -> List[str]:
+    """Grammar terminal names of the scanned program."""
+    from lexer import KEYWORD_CODES, T_ASSIGN, T_ID, T_STRING
+    names = {code: word for word, code in KEYWORD_CODES.items()}
+    names.update({T_ASSIGN: "ASSIGN", T_ID: "ID", T_STRING: "STRING"})
+    errors: List[LexError] = []
+    tokens = [names[code] for code, _ in Lexer.text_transform().scan(source.encode(), errors)]
+    if errors:
+        raise ValueError(f"generated program does not scan: line {errors[0].line}: {errors[0].what}")
+    return tokens
+
+
+def write_program_PIF(source: str, path: Path) -> None:
+    write_PIF(pif_entries(Lexer.text_transform().scan(source.encode())), str(path))
+
+
+# ---------------------------
+# Timing
+# ---------------------------
+
+def best_of(fn: Callable[[], object], repeat: int, min_batch: float = 0.05) -> float:
+    """
+    Seconds per call: fast functions are called in batches of at least
+    min_batch seconds (like timeit's autorange); the best batch of `repeat` wins.
+    """
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_batch:
+            break
+        calls *= 2 if elapsed * 10 > min_batch else 10
+    best = elapsed / calls
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def drain(it) -> None:
+    for _ in it:
+        pass
+
+
+def run_suite(nonterminals: int, terminals: int, sentence_length: int,
+              regular_nonterminals: int, regular_terminals: int,
+              statements: int, repeat: int, seed: int,
+              dsl_grammar: Path) -> Dict[str, Dict[str, float]]:
+    # one generator per input, so changing one size leaves the others as they were
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(name: str, fn: Callable[[], object], size: int) -> None:
+        seconds = best_of(fn, repeat)
+        results[name] = {"seconds": seconds, "size": size}
+        print(f"  {name:<34} {seconds * 1000:10.3f} ms  (size {size})")
+
+    g = random_ll1_grammar(nonterminals, terminals, random.Random(seed))
+    n_prods = sum(len(p) for p in g.productions.values())
+    print(f"random LL(1) grammar: {nonterminals} nonterminals, {terminals} terminals, {n_prods} productions")
+    first = compute_first_sets(g)
+    follow = compute_follow_sets(g, first)
+    record("compute_first_sets", lambda: compute_first_sets(g), n_prods)
+    record("compute_follow_sets", lambda: compute_follow_sets(g, first), n_prods)
+    record("build_ll1_table", lambda: build_ll1_table(g, first, follow), n_prods)
+    record("compile_grammar", lambda: compile_grammar(g), n_prods)
+
+    cg = compile_grammar(g)
+    sentence = random_sentence(cg, sentence_length, random.Random(seed + 1))
+    record("parse_sequence[random]", lambda: parse_sequence(g, cg, sentence), len(sentence))
+    record("parse_with_tree[random]", lambda: parse_with_tree(g, cg, sentence), len(sentence))
+    checked = check_instrumented_corpus(cg, list(cg.encode(sentence)), random.Random(seed + 4))
+
+    dsl = Grammar.from_file(dsl_grammar)
+    dsl_cg = compile_grammar(dsl)
+    source = random_program(statements, random.Random(seed + 2))
+    tokens = program_tokens(source)
+    print(f"text-transform program: {statements} statements, {len(tokens)} tokens")
+    record("parse_sequence[program]", lambda: parse_sequence(dsl, dsl_cg, tokens), len(tokens))
+    record("parse_with_tree[program]", lambda: parse_with_tree(dsl, dsl_cg, tokens), len(tokens))
+    checked += check_instrumented_corpus(dsl_cg, list(dsl_cg.encode(tokens)), random.Random(seed + 5))
+    print(f"  instrumented drivers match the plain ones on {checked} inputs")
+    with tempfile.TemporaryDirectory() as tmp:
+        pif_path = Path(tmp) / "program_PIF.txt"
+        write_program_PIF(source, pif_path)
+        record("iter_productions[PIF]",
+               lambda: drain(iter_productions(dsl_cg, open_PIF_ids(dsl_cg, pif_path))), len(tokens))
+
+    rg = random_regular_grammar(regular_nonterminals, regular_terminals,
+                                random.Random(seed + 3))
+    print(f"random regular grammar: {regular_nonterminals} nonterminals, "
+          f"{regular_terminals} terminals, {len(rg.prods)} productions")
+    record("FA.from_grammar", lambda: FA.from_grammar(rg), len(rg.prods))
+    fa = FA.from_grammar(rg)
+    record("FA.to_dfa", lambda: fa.to_dfa(), len(rg.prods))
+
+    return results
+
+
+# ---------------------------
+# Instrumented drivers
+# ---------------------------
+
+def _productions(it) -> Tuple[List[int], bool]:
+    """Productions yielded until the end or a ValueError, and whether parsing failed."""
+    prods: List[int] = []
+    try:
+        for p in it:
+            prods.append(p)
+    except ValueError:
+        return prods, True
+    return prods, False
+
+
+def _tree(build: Callable[[], ParseTree]) -> Union[Tuple[List[int], ...], str]:
+    try:
+        tree = build()
+    except ValueError as e:
+        return str(e)
+    return tuple(list(a) for a in (tree.symbol, tree.father, tree.sibling,
+                                   tree.first_child, tree.token))
+
+
+def check_instrumented(cg: CompiledGrammar, token_ids: Sequence[int]) -> None:
+    """
+    Raises ValueError unless the instrumented drivers (with a tracer) match
+    iter_productions and parse_tree_ids on token_ids: same productions, same
+    tree arrays or the same error, and counters that agree with them.
+    """
+    steps: List[str] = []
+
+    def trace(event: str, sym: int, i: int, p: int) -> None:
+        steps.append(event)
+
+    stats = ParserStats()
+    plain = _productions(iter_productions(cg, token_ids))
+    instrumented = _productions(iter_productions_instrumented(cg, token_ids, stats, trace))
+    if instrumented != plain:
+        raise ValueError("iter_productions_instrumented differs from iter_productions")
+    if stats.expansions != len(plain[0]) or steps.count("expand") != len(plain[0]):
+        raise ValueError("iter_productions_instrumented miscounts its expansions")
+    if not plain[1] and stats.tokens != len(token_ids):
+        raise ValueError("iter_productions_instrumented miscounts its tokens")
+
+    if _tree(lambda: parse_tree_instrumented(cg, token_ids, ParserStats(), trace)) \
+            != _tree(lambda: parse_tree_ids(cg, token_ids)):
+        raise ValueError("parse_tree_instrumented differs from parse_tree_ids")
+
+
+def check_instrumented_corpus(cg: CompiledGrammar, token_ids: Sequence[int],
+                              rng: random.Random, variants: int = 20) -> int:
+    """check_instrumented on token_ids and on copies with one token changed; returns the input count."""
+    check_instrumented(cg, token_ids)
+    terminals = cg.n_terminals - 1  # never insert ENDMARK
+    for _ in range(variants):
+        ids = list(token_ids)
+        if ids:
+            ids[rng.randrange(len(ids))] = rng.randrange(terminals)
+        check_instrumented(cg, ids)
+    return variants + 1
+
+
+# ---------------------------
+# Results and baselines
+# ---------------------------
+
+def save_results(path: Path, results: Dict[str, Dict[str, float]], params: Dict[str, object]) -> None:
+    document = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    Path(path).write_text(json.dumps(document, indent=2) + "\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: Path,
+            threshold: float) -> List[str]:
+    """Names of benchmarks slower than the baseline by more than threshold (0.2 = 20%)."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    if baseline.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{baseline_path}: unsupported results version {baseline.get('version')}")
+    regressions = []
+    print(f"against {baseline_path} (threshold {threshold:.0%}):")
+    for name, entry in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"  {name:<34} new")
+            continue
+        if old["size"] != entry["size"]:
+            print(f"  {name:<34} size changed ({old['size']} -> {entry['size']}), not compared")
+            continue
+        ratio = entry["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<34} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmarks of the lab4/lab7 code on generated inputs")
+    arg_parser.add_argument("--nonterminals", type=int, default=200,
+                            help="nonterminals of the random LL(1) grammar")
+    arg_parser.add_argument("--terminals", type=int, default=40)
+    arg_parser.add_argument("--sentence-length", type=int, default=50000,
+                            help="tokens in the random sentence of that grammar")
+    arg_parser.add_argument("--regular-nonterminals", type=int, default=60)
+    arg_parser.add_argument("--regular-terminals", type=int, default=8)
+    arg_parser.add_argument("--statements", type=int, default=20000,
+                            help="statements in the generated text-transform program")
+    arg_parser.add_argument("--dsl-grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    arg_parser.add_argument("--baseline", type=Path,
+                            help="flag benchmarks slower than this earlier results file")
+    arg_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="allowed slowdown against the baseline (0.2 = 20%%)")
+    arg_parser.add_argument("--save-baseline", type=Path,
+                            help="also write the results here as the new baseline")
+    args = arg_parser.parse_args()
+
+    params = {
+        "nonterminals": args.nonterminals,
+        "terminals": args.terminals,
+        "sentence_length": args.sentence_length,
+        "regular_nonterminals": args.regular_nonterminals,
+        "regular_terminals": args.regular_terminals,
+        "statements": args.statements,
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+    results = run_suite(args.nonterminals, args.terminals, args.sentence_length,
+                        args.regular_nonterminals, args.regular_terminals,
+                        args.statements, args.repeat, args.seed, args.dsl_grammar)
+    save_results(args.out, results, params)
+    if args.save_baseline is not None:
+        save_results(args.save_baseline, results, params)
+
+    if args.baseline is not None:
+        if compare(results, args.baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,117 @@
+import argparse
+import random
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from ll1 import CompiledGrammar, Grammar, ParseTree, compile_grammar, iter_productions, parse_tree_ids
+from lalr import LALRTables, build_lalr, iter_reductions, parse_tree_lalr
+
+STATEMENTS = [
+    ["LOAD", "ID"],
+    ["REPLACE", "STRING", "WITH", "STRING"],
+    ["SPLIT", "BY", "STRING"],
+    ["JOIN", "WITH", "STRING"],
+    ["TRIM"],
+    ["UPPERCASE"],
+    ["LOWERCASE"],
+    ["SAVE", "ID"],
+    ["ID", "ASSIGN", "STRING"],
+]
+
+
+def random_program(cg: CompiledGrammar, statements: int, rng: random.Random) -> List[int]:
+    ids = cg.symbol_id
+    return [ids[t] for _ in range(statements) for t in rng.choice(STATEMENTS)]
+
+
+def tree_depth(tree: ParseTree) -> int:
+    # both drivers allocate a node after its father
+    depth = [0] * len(tree)
+    father = tree.father
+    for i in range(1, len(tree)):
+        depth[i] = depth[father[i]] + 1
+    return max(depth, default=0)
+
+
+def leaves(tree: ParseTree, n_terminals: int) -> List[Tuple[int, int]]:
+    """(symbol, token index) of every terminal leaf, left to right."""
+    return [(tree.symbol[i], tree.token[i]) for i in tree.preorder() if tree.symbol[i] < n_terminals]
+
+
+def check_flat_tree(tables: LALRTables, program: List[int]) -> Tuple[int, int]:
+    """
+    Depths of the LALR(1) tree without and with flat_lists; raises if the
+    flat tree has other leaves or is not shallower.
+    """
+    nested = parse_tree_lalr(tables, program, flat_lists=False)
+    flat = parse_tree_lalr(tables, program)
+    n_t = tables.cg.n_terminals
+    if leaves(flat, n_t) != leaves(nested, n_t):
+        raise ValueError("flat_lists changed the leaves of the tree")
+    depths = tree_depth(nested), tree_depth(flat)
+    if depths[1] >= depths[0]:
+        raise ValueError(f"flat_lists tree is not shallower (depth {depths[1]} vs {depths[0]})")
+    return depths
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def drain(it) -> None:
+    for _ in it:
+        pass
+
+
+def bench(ll1_grammar: Path, lalr_grammar: Path, statements: int,
+          repeat: int, seed: int) -> None:
+    start = time.perf_counter()
+    cg = compile_grammar(Grammar.from_file(ll1_grammar))
+    t_ll1 = time.perf_counter() - start
+    start = time.perf_counter()
+    tables = build_lalr(compile_grammar(Grammar.from_file(lalr_grammar), ll1_table=False))
+    t_lalr = time.perf_counter() - start
+
+    program = random_program(cg, statements, random.Random(seed))
+    # same terminal names, but ids are per grammar
+    names = [cg.symbols[t] for t in program]
+    lalr_program = [tables.cg.symbol_id[n] for n in names]
+    tokens = len(program)
+
+    ll1_prods = timed(lambda: drain(iter_productions(cg, program)), repeat)
+    lalr_prods = timed(lambda: drain(iter_reductions(tables, lalr_program)), repeat)
+    ll1_tree = timed(lambda: parse_tree_ids(cg, program), repeat)
+    lalr_tree = timed(lambda: parse_tree_lalr(tables, lalr_program), repeat)
+
+    print(f"{statements} statements, {tokens} tokens")
+    print(f"  LL(1)   {ll1_grammar}: build {t_ll1 * 1000:.2f} ms, "
+          f"table {len(cg.table)} entries")
+    print(f"  LALR(1) {lalr_grammar}: build {t_lalr * 1000:.2f} ms, {tables.n_states} states, "
+          f"table {tables.packed_size()} entries packed ({tables.dense_size()} dense)")
+    print(f"  productions  LL(1) {tokens / ll1_prods / 1e6:.2f} M tokens/s, "
+          f"LALR(1) {tokens / lalr_prods / 1e6:.2f} M tokens/s")
+    print(f"  parse tree   LL(1) {tokens / ll1_tree / 1e6:.2f} M tokens/s, "
+          f"LALR(1) {tokens / lalr_tree / 1e6:.2f} M tokens/s")
+    a = parse_tree_ids(cg, program)
+    b = parse_tree_lalr(tables, lalr_program)
+    nested, flat = check_flat_tree(tables, lalr_program)
+    print(f"  tree nodes   LL(1) {len(a)}, LALR(1) {len(b)}; "
+          f"depth LL(1) {tree_depth(a)}, LALR(1) {flat} ({nested} without flat_lists)")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="LL(1) vs LALR(1) parsing of the lab DSL")
+    arg_parser.add_argument("--ll1-grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--lalr-grammar", type=Path, default=Path("req2") / "grammar_lalr.txt")
+    arg_parser.add_argument("--statements", type=int, default=100000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    bench(args.ll1_grammar, args.lalr_grammar, args.statements, args.repeat, args.seed)
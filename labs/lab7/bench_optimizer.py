@@ -0,0 +1,109 @@
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from cache import load_compiled
+from interpreter import Instr, compile_program, execute
+from optimizer import execute_plan, optimize
+
+PROGRAMS = {
+    "split-join": """in_file = "input.txt"
+LOAD in_file
+SPLIT BY ","
+JOIN WITH ";"
+out_file = "output.txt"
+SAVE out_file
+""",
+    "clean": """in_file = "input.txt"
+LOAD in_file
+TRIM
+REPLACE "-" WITH "_"
+UPPERCASE
+out_file = "output.txt"
+SAVE out_file
+""",
+    "fields": """in_file = "input.txt"
+LOAD in_file
+SPLIT BY ","
+TRIM
+LOWERCASE
+JOIN WITH ";"
+out_file = "output.txt"
+SAVE out_file
+""",
+    "replaces": """in_file = "input.txt"
+LOAD in_file
+REPLACE "alpha" WITH "a"
+REPLACE "beta" WITH "b"
+REPLACE "-" WITH " "
+REPLACE "," WITH ";"
+UPPERCASE
+LOWERCASE
+TRIM
+TRIM
+tmp = "unused.txt"
+out_file = "output.txt"
+SAVE out_file
+""",
+}
+
+WORDS = ["alpha", "beta", "gamma", "delta", "x-ray", "Zulu", "  padded ", "42", ""]
+
+
+def write_input(path: Path, size: int, rng: random.Random) -> int:
+    """Writes about size bytes of comma separated lines; returns the line count."""
+    lines = [",".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))) for _ in range(1000)]
+    block = ("\n".join(lines) + "\n").encode()
+    with open(path, "wb") as f:
+        for _ in range(max(1, size // len(block))):
+            f.write(block)
+    return max(1, size // len(block)) * len(lines)
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(size: int, repeat: int, seed: int, names: List[str]) -> None:
+    cg = load_compiled(Path("req2") / "grammar.txt")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        lines = write_input(base / "input.txt", size, random.Random(seed))
+        total = (base / "input.txt").stat().st_size
+        print(f"input: {total / 1e6:.1f} MB, {lines} lines")
+        for name in names:
+            source = base / f"{name}.txt"
+            source.write_text(PROGRAMS[name])
+            program: List[Instr] = compile_program(cg, source)
+            plan = optimize(program, base)
+
+            t_plain = timed(lambda: execute(program, base), repeat)
+            expected = (base / "output.txt").read_bytes()
+            t_fused = timed(lambda: execute_plan(plan), repeat)
+            same = (base / "output.txt").read_bytes() == expected
+
+            statements = sum(p.statements() for p in plan.pipelines)
+            passes = sum(p.passes() for p in plan.pipelines)
+            print(f"  {name:<11} passes {statements} -> {passes}, "
+                  f"{t_plain:.3f} s -> {t_fused:.3f} s ({t_plain / t_fused:.1f}x, "
+                  f"{total / t_fused / 1e6:.0f} MB/s), "
+                  f"{'same output' if same else 'OUTPUT DIFFERS'}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Interpreter vs optimised text-transform programs")
+    arg_parser.add_argument("--size", type=int, default=50_000_000, help="input size in bytes")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--programs", nargs="+", default=list(PROGRAMS), choices=list(PROGRAMS))
+    args = arg_parser.parse_args()
+
+    bench(args.size, args.repeat, args.seed, args.programs)
@@ -0,0 +1,98 @@
+import glob
+import hashlib
+import os
+import pickle
+import re
+from pathlib import Path
+from typing import Optional
+
+from ll1 import Grammar, CompiledGrammar, compile_grammar
+
+# bump whenever CompiledGrammar's layout changes
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".ll1cache"
+# artifact names before the path hash was added: {stem}.{digest[:16]}.pickle
+LEGACY_NAME = re.compile(r"[0-9a-f]{16}\.pickle")
+
+
+def text_digest(data: bytes) -> str:
+    """Content hash of a grammar file, tied to the CompiledGrammar layout."""
+    h = hashlib.sha256(f"ll1-v{CACHE_VERSION}\n".encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+def grammar_digest(grammar_path: Path) -> str:
+    with open(grammar_path, "rb") as f:
+        return text_digest(f.read())
+
+
+def _artifact_prefix(grammar_path: Path) -> str:
+    """
+    stem plus a hash of the resolved path, so grammars with the same file
+    name can share a cache_dir without evicting each other.
+    """
+    grammar_path = Path(grammar_path)
+    where = hashlib.sha256(str(grammar_path.resolve()).encode()).hexdigest()[:8]
+    return f"{grammar_path.stem}.{where}"
+
+
+def cache_file_for(grammar_path: Path, digest: str,
+                   cache_dir: Optional[Path] = None) -> Path:
+    grammar_path = Path(grammar_path)
+    if cache_dir is None:
+        cache_dir = grammar_path.parent / CACHE_DIR_NAME
+    return Path(cache_dir) / f"{_artifact_prefix(grammar_path)}.{digest[:16]}.pickle"
+
+
+def _read_cache(path: Path, digest: str) -> Optional[CompiledGrammar]:
+    try:
+        with open(path, "rb") as f:
+            version, stored_digest, cg = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError,
+            pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if version != CACHE_VERSION or stored_digest != digest:
+        return None
+    if not isinstance(cg, CompiledGrammar):
+        return None
+    return cg
+
+
+def _write_cache(path: Path, prefix: str, digest: str, cg: CompiledGrammar) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # drop artifacts of older versions of the same grammar file, and any
+    # artifact of its stem in the layout without the path hash
+    stem = prefix.rsplit(".", 1)[0]
+    for stale in path.parent.glob(f"{glob.escape(stem)}.*.pickle"):
+        name = stale.name
+        if stale != path and (name.startswith(f"{prefix}.")
+                              or LEGACY_NAME.fullmatch(name, len(stem) + 1)):
+            stale.unlink(missing_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump((CACHE_VERSION, digest, cg), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load_compiled(grammar_path: Path,
+                  cache_dir: Optional[Path] = None,
+                  rebuild: bool = False) -> CompiledGrammar:
+    """
+    Returns the compiled grammar for grammar_path, reusing the cached artifact
+    when its content hash matches and (re)building it otherwise.
+    """
+    digest = grammar_digest(grammar_path)
+    path = cache_file_for(grammar_path, digest, cache_dir)
+
+    if not rebuild:
+        cg = _read_cache(path, digest)
+        if cg is not None:
+            return cg
+
+    cg = compile_grammar(Grammar.from_file(grammar_path))
+    try:
+        _write_cache(path, _artifact_prefix(grammar_path), digest, cg)
+    except OSError:
+        pass  # read-only location: still usable, just not cached
+    return cg
@@ -0,0 +1,110 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import json
+import socket
+import sys
+
+# the JSON objects exchanged with service.py, one per line
+Request = Dict[str, Any]
+Response = Dict[str, Any]
+
+
+class ServiceClient:
+    """Blocking client of service.py; requests may be pipelined with send_all."""
+
+    def __init__(self, socket_path: Optional[Path] = None,
+                 host: str = "127.0.0.1", port: int = 7070):
+        if socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(str(socket_path))
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile("rwb")
+        self.next_id = 0
+
+    def send_all(self, requests: List[Request]) -> List[Response]:
+        """Sends every request before reading; returns the answers in request order."""
+        ids = []
+        for req in requests:
+            req = dict(req, id=self.next_id)
+            ids.append(self.next_id)
+            self.next_id += 1
+            self.file.write(json.dumps(req, separators=(",", ":")).encode() + b"\n")
+        self.file.flush()
+        answers: Dict[int, Response] = {}
+        while len(answers) < len(ids):
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("service closed the connection")
+            resp = json.loads(line)
+            answers[resp.get("id")] = resp
+        return [answers[i] for i in ids]
+
+    def request(self, req: Request) -> Response:
+        return self.send_all([req])[0]
+
+    def close(self) -> None:
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self) -> "ServiceClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def format_response(resp: Response) -> Iterator[str]:
+    """Output lines in the format of main.py (productions or tree table)."""
+    if "productions" in resp:
+        for left, rhs in resp["productions"]:
+            yield f"{left} -> {' '.join(rhs)}"
+    elif "tree" in resp:
+        yield f"{'Idx':<5} {'Symbol':<10} {'Father':<10} {'Sibling':<10}"
+        yield "-" * 40
+        for idx, symbol, father, sibling in resp["tree"]:
+            yield f"{idx:<5} {symbol:<15} {father:<10} {sibling:<10}"
+    else:
+        yield json.dumps(resp)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Client of the LL(1) parse service")
+    where = arg_parser.add_mutually_exclusive_group()
+    where.add_argument("--socket", type=Path, help="service Unix socket")
+    where.add_argument("--port", type=int, default=7070, help="service port on localhost")
+    arg_parser.add_argument("pifs", nargs="*", type=Path, help="text PIF files to parse")
+    arg_parser.add_argument("--tokens", help="parse these space separated terminals instead")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt",
+                            help="grammar file (its content is sent)")
+    arg_parser.add_argument("--tree", action="store_true", help="ask for the parse tree")
+    arg_parser.add_argument("--stats", action="store_true", help="print the service counters")
+    args = arg_parser.parse_args()
+
+    grammar = args.grammar.read_text()
+    output = "tree" if args.tree else "productions"
+    requests: List[Request] = []
+    if args.tokens is not None:
+        requests.append({"grammar": grammar, "tokens": args.tokens.split(), "output": output})
+    for pif in args.pifs:
+        requests.append({"grammar": grammar, "pif": pif.read_text(), "output": output})
+    if args.stats:
+        requests.append({"op": "stats"})
+    if not requests:
+        arg_parser.error("nothing to send (give PIF files, --tokens or --stats)")
+
+    failed = False
+    with ServiceClient(args.socket, port=args.port) as client:
+        answers = client.send_all(requests)
+    labels = ["tokens"] * (args.tokens is not None) + [str(p) for p in args.pifs] + ["stats"]
+    for label, resp in zip(labels, answers):
+        if len(answers) > 1:
+            print(f"== {label}")
+        if not resp.get("ok"):
+            failed = True
+            print(f"error: {resp.get('error')}", file=sys.stderr)
+            continue
+        for line in format_response(resp):
+            print(line)
+    sys.exit(1 if failed else 0)
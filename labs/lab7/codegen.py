@@ -0,0 +1,331 @@
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional, Set, Tuple
+import argparse
+import importlib.util
+import random
+import re
+import sys
+import time
+
+from cache import grammar_digest, load_compiled
+from bench import random_sentence
+from ll1 import CompiledGrammar, parse_ids, parse_tree_ids, strongly_connected
+from pif import open_PIF_ids
+
+# nonterminals whose expanded code is at most this many lines are inlined
+INLINE_LIMIT = 60
+SENTENCE_LENGTH = 60  # longest random sentence of the check corpus
+
+HEADER = '''\
+# Generated by codegen.py from {source} (sha256 {digest}).
+# Do not edit; regenerate after changing the grammar.
+from typing import Iterable, List
+
+SYMBOLS = {symbols!r}
+N_TERMINALS = {n_terminals}
+ENDMARK = {endmark}
+PRODUCTIONS = {productions!r}
+SYMBOL_ID = {{s: i for i, s in enumerate(SYMBOLS)}}
+
+
+def _mismatch(expected: int, got: int, i: int) -> ValueError:
+    return ValueError(f"Parsing error at token {{i}}: expected {{SYMBOLS[expected]}}, got {{SYMBOLS[got]}}")
+
+
+def _no_rule(A: int, a: int) -> ValueError:
+    return ValueError(f"No rule for ({{SYMBOLS[A]}}, {{SYMBOLS[a]}}) in LL(1) table")
+
+
+def encode(tokens: Iterable[str]) -> List[int]:
+    ids = []
+    for t in tokens:
+        sym = SYMBOL_ID.get(t, -1)
+        if not 0 <= sym < N_TERMINALS:
+            raise ValueError(f"Unknown terminal in input: {{t}}")
+        ids.append(sym)
+    return ids
+
+
+def parse(token_ids: Iterable[int]) -> List[int]:
+    """Production ids of the leftmost derivation (same as ll1.parse_ids)."""
+    toks = list(token_ids)
+    toks.append(ENDMARK)
+    out: List[int] = []
+    i = {start_function}(toks, 0, out)
+    if toks[i] != ENDMARK:
+        raise _mismatch(ENDMARK, toks[i], i)
+    return out
+'''
+
+
+# ---------------------------
+# Code generation
+# ---------------------------
+
+class _ParserEmitter:
+    """
+    Emits one recursive-descent function per recursive (or large)
+    nonterminal; the other nonterminals are inlined into their callers.
+    A production ending in its own nonterminal becomes a loop, so list
+    rules like `L -> x L` use no recursion; other nesting (parentheses)
+    is limited by Python's recursion limit.
+    """
+
+    def __init__(self, cg: CompiledGrammar):
+        self.cg = cg
+        n_t = cg.n_terminals
+        n_sym = len(cg.symbols)
+
+        # production -> terminals selecting it, per nonterminal in table order
+        self.alternatives: Dict[int, List[Tuple[int, List[int]]]] = {}
+        for A in range(n_t, n_sym):
+            selecting: Dict[int, List[int]] = {}
+            for a in range(n_t):
+                p = cg.table[A * n_t + a]
+                if p >= 0:
+                    selecting.setdefault(p, []).append(a)
+            self.alternatives[A] = sorted(selecting.items())
+
+        succ: List[List[int]] = [[] for _ in range(n_sym)]
+        for p, rhs in enumerate(cg.prod_rhs):
+            succ[cg.prod_lhs[p]].extend(X for X in rhs if X >= n_t)
+        recursive: Set[int] = set()
+        for component in strongly_connected(n_sym, succ):
+            if len(component) > 1 or component[0] in succ[component[0]]:
+                recursive.update(component)
+
+        # components come dependencies first, so sizes are known when needed
+        self.size: Dict[int, int] = {}
+        self.inline: Set[int] = set()
+        for component in strongly_connected(n_sym, succ):
+            for A in component:
+                if A < n_t:
+                    continue
+                size = 2
+                for p, _ in self.alternatives[A]:
+                    size += 2
+                    for X in cg.prod_rhs[p]:
+                        size += 3 if X < n_t else self.size.get(X, 1)
+                self.size[A] = size
+                if A not in recursive and size <= INLINE_LIMIT:
+                    self.inline.add(A)
+
+        self.lines: List[str] = []
+        self.needed: List[int] = []
+
+    def function_name(self, A: int) -> str:
+        return f"_parse_{re.sub(r'[^0-9A-Za-z]', '_', self.cg.symbols[A])}_{A}"
+
+    def call(self, A: int) -> str:
+        if A not in self.needed:
+            self.needed.append(A)
+        return self.function_name(A)
+
+    def w(self, indent: int, text: str) -> None:
+        self.lines.append("    " * indent + text)
+
+    def production_str(self, p: int) -> str:
+        A, rhs = self.cg.prod_names[p]
+        return f"{A} -> {' '.join(rhs)}"
+
+    def dispatch(self, A: int, indent: int, function: Optional[int],
+                 known: Optional[Set[int]] = None) -> None:
+        """
+        Code choosing and expanding a production of A at toks[i]. function is A
+        when this is the body of A's own function (then self tail calls loop);
+        known is the set of terminals toks[i] is already known to be in.
+        """
+        alternatives = self.alternatives[A]
+        if known is not None:
+            alternatives = [(p, ts) for p, ts in alternatives if known & set(ts)]
+            if len(alternatives) == 1 and known <= set(alternatives[0][1]) and function is None:
+                # the caller's test already chose this production
+                p = alternatives[0][0]
+                self.w(indent, f"out.append({p})  # {self.production_str(p)}")
+                self.expand(p, indent, None, known)
+                return
+        self.w(indent, "a = toks[i]")
+        keyword = "if"
+        for p, terminals in alternatives:
+            if len(terminals) == 1:
+                cond = f"a == {terminals[0]}"
+            else:
+                cond = f"a in {{{', '.join(map(str, terminals))}}}"
+            self.w(indent, f"{keyword} {cond}:")
+            keyword = "elif"
+            self.w(indent + 1, f"out.append({p})  # {self.production_str(p)}")
+            looped = self.expand(p, indent + 1, function, set(terminals))
+            if function is not None and not looped:
+                self.w(indent + 1, "return i")
+        if keyword == "if":  # no productions usable at all
+            self.w(indent, f"raise _no_rule({A}, a)")
+        else:
+            self.w(indent, "else:")
+            self.w(indent + 1, f"raise _no_rule({A}, a)")
+
+    def expand(self, p: int, indent: int, function: Optional[int],
+               known: Set[int]) -> bool:
+        """
+        Code for the right side of p, chosen because toks[i] is in known;
+        True if it ends by looping.
+        """
+        cg = self.cg
+        rhs = cg.prod_rhs[p]
+        for k, X in enumerate(rhs):
+            if X < cg.n_terminals:
+                if k > 0:  # the first terminal was the lookahead that chose p
+                    self.w(indent, f"if toks[i] != {X}:")
+                    self.w(indent + 1, f"raise _mismatch({X}, toks[i], i)")
+                self.w(indent, "i += 1")
+            elif X == function and k == len(rhs) - 1:
+                self.w(indent, "continue")
+                return True
+            elif X in self.inline:
+                self.dispatch(X, indent, None, known if k == 0 else None)
+            else:
+                self.w(indent, f"i = {self.call(X)}(toks, i, out)")
+        return False
+
+    def function(self, A: int) -> None:
+        cg = self.cg
+        loops = any(cg.prod_rhs[p] and cg.prod_rhs[p][-1] == A
+                    for p, _ in self.alternatives[A])
+        self.w(0, "")
+        self.w(0, "")
+        self.w(0, f"def {self.function_name(A)}(toks: List[int], i: int, out: List[int]) -> int:")
+        self.w(1, f"# {cg.symbols[A]}")
+        if loops:
+            self.w(1, "while True:")
+            self.dispatch(A, 2, A)
+        else:
+            self.dispatch(A, 1, A)
+
+    def module(self, source: str, digest: str) -> str:
+        cg = self.cg
+        start_function = self.call(cg.start)
+        k = 0
+        while k < len(self.needed):  # grows while emitting
+            self.function(self.needed[k])
+            k += 1
+        productions = tuple((A, tuple(rhs)) for A, rhs in cg.prod_names)
+        header = HEADER.format(
+            source=source,
+            digest=digest[:16],
+            symbols=tuple(cg.symbols),
+            n_terminals=cg.n_terminals,
+            endmark=cg.endmark,
+            productions=productions,
+            start_function=start_function,
+        )
+        return header + "\n".join(self.lines) + "\n"
+
+
+def generate_parser(cg: CompiledGrammar, source: str = "<grammar>", digest: str = "") -> str:
+    """Source of a standalone module parsing cg's language (see HEADER)."""
+    return _ParserEmitter(cg).module(source, digest)
+
+
+def write_parser(grammar_path: Path, out_path: Path) -> CompiledGrammar:
+    cg = load_compiled(grammar_path)
+    code = generate_parser(cg, str(grammar_path), grammar_digest(grammar_path))
+    Path(out_path).write_text(code)
+    return cg
+
+
+def import_parser(path: Path) -> ModuleType:
+    path = Path(path)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------
+# Check mode
+# ---------------------------
+
+def _outcome(parse, ids: List[int]):
+    try:
+        return parse(ids)
+    except ValueError as e:
+        return f"error: {e}"
+
+
+def _table_driven(cg: CompiledGrammar, ids: List[int]) -> List[int]:
+    try:
+        return parse_ids(cg, ids)
+    except ValueError:
+        parse_tree_ids(cg, ids)  # same failure, with the token index in the message
+        raise
+
+
+def check(cg: CompiledGrammar, module: ModuleType, corpus: List[List[int]]) -> int:
+    """Number of inputs where the generated parser disagrees with the table-driven one."""
+    mismatches = 0
+    for ids in corpus:
+        expected = _outcome(lambda t: _table_driven(cg, t), ids)
+        got = _outcome(module.parse, ids)
+        if expected != got:
+            mismatches += 1
+            if mismatches <= 5:
+                names = " ".join(cg.symbols[t] for t in ids[:40])
+                print(f"mismatch on [{names}{' ...' if len(ids) > 40 else ''}]:\n"
+                      f"  table-driven: {str(expected)[:200]}\n  generated:    {str(got)[:200]}")
+    return mismatches
+
+
+def build_corpus(cg: CompiledGrammar, pif_paths: List[Path], count: int,
+                 seed: int) -> List[List[int]]:
+    """The PIF files plus random sentences, a third of them with one token changed."""
+    rng = random.Random(seed)
+    corpus = [list(open_PIF_ids(cg, path)) for path in pif_paths]
+    terminals = cg.n_terminals - 1  # never insert ENDMARK
+    for _ in range(count):
+        ids = list(cg.encode(random_sentence(cg, rng.randint(0, SENTENCE_LENGTH), rng)))
+        if rng.random() < 1 / 3:
+            k = rng.randint(0, len(ids))
+            if ids and rng.random() < 0.5:
+                ids[min(k, len(ids) - 1)] = rng.randrange(terminals)
+            else:
+                ids.insert(k, rng.randrange(terminals))
+        corpus.append(ids)
+    return corpus
+
+
+def run_check(grammar_path: Path, out_path: Path, pif_paths: List[Path],
+              count: int, seed: int) -> bool:
+    cg = write_parser(grammar_path, out_path)
+    module = import_parser(out_path)
+    corpus = build_corpus(cg, pif_paths, count, seed)
+    mismatches = check(cg, module, corpus)
+    print(f"{len(corpus)} inputs, {mismatches} mismatch(es)")
+
+    tokens = sum(len(ids) for ids in corpus)
+    for label, parse in (("table-driven", lambda t: parse_ids(cg, t)), ("generated", module.parse)):
+        start = time.perf_counter()
+        for ids in corpus:
+            _outcome(parse, ids)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<12} {tokens / elapsed / 1e6:.2f} M tokens/s")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Generate a standalone LL(1) parser module")
+    arg_parser.add_argument("grammar", type=Path)
+    arg_parser.add_argument("out", type=Path, help="Python file to write")
+    arg_parser.add_argument("--check", nargs="*", type=Path, metavar="PIF",
+                            help="compare with the table-driven parser on these PIF files "
+                                 "and random sentences")
+    arg_parser.add_argument("--sentences", type=int, default=2000,
+                            help="random sentences used by --check")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    if args.check is None:
+        write_parser(args.grammar, args.out)
+        print(f"Wrote {args.out}")
+    else:
+        ok = run_check(args.grammar, args.out, args.check, args.sentences, args.seed)
+        sys.exit(0 if ok else 1)
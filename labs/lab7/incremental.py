@@ -0,0 +1,282 @@
+from array import array
+from dataclasses import dataclass
+from itertools import compress
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ll1 import CompiledGrammar, ParseTree
+
+
+@dataclass
+class Reparse:
+    tokens: array  # token ids after the edit
+    tree: ParseTree
+    leaves: array  # token index -> terminal leaf of tree (pass to the next reparse)
+    reused_prefix: int  # nodes copied from before the edit
+    reused_suffix: int  # nodes spliced back after resynchronising
+    reparsed: int  # nodes built by the parser
+
+
+def token_leaves(tree: ParseTree, n_terminals: int) -> array:
+    """Token index -> the terminal leaf of tree that matched it."""
+    terminal_nodes = compress(range(len(tree)), map(n_terminals.__gt__, tree.symbol))
+    return array("i", sorted(terminal_nodes, key=tree.token.__getitem__))
+
+
+def _pending_top_down(tree: ParseTree, leaf: int) -> Iterator[int]:
+    """
+    Parser stack right after leaf was matched, from the top: the right
+    siblings of the leaf, then of its father, and so on up to the root.
+    """
+    sibling, father = tree.sibling, tree.father
+    x = leaf
+    while x != -1:
+        s = sibling[x]
+        while s != -1:
+            yield s
+            s = sibling[s]
+        x = father[x]
+
+
+def _pending_above(tree: ParseTree, leaf: int, prefix: int) -> Tuple[List[int], int]:
+    """
+    The part of the stack after leaf was matched that lies above its first
+    ancestor-or-self created before prefix: (entries bottom first, that ancestor).
+    """
+    sibling, father = tree.sibling, tree.father
+    pending: List[int] = []
+    x = leaf
+    while x >= prefix:
+        s = sibling[x]
+        while s != -1:
+            pending.append(s)
+            s = sibling[s]
+        x = father[x]
+    pending.reverse()
+    return pending, x
+
+
+def _stack_after(tree: ParseTree, leaves: Sequence[int], t: int) -> List[int]:
+    """Old parser stack (bottom first, -1 = ENDMARK) when token t is the lookahead."""
+    if t == 0:
+        return [-1, 0]
+    pending = list(_pending_top_down(tree, leaves[t - 1]))
+    pending.append(-1)
+    pending.reverse()
+    return pending
+
+
+def _next_block(tree: ParseTree, stack: Sequence[int]) -> int:
+    """Index of the first node created after the given stack state."""
+    first_child = tree.first_child
+    for x in reversed(stack):
+        if x >= 0 and first_child[x] != -1:
+            return first_child[x]
+    return len(tree)
+
+
+def _shift_tail(values: array, base: int, shift: int, keep_unset: bool) -> None:
+    """Adds shift to values[base:] in place; with keep_unset, -1 entries stay -1."""
+    if shift == 0 or base == len(values):
+        return
+    try:
+        import numpy as np
+    except ImportError:
+        tail = values[base:]
+        if keep_unset:
+            values[base:] = array("i", [v + shift if v >= 0 else -1 for v in tail])
+        else:
+            values[base:] = array("i", [v + shift for v in tail])
+        return
+    view = np.frombuffer(values, dtype=np.intc)[base:]
+    if keep_unset:
+        view[view >= 0] += shift
+    else:
+        view += shift
+    del view  # release the buffer so the array can grow again
+
+
+class Resume:
+    """The stack the parser resumed from (bottom first) at token index token."""
+
+    def __init__(self, stack: List[int], token: int, prefix: int):
+        self.stack = list(stack)
+        self.token = token
+        self.prefix = prefix  # nodes created before the resume point
+        self.position: Dict[int, int] = {x: k for k, x in enumerate(self.stack)}
+
+
+def reparse(cg: CompiledGrammar, old_tokens: Sequence[int], old_tree: ParseTree,
+            start: int, end: int, inserted: Sequence[int],
+            old_leaves: Optional[Sequence[int]] = None) -> Reparse:
+    """
+    Incremental LL(1) reparse after replacing old_tokens[start:end] with inserted.
+
+    The parse up to the last unchanged token before the edit is copied from
+    old_tree, the parser resumes from the stack it had at that point (read off
+    the tree), and after the edit it compares its stack with the old stack at
+    the corresponding token. Once they agree the remaining old nodes are
+    appended with their indices shifted once, in place. The LL(1) parse is
+    deterministic, so the result is identical (node numbering included) to
+    parse_tree_ids on the new token stream.
+
+    old_leaves is the token -> leaf index of old_tree (Reparse.leaves of the
+    previous reparse); it is rebuilt from the tree when not given.
+    """
+    if not 0 <= start <= end <= len(old_tokens):
+        raise ValueError(f"Bad edit range [{start}, {end}) for {len(old_tokens)} tokens")
+
+    tokens = array("i", old_tokens[:start])
+    tokens.extend(inserted)
+    tokens.extend(old_tokens[end:])
+    delta = len(inserted) - (end - start)
+    new_end = start + len(inserted)
+    n_new = len(tokens)
+
+    n_t = cg.n_terminals
+    table = cg.table
+    rhs = cg.prod_rhs
+    names = cg.symbols
+    endmark = cg.endmark
+    old = old_tree
+    old_leaves = token_leaves(old, n_t) if old_leaves is None else old_leaves
+
+    # resume right after the last token before the edit
+    stack = _stack_after(old, old_leaves, start)
+    prefix = _next_block(old, stack)
+    resume = Resume(stack, start, prefix)
+    tree = ParseTree(old.names)
+    tree.symbol = old.symbol[:prefix]
+    tree.father = old.father[:prefix]
+    tree.sibling = old.sibling[:prefix]
+    tree.first_child = old.first_child[:prefix]
+    tree.token = old.token[:prefix]
+    for x in stack:
+        if x >= 0:
+            tree.first_child[x] = -1
+            tree.token[x] = -1
+    leaves = array("i", old_leaves[:start])
+
+    node_sym = tree.symbol
+    node_token = tree.token
+    add_children = tree.add_children
+    add_leaf = leaves.append
+    pop = stack.pop
+    push_all = stack.extend
+
+    i = start
+    current = tokens[i] if i < n_new else endmark
+    # the stacks agree at every token after the first one where they agree,
+    # so the comparison is tried at new_end, new_end + 1, + 2, + 4, ...
+    next_check = new_end
+    low = len(stack)  # stack[:low] has not been popped since resuming
+
+    while stack:
+        if i == next_check:
+            next_check = new_end + 2 * (i - new_end) if i > new_end else i + 1
+            spliced = _splice(cg, old, old_leaves, tree, leaves, stack, resume, low,
+                              i - delta, delta)
+            if spliced >= 0:
+                return Reparse(tokens, tree, leaves, prefix, spliced,
+                               len(tree) - prefix - spliced)
+
+        top_idx = pop()
+        if len(stack) < low:
+            low = len(stack)
+        if top_idx >= 0:
+            top = node_sym[top_idx]
+            node_token[top_idx] = i
+        else:
+            top = endmark
+        if top < n_t:
+            if top != current:
+                raise ValueError(
+                    f"Parsing error at token {i}: expected {names[top]}, got {names[current]}"
+                )
+            if top_idx >= 0:
+                add_leaf(top_idx)
+            i += 1
+            current = tokens[i] if i < n_new else endmark
+        else:
+            p = table[top * n_t + current]
+            if p < 0:
+                raise ValueError(f"No rule for ({names[top]}, {names[current]}) in LL(1) table")
+            children = rhs[p]
+            if children:
+                first = add_children(top_idx, children)
+                push_all(range(first + len(children) - 1, first - 1, -1))
+
+    return Reparse(tokens, tree, leaves, prefix, 0, len(tree) - prefix)
+
+
+def _splice(cg: CompiledGrammar, old: ParseTree, old_leaves: Sequence[int],
+            tree: ParseTree, leaves: array, stack: List[int], resume: Resume, low: int,
+            old_pos: int, delta: int) -> int:
+    """
+    If the current stack equals the old stack when old token old_pos was the
+    lookahead, appends the rest of the old tree to tree and returns the number
+    of nodes appended; returns -1 otherwise. leaves is extended the same way.
+
+    Both stacks are the resume stack cut at some height (low for the current
+    one) with newer nodes on top, so only the parts above the lower cut are
+    compared.
+    """
+    base_stack = resume.stack
+    if old_pos == resume.token:
+        old_cut, old_top = len(base_stack), []
+    else:
+        old_top, anchor = _pending_above(old, old_leaves[old_pos - 1], resume.prefix)
+        old_cut = resume.position.get(anchor, -1)
+        if old_cut < 0:
+            return -1
+    new_cut = low
+    if old_cut + len(old_top) != len(stack):
+        return -1
+    cut = min(old_cut, new_cut)
+    old_part = base_stack[cut:old_cut] + old_top
+    new_part = stack[cut:]
+
+    new_symbol, old_symbol = tree.symbol, old.symbol
+    for o, x in zip(old_part, new_part):
+        if o < 0 or x < 0 or new_symbol[x] != old_symbol[o]:
+            return -1
+    pairs = list(zip(base_stack[:cut], base_stack[:cut]))
+    pairs.extend(zip(old_part, new_part))
+
+    first_old = _next_block(old, [o for o, _ in pairs])
+    base = len(tree)
+    shift = base - first_old
+
+    old_first_child, old_token = old.first_child, old.token
+    for o, x in pairs:
+        if o < 0:
+            continue
+        fc = old_first_child[o]
+        tree.first_child[x] = fc + shift if fc != -1 else -1
+        tree.token[x] = old_token[o] + delta
+
+    tree.symbol.extend(old.symbol[first_old:])
+    tree.father.extend(old.father[first_old:])
+    tree.sibling.extend(old.sibling[first_old:])
+    tree.first_child.extend(old.first_child[first_old:])
+    tree.token.extend(old.token[first_old:])
+    _shift_tail(tree.father, base, shift, keep_unset=False)
+    _shift_tail(tree.sibling, base, shift, keep_unset=True)
+    _shift_tail(tree.first_child, base, shift, keep_unset=True)
+    _shift_tail(tree.token, base, delta, keep_unset=False)
+
+    # children of nodes that were still on the stack point back at them, and
+    # terminals that were still on the stack are leaves from before base
+    n_leaves = len(leaves)
+    leaves.extend(old_leaves[old_pos:])
+    _shift_tail(leaves, n_leaves, shift, keep_unset=False)
+    n_t = cg.n_terminals
+    for o, x in pairs:
+        if o < 0:
+            continue
+        if old_symbol[o] < n_t:
+            leaves[old_token[o] + delta] = x
+        c = old_first_child[o]
+        while c != -1:
+            tree.father[c + shift] = x
+            c = old.sibling[c]
+    return len(tree) - base
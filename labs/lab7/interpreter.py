@@ -0,0 +1,312 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+import argparse
+
+from cache import load_compiled
+from ll1 import CompiledGrammar, ParseTree
+from pipeline import parse_source_tree
+
+CHUNK_SIZE = 1 << 20  # bytes read from a LOADed file at a time
+
+# statement nonterminal -> IR opcode
+STATEMENTS = {
+    "load_stmt": "LOAD",
+    "replace_stmt": "REPLACE",
+    "split_stmt": "SPLIT",
+    "join_stmt": "JOIN",
+    "trim_stmt": "TRIM",
+    "uppercase_stmt": "UPPERCASE",
+    "lowercase_stmt": "LOWERCASE",
+    "save_stmt": "SAVE",
+    "assignment_stmt": "ASSIGN",
+}
+
+Records = List[bytes]
+ChunkFunction = Callable[[Records], List[Records]]
+
+
+# ---------------------------
+# IR
+# ---------------------------
+
+@dataclass
+class Instr:
+    """
+    One statement: op is an opcode from STATEMENTS, args its ID/STRING
+    operands in source order (strings without the quotes), token the index
+    of the statement's first token.
+    """
+    op: str
+    args: Tuple[str, ...] = ()
+    token: int = -1
+
+    def __str__(self) -> str:
+        if self.op == "ASSIGN":
+            return f'{self.args[0]} = "{self.args[1]}"'
+        if self.op in ("LOAD", "SAVE"):
+            return f"{self.op} {self.args[0]}"
+        if self.op == "REPLACE":
+            return f'REPLACE "{self.args[0]}" WITH "{self.args[1]}"'
+        if self.op == "SPLIT":
+            return f'SPLIT BY "{self.args[0]}"'
+        if self.op == "JOIN":
+            return f'JOIN WITH "{self.args[0]}"'
+        return self.op
+
+
+def lower(tree: ParseTree, lexemes: List[bytes]) -> List[Instr]:
+    """Turns a parse tree of the DSL grammar into the statement list."""
+    program: List[Instr] = []
+    if not len(tree):
+        return program
+    for i in tree.preorder():
+        op = STATEMENTS.get(tree.symbol_name(i))
+        if op is None:
+            continue
+        args = []
+        for c in tree.children(i):
+            name = tree.symbol_name(c)
+            if name == "ID":
+                args.append(lexemes[tree.token[c]].decode())
+            elif name == "STRING":
+                args.append(lexemes[tree.token[c]][1:-1].decode())
+        program.append(Instr(op, tuple(args), tree.token[i]))
+    return program
+
+
+def compile_program(cg: CompiledGrammar, source: Union[Path, str],
+                    mode: str = "inline") -> List[Instr]:
+    lexemes: List[bytes] = []
+    tree = parse_source_tree(cg, source, mode, lexemes=lexemes)
+    return lower(tree, lexemes)
+
+
+# ---------------------------
+# Planning
+# ---------------------------
+
+@dataclass
+class Pipeline:
+    """
+    Everything between a LOAD and the next one: the record operations in
+    order, with SAVE steps naming their output path instead of a variable.
+    """
+    source: Path
+    steps: List[Instr] = field(default_factory=list)
+
+    @property
+    def outputs(self) -> List[Path]:
+        return [Path(s.args[0]) for s in self.steps if s.op == "SAVE"]
+
+
+def plan(program: List[Instr], base_dir: Path = Path(".")) -> List[Pipeline]:
+    """
+    Resolves variables and splits the program at its LOADs. Rejects
+    programs that could not run: undefined variables, operations before the
+    first LOAD, SAVE of split records, JOIN without SPLIT and empty patterns.
+    """
+    env: Dict[str, str] = {}
+    pipelines: List[Pipeline] = []
+    split = False
+
+    def value(ins: Instr) -> str:
+        name = ins.args[0]
+        if name not in env:
+            raise ValueError(f"{ins.op} at token {ins.token}: undefined variable {name}")
+        return env[name]
+
+    for ins in program:
+        if ins.op == "ASSIGN":
+            env[ins.args[0]] = ins.args[1]
+            continue
+        if ins.op == "LOAD":
+            pipelines.append(Pipeline(base_dir / value(ins)))
+            split = False
+            continue
+        if not pipelines:
+            raise ValueError(f"{ins.op} at token {ins.token}: no file LOADed")
+        if ins.op in ("REPLACE", "SPLIT") and not ins.args[0]:
+            raise ValueError(f"{ins.op} at token {ins.token}: empty pattern")
+        if ins.op == "SPLIT":
+            split = True
+        elif ins.op == "JOIN":
+            if not split:
+                raise ValueError(f"JOIN at token {ins.token}: records are not split")
+            split = False
+        elif ins.op == "SAVE":
+            if split:
+                raise ValueError(f"SAVE at token {ins.token}: records are split (JOIN them first)")
+            ins = Instr("SAVE", (str(base_dir / value(ins)),), ins.token)
+        pipelines[-1].steps.append(ins)
+
+    for p in pipelines:
+        outputs = [o.resolve() for o in p.outputs]
+        if len(set(outputs)) != len(outputs):
+            raise ValueError(f"{p.source}: the same file is SAVEd twice")
+        if p.source.resolve() in outputs:
+            raise ValueError(f"{p.source}: SAVE would overwrite the file being LOADed")
+    return pipelines
+
+
+# ---------------------------
+# Record operations
+# ---------------------------
+
+def record_op(ins: Instr, split: bool) -> Callable[[list], list]:
+    """
+    The list -> list function of one statement over a chunk of records
+    (bytes, or lists of fields once split). Case mapping is ASCII only.
+    """
+    op = ins.op
+    args = [a.encode() for a in ins.args]
+    if op == "REPLACE":
+        old, new = args
+        if split:
+            return lambda recs: [[f.replace(old, new) for f in r] for r in recs]
+        return lambda recs: [r.replace(old, new) for r in recs]
+    if op in ("TRIM", "UPPERCASE", "LOWERCASE"):
+        method = {"TRIM": bytes.strip, "UPPERCASE": bytes.upper, "LOWERCASE": bytes.lower}[op]
+        if split:
+            return lambda recs: [[method(f) for f in r] for r in recs]
+        return lambda recs: [method(r) for r in recs]
+    if op == "SPLIT":
+        sep = args[0]
+        if split:
+            return lambda recs: [[g for f in r for g in f.split(sep)] for r in recs]
+        return lambda recs: [r.split(sep) for r in recs]
+    if op == "JOIN":
+        join = args[0].join
+        return lambda recs: [join(r) for r in recs]
+    raise ValueError(f"Not a record operation: {op}")
+
+
+def chunk_function(pipeline: Pipeline) -> ChunkFunction:
+    """
+    Compiles the steps of a pipeline into one function from a chunk of
+    input records to the records written to each SAVE, in SAVE order.
+    Steps after the last SAVE have no effect and are left out.
+    """
+    last_save = max((k for k, s in enumerate(pipeline.steps) if s.op == "SAVE"), default=-1)
+    ops: List[Optional[Callable[[list], list]]] = []  # None marks a SAVE
+    split = False
+    for ins in pipeline.steps[:last_save + 1]:
+        if ins.op == "SAVE":
+            ops.append(None)
+            continue
+        ops.append(record_op(ins, split))
+        if ins.op == "SPLIT":
+            split = True
+        elif ins.op == "JOIN":
+            split = False
+
+    def run(records: Records) -> List[Records]:
+        saved = []
+        for f in ops:
+            if f is None:
+                saved.append(records)
+            else:
+                records = f(records)
+        return saved
+
+    return run
+
+
+# ---------------------------
+# Streaming execution
+# ---------------------------
+
+def read_blocks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yields a file in blocks of about chunk_size bytes cut after a newline;
+    only the last block may lack one. A line longer than chunk_size is
+    kept whole.
+    """
+    with open(path, "rb") as f:
+        pending: List[bytes] = []
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            cut = block.rfind(b"\n") + 1
+            if not cut:
+                pending.append(block)
+                continue
+            if pending:
+                pending.append(block[:cut])
+                yield b"".join(pending)
+                pending = []
+            else:
+                yield block[:cut]
+            if cut < len(block):
+                pending.append(block[cut:])
+        if pending:
+            yield b"".join(pending)
+
+
+def read_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[Records, bool]]:
+    """
+    The lines of a file in chunks, as (records, terminated); only a last
+    line without a newline comes with terminated False. Lines end in LF
+    only: with CRLF endings each record keeps its trailing \\r as
+    ordinary data.
+    """
+    for block in read_blocks(path, chunk_size):
+        if block[-1:] == b"\n":
+            yield block[:-1].split(b"\n"), True
+        else:
+            yield block.split(b"\n"), False
+
+
+def write_records(out, records: Records, terminated: bool) -> None:
+    out.write(b"\n".join(records))
+    if terminated:
+        out.write(b"\n")
+
+
+def run_pipeline(pipeline: Pipeline, chunk_size: int = CHUNK_SIZE) -> int:
+    """Streams one pipeline chunk by chunk; returns the number of records read."""
+    outputs = pipeline.outputs
+    if not outputs:
+        return 0  # nothing would be written
+    fn = chunk_function(pipeline)
+    files = []
+    count = 0
+    try:
+        for path in outputs:
+            files.append(open(path, "wb"))
+        for records, terminated in read_chunks(pipeline.source, chunk_size):
+            count += len(records)
+            for out, saved in zip(files, fn(records)):
+                write_records(out, saved, terminated)
+    finally:
+        for out in files:
+            out.close()
+    return count
+
+
+def execute(program: List[Instr], base_dir: Path = Path("."),
+            chunk_size: int = CHUNK_SIZE) -> int:
+    """Runs a lowered program; returns the number of records read."""
+    return sum(run_pipeline(p, chunk_size) for p in plan(program, base_dir))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run a text-transform program")
+    arg_parser.add_argument("program", type=Path, nargs="?",
+                            default=Path("..") / "lab3" / "prog1.txt")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--base-dir", type=Path, default=Path("."),
+                            help="directory the LOAD/SAVE file names are relative to")
+    arg_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    arg_parser.add_argument("--show", action="store_true",
+                            help="print the statements instead of running them")
+    args = arg_parser.parse_args()
+
+    stmts = compile_program(load_compiled(args.grammar), args.program)
+    if args.show:
+        for ins in stmts:
+            print(ins)
+    else:
+        n = execute(stmts, args.base_dir, args.chunk_size)
+        print(f"Processed {n} records")
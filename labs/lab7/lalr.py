@@ -0,0 +1,531 @@
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from ll1 import CompiledGrammar, Grammar, ParseTree, compile_grammar
+
+
+# ---------------------------
+# LR(0) automaton
+# ---------------------------
+
+class _Items:
+    """
+    LR(0) items of the augmented grammar numbered densely: item = base[p] + dot.
+    The augmented production S' -> S gets the last production id and the
+    symbol id after the grammar's symbols.
+    """
+
+    def __init__(self, cg: CompiledGrammar):
+        self.n_terminals = cg.n_terminals
+        self.eps = cg.eps_bit
+        self.aug_symbol = len(cg.symbols)
+        self.aug_prod = len(cg.prod_rhs)
+        self.lhs: List[int] = list(cg.prod_lhs) + [self.aug_symbol]
+        self.rhs: List[Tuple[int, ...]] = list(cg.prod_rhs) + [(cg.start,)]
+        self.suffix: List[Tuple[int, ...]] = list(cg.suffix_first) + [(cg.first[cg.start], self.eps)]
+
+        self.prods_of: List[List[int]] = [[] for _ in range(self.aug_symbol + 1)]
+        for p, A in enumerate(self.lhs):
+            self.prods_of[A].append(p)
+
+        self.base = array("i")
+        self.prod = array("i")
+        self.dot = array("i")
+        for p, rhs in enumerate(self.rhs):
+            self.base.append(len(self.prod))
+            for d in range(len(rhs) + 1):
+                self.prod.append(p)
+                self.dot.append(d)
+
+    def next_symbol(self, item: int) -> int:
+        """Symbol after the dot, -1 for a completed item."""
+        rhs = self.rhs[self.prod[item]]
+        d = self.dot[item]
+        return rhs[d] if d < len(rhs) else -1
+
+    def closure(self, kernel: Iterable[int]) -> List[int]:
+        items = list(kernel)
+        expanded = set()
+        n_t = self.n_terminals
+        for item in items:  # grows while iterating
+            X = self.next_symbol(item)
+            if X >= n_t and X not in expanded:
+                expanded.add(X)
+                items.extend(self.base[q] for q in self.prods_of[X])
+        return items
+
+    def closure_lookaheads(self, seed: Dict[int, int]) -> Dict[int, int]:
+        """
+        LR(1) closure with lookaheads as terminal bitsets. eps_bit is used as
+        the "#" marker of the propagation pass: it survives exactly where the
+        seed's own lookahead flows into an item.
+        """
+        la = dict(seed)
+        work = list(seed)
+        n_t = self.n_terminals
+        eps = self.eps
+        while work:
+            item = work.pop()
+            X = self.next_symbol(item)
+            if X < n_t:
+                continue
+            beta = self.suffix[self.prod[item]][self.dot[item] + 1]
+            new = (beta & ~eps) | la[item] if beta & eps else beta
+            for q in self.prods_of[X]:
+                j = self.base[q]
+                old = la.get(j, 0)
+                if new & ~old:
+                    la[j] = old | new
+                    work.append(j)
+        return la
+
+
+def _lr0_states(items: _Items) -> Tuple[List[Tuple[int, ...]], List[Dict[int, int]]]:
+    """Kernels of the canonical LR(0) collection and their goto edges."""
+    start = (items.base[items.aug_prod],)
+    kernels: List[Tuple[int, ...]] = [start]
+    state_of: Dict[Tuple[int, ...], int] = {start: 0}
+    gotos: List[Dict[int, int]] = []
+
+    for kernel in kernels:  # grows while iterating
+        moves: Dict[int, List[int]] = {}
+        for item in items.closure(kernel):
+            X = items.next_symbol(item)
+            if X >= 0:
+                moves.setdefault(X, []).append(item + 1)
+        edges: Dict[int, int] = {}
+        for X, targets in moves.items():
+            key = tuple(sorted(set(targets)))
+            t = state_of.get(key)
+            if t is None:
+                t = state_of[key] = len(kernels)
+                kernels.append(key)
+            edges[X] = t
+        gotos.append(edges)
+
+    return kernels, gotos
+
+
+def _lalr_lookaheads(cg: CompiledGrammar, items: _Items,
+                     kernels: List[Tuple[int, ...]],
+                     gotos: List[Dict[int, int]]) -> List[Dict[int, int]]:
+    """
+    Lookaheads of every kernel item by spontaneous generation and
+    propagation (one LR(1) closure per kernel item, then a fixpoint).
+    """
+    eps = items.eps
+    offset = []
+    slot_of: List[Dict[int, int]] = []
+    total = 0
+    for kernel in kernels:
+        offset.append(total)
+        slot_of.append({item: total + k for k, item in enumerate(kernel)})
+        total += len(kernel)
+
+    la = [0] * total
+    propagates: List[List[int]] = [[] for _ in range(total)]
+    la[0] = 1 << cg.endmark  # S' -> . S
+
+    for s, kernel in enumerate(kernels):
+        for k, item in enumerate(kernel):
+            source = offset[s] + k
+            for j, L in items.closure_lookaheads({item: eps}).items():
+                X = items.next_symbol(j)
+                if X < 0:
+                    continue
+                target = slot_of[gotos[s][X]][j + 1]
+                la[target] |= L & ~eps
+                if L & eps:
+                    propagates[source].append(target)
+
+    work = list(range(total))
+    while work:
+        source = work.pop()
+        bits = la[source]
+        for target in propagates[source]:
+            if bits & ~la[target]:
+                la[target] |= bits
+                work.append(target)
+
+    return [{item: la[offset[s] + k] for k, item in enumerate(kernel)}
+            for s, kernel in enumerate(kernels)]
+
+
+# ---------------------------
+# Table construction
+# ---------------------------
+
+def _production_str(cg: CompiledGrammar, p: int) -> str:
+    if p == len(cg.prod_names):  # augmented
+        start = cg.symbols[cg.start]
+        return f"{start}' -> {start}"
+    A, rhs = cg.prod_names[p]
+    return f"{A} -> {' '.join(rhs)}"
+
+
+def _pack_rows(rows: List[Dict[int, int]], width: int) -> Tuple[array, array, array]:
+    """
+    Row displacement: every row's entries are placed at base[row] + column of
+    shared value/check arrays (first fit, fullest rows first). check holds the
+    owning row, so a lookup that lands on another row's entry is a miss.
+    """
+    base = array("i", [0]) * len(rows)
+    check: List[int] = []
+    value: List[int] = []
+    for r in sorted(range(len(rows)), key=lambda r: -len(rows[r])):
+        row = rows[r]
+        if not row:
+            continue
+        cols = sorted(row)
+        b = 0
+        while any(b + c < len(check) and check[b + c] != -1 for c in cols):
+            b += 1
+        end = b + cols[-1] + 1
+        if end > len(check):
+            check.extend([-1] * (end - len(check)))
+            value.extend([0] * (end - len(value)))
+        for c in cols:
+            check[b + c] = r
+            value[b + c] = row[c]
+        base[r] = b
+    # every base + column lookup stays in range
+    pad = max(base, default=0) + width - len(check)
+    if pad > 0:
+        check.extend([-1] * pad)
+        value.extend([0] * pad)
+    return base, array("i", check), array("i", value)
+
+
+@dataclass
+class LALRTables:
+    """
+    Compressed LALR(1) tables over the ids of a CompiledGrammar.
+
+    Actions: s + 1 = shift to state s, -(p + 1) = reduce by production p,
+    0 = error; reducing the augmented production (id len(prod_rhs)) accepts.
+    action(s, a) = action_value[action_base[s] + a] if the check array
+    holds s there, else action_default[s] (the row's most common reduction).
+    Gotos are packed by nonterminal column the same way:
+    goto(s, A) = goto_value[goto_base[A] + s] if goto_check holds A, else goto_default[A].
+    expected_bits[s] holds the terminals with an action of their own in
+    state s, before the row default was taken out.
+    """
+    cg: CompiledGrammar
+    n_states: int
+    prod_lhs: array
+    prod_len: array
+    accept: int
+    action_base: array
+    action_check: array
+    action_value: array
+    action_default: array
+    goto_base: array
+    goto_check: array
+    goto_value: array
+    goto_default: array
+    expected_bits: List[int]
+
+    def action(self, s: int, a: int) -> int:
+        i = self.action_base[s] + a
+        return self.action_value[i] if self.action_check[i] == s else self.action_default[s]
+
+    def goto(self, s: int, A: int) -> int:
+        i = self.goto_base[A] + s
+        return self.goto_value[i] if self.goto_check[i] == A else self.goto_default[A]
+
+    def expected(self, s: int) -> List[str]:
+        bits = self.expected_bits[s]
+        return [self.cg.symbols[a] for a in range(self.cg.n_terminals) if bits >> a & 1]
+
+    def dense_size(self) -> int:
+        return self.n_states * len(self.cg.symbols)
+
+    def packed_size(self) -> int:
+        return (len(self.action_value) + len(self.goto_value)
+                + self.n_states + len(self.goto_default))
+
+
+def build_lalr(cg: CompiledGrammar) -> LALRTables:
+    """LALR(1) tables for cg; conflicts raise ValueError."""
+    items = _Items(cg)
+    kernels, gotos = _lr0_states(items)
+    lookaheads = _lalr_lookaheads(cg, items, kernels, gotos)
+    n_t = cg.n_terminals
+    n_sym = len(cg.symbols)
+    names = cg.symbols
+    accept = -(items.aug_prod + 1)
+
+    action_rows: List[Dict[int, int]] = []
+    action_default = array("i")
+    expected_bits: List[int] = []
+    goto_rows: List[Dict[int, int]] = [{} for _ in range(n_sym)]
+
+    for s, edges in enumerate(gotos):
+        row: Dict[int, int] = {}
+        for X, t in edges.items():
+            if X < n_t:
+                row[X] = t + 1
+            else:
+                goto_rows[X][s] = t
+
+        for item, L in items.closure_lookaheads(lookaheads[s]).items():
+            if items.next_symbol(item) >= 0:
+                continue
+            p = items.prod[item]
+            act = -(p + 1)
+            while L:
+                low = L & -L
+                a = low.bit_length() - 1
+                L ^= low
+                old = row.get(a, 0)
+                if old == 0 or old == act:
+                    row[a] = act
+                    continue
+                kind = "shift/reduce" if old > 0 else "reduce/reduce"
+                other = "" if old > 0 else f" and {_production_str(cg, -old - 1)}"
+                raise ValueError(
+                    f"LALR(1) {kind} conflict in state {s} on {names[a]}: "
+                    f"{_production_str(cg, p)}{other}"
+                )
+
+        expected_bits.append(sum(1 << a for a in row))
+        # the most common reduction becomes the row default (never accept,
+        # which must only fire on ENDMARK)
+        reductions = Counter(act for act in row.values() if act < 0 and act != accept)
+        default = reductions.most_common(1)[0][0] if reductions else 0
+        action_default.append(default)
+        action_rows.append({a: act for a, act in row.items() if act != default})
+
+    goto_default = array("i", [0]) * n_sym
+    for A in range(n_t, n_sym):
+        column = goto_rows[A]
+        if column:
+            default = Counter(column.values()).most_common(1)[0][0]
+            goto_default[A] = default
+            goto_rows[A] = {s: t for s, t in column.items() if t != default}
+
+    action_base, action_check, action_value = _pack_rows(action_rows, n_t)
+    goto_base, goto_check, goto_value = _pack_rows(goto_rows, len(kernels))
+
+    return LALRTables(
+        cg=cg,
+        n_states=len(kernels),
+        prod_lhs=array("i", items.lhs),
+        prod_len=array("i", (len(rhs) for rhs in items.rhs)),
+        accept=accept,
+        action_base=action_base,
+        action_check=action_check,
+        action_value=action_value,
+        action_default=action_default,
+        goto_base=goto_base,
+        goto_check=goto_check,
+        goto_value=goto_value,
+        goto_default=goto_default,
+        expected_bits=expected_bits,
+    )
+
+
+def load_lalr(grammar_path: Path) -> LALRTables:
+    return build_lalr(compile_grammar(Grammar.from_file(grammar_path), ll1_table=False))
+
+
+# ---------------------------
+# LALR(1) drivers
+# ---------------------------
+
+def _syntax_error(t: LALRTables, token_state: int, s: int, i: int, current: int) -> ValueError:
+    """
+    Default reductions may have run since the current token was read, so
+    the expected terminals are those of the state that first saw it
+    (token_state), unless that state had an action for the token itself.
+    """
+    if t.expected_bits[token_state] >> current & 1:
+        token_state = s
+    return ValueError(
+        f"Parsing error at token {i}: unexpected {t.cg.symbols[current]}, "
+        f"expected one of {', '.join(t.expected(token_state))}"
+    )
+
+
+def iter_reductions(t: LALRTables, token_ids: Iterable[int]) -> Iterator[int]:
+    """
+    Shift-reduce driver over token ids; yields production ids in reduction
+    order (a rightmost derivation in reverse).
+    """
+    a_base, a_check, a_value, a_default = t.action_base, t.action_check, t.action_value, t.action_default
+    g_base, g_check, g_value, g_default = t.goto_base, t.goto_check, t.goto_value, t.goto_default
+    prod_lhs, prod_len, accept = t.prod_lhs, t.prod_len, t.accept
+    endmark = t.cg.endmark
+    next_token = iter(token_ids).__next__
+
+    stack: List[int] = [0]
+    push = stack.append
+    token_state = 0  # state the current token was first looked up in
+    i = 0
+    try:
+        current = next_token()
+    except StopIteration:
+        current = endmark
+
+    while True:
+        s = stack[-1]
+        k = a_base[s] + current
+        act = a_value[k] if a_check[k] == s else a_default[s]
+        if act > 0:
+            token_state = act - 1
+            push(token_state)
+            i += 1
+            try:
+                current = next_token()
+            except StopIteration:
+                current = endmark
+        elif act < 0:
+            if act == accept:
+                return
+            p = -act - 1
+            n = prod_len[p]
+            if n:
+                del stack[-n:]
+            A = prod_lhs[p]
+            k = g_base[A] + stack[-1]
+            push(g_value[k] if g_check[k] == A else g_default[A])
+            yield p
+        else:
+            raise _syntax_error(t, token_state, s, i, current)
+
+
+def parse_lalr_ids(t: LALRTables, token_ids: Iterable[int]) -> List[int]:
+    return list(iter_reductions(t, token_ids))
+
+
+def parse_tree_lalr(t: LALRTables, token_ids: Iterable[int], flat_lists: bool = True) -> ParseTree:
+    """
+    LALR(1) driver building a ParseTree numbered like the LL(1) driver's.
+    Each reduction records, per child, the reduction that built it (-1 for
+    tokens) and its first token; the tree is then allocated top-down in
+    LL(1) expansion order so children stay contiguous. With flat_lists, a
+    chain of left-recursive reductions (A -> A x ... down to a base A -> y)
+    becomes one A node with children y x ..., so a list of n elements is one
+    level deep instead of n; without it the tree follows the derivation.
+    """
+    a_base, a_check, a_value, a_default = t.action_base, t.action_check, t.action_value, t.action_default
+    g_base, g_check, g_value, g_default = t.goto_base, t.goto_check, t.goto_value, t.goto_default
+    prod_lhs, prod_len, accept = t.prod_lhs, t.prod_len, t.accept
+    cg = t.cg
+    endmark = cg.endmark
+    next_token = iter(token_ids).__next__
+
+    reductions = array("i")
+    child_offset = array("i")
+    child_reduction = array("i")
+    child_start = array("i")
+    stack: List[int] = [0]
+    built_by: List[int] = [-1]  # reduction that produced each stack entry
+    positions: List[int] = [0]  # token index where each stack entry starts
+    push_state, push_built, push_position = stack.append, built_by.append, positions.append
+    token_state = 0  # state the current token was first looked up in
+    i = 0
+    try:
+        current = next_token()
+    except StopIteration:
+        current = endmark
+
+    while True:
+        s = stack[-1]
+        k = a_base[s] + current
+        act = a_value[k] if a_check[k] == s else a_default[s]
+        if act > 0:
+            token_state = act - 1
+            push_state(token_state)
+            push_built(-1)
+            push_position(i)
+            i += 1
+            try:
+                current = next_token()
+            except StopIteration:
+                current = endmark
+        elif act < 0:
+            if act == accept:
+                break
+            p = -act - 1
+            n = prod_len[p]
+            child_offset.append(len(child_start))
+            if n:
+                child_reduction.extend(built_by[-n:])
+                child_start.extend(positions[-n:])
+                start = positions[-n]
+                del stack[-n:]
+                del built_by[-n:]
+                del positions[-n:]
+            else:
+                start = i
+            A = prod_lhs[p]
+            k = g_base[A] + stack[-1]
+            push_state(g_value[k] if g_check[k] == A else g_default[A])
+            push_built(len(reductions))
+            push_position(start)
+            reductions.append(p)
+        else:
+            raise _syntax_error(t, token_state, s, i, current)
+
+    tree = ParseTree(cg.symbols)
+    tree.add_root(cg.start)
+    tree.token[0] = 0
+    node_token = tree.token
+    add_children = tree.add_children
+    n_t = cg.n_terminals
+    rhs = cg.prod_rhs
+    left_recursive = [flat_lists and bool(r) and r[0] == cg.prod_lhs[p] for p, r in enumerate(rhs)]
+    # (node, reduction) pairs, leftmost on top, as the LL(1) stack would pop them
+    pending = [(0, built_by[-1])]
+    pop, push = pending.pop, pending.append
+    while pending:
+        node, r = pop()
+        if left_recursive[reductions[r]]:
+            _add_list(node, r, tree, reductions, child_offset, child_reduction, child_start,
+                      rhs, n_t, left_recursive, push)
+            continue
+        children = rhs[reductions[r]]
+        n = len(children)
+        if n:
+            first = add_children(node, children)
+            off = child_offset[r]
+            node_token[first:first + n] = child_start[off:off + n]
+            for j in range(n - 1, -1, -1):
+                if children[j] >= n_t:
+                    push((first + j, child_reduction[off + j]))
+    return tree
+
+
+def _add_list(node: int, r: int, tree: ParseTree, reductions: array, child_offset: array,
+              child_reduction: array, child_start: array, rhs: List[Tuple[int, ...]],
+              n_t: int, left_recursive: List[bool], push) -> None:
+    """
+    Children of a left-recursive reduction r with its whole chain flattened:
+    the base reduction's children, then every level's children after the first.
+    """
+    chain = [r]
+    while left_recursive[reductions[r]]:
+        r = child_reduction[child_offset[r]]
+        chain.append(r)
+    chain.reverse()  # base first
+    symbols: List[int] = []
+    starts = array("i")
+    built = array("i")
+    for k, r in enumerate(chain):
+        skip = 1 if k else 0  # the nested list itself
+        n = len(rhs[reductions[r]])
+        off = child_offset[r]
+        symbols.extend(rhs[reductions[r]][skip:])
+        starts.extend(child_start[off + skip:off + n])
+        built.extend(child_reduction[off + skip:off + n])
+    if not symbols:
+        return
+    first = tree.add_children(node, tuple(symbols))
+    tree.token[first:first + len(symbols)] = starts
+    for j in range(len(symbols) - 1, -1, -1):
+        if symbols[j] >= n_t:
+            push((first + j, built[j]))
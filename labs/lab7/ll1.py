@@ -0,0 +1,1063 @@
+from array import array
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from itertools import accumulate, chain, repeat
+from pathlib import Path
+from typing import Callable, List, Dict, Set, Tuple, Iterable, Iterator, Optional, TextIO, Union
+import json
+import sys
+import time
+
+EPSILON = "epsilon"
+ENDMARK = "$"
+
+class Grammar:
+    def __init__(self):
+        self.nonterminals: Set[str] = set()
+        self.terminals: Set[str] = set()
+        self.start_symbol: str = ""
+        self.productions: Dict[str, List[List[str]]] = {}  # productions[nonterminal] = list of RHS (each RHS = list of symbols)
+
+    @staticmethod
+    def from_file(path: Path) -> "Grammar":
+        with open(path, "r") as f:
+            return Grammar.from_lines(f)
+
+    @staticmethod
+    def from_text(text: str) -> "Grammar":
+        return Grammar.from_lines(text.splitlines())
+
+    @staticmethod
+    def from_lines(lines: Iterable[str]) -> "Grammar":
+        g = Grammar()
+        section = None
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            # NEW: section headers start with '#'
+            if line.startswith("# NonTerminals"):
+                section = "NonTerminals"
+                continue
+            if line.startswith("# Terminals"):
+                section = "Terminals"
+                continue
+            if line.startswith("# StartSymbol"):
+                section = "StartSymbol"
+                continue
+            if line.startswith("# Productions"):
+                section = "Productions"
+                continue
+
+            if line == "---":
+                section = None
+                continue
+
+            if section == "NonTerminals":
+                g.nonterminals.add(line)
+            elif section == "Terminals":
+                g.terminals.add(line)
+            elif section == "StartSymbol":
+                g.start_symbol = line
+            elif section == "Productions":
+                left, right = map(str.strip, line.split("->"))
+                rhs_symbols = right.split()
+                g.productions.setdefault(left, []).append(rhs_symbols)
+
+        return g
+
+
+# ---------------------------
+# FIRST and FOLLOW sets
+# ---------------------------
+
+def compute_first_sets(g: Grammar) -> Dict[str, Set[str]]:
+    first: Dict[str, Set[str]] = {}
+
+    # initialize
+    for t in g.terminals:
+        first[t] = {t}
+    for nt in g.nonterminals:
+        first.setdefault(nt, set())
+    first[EPSILON] = {EPSILON}
+
+    changed = True
+    while changed:
+        changed = False
+        for A, prods in g.productions.items():
+            for rhs in prods:
+                # FIRST(rhs)
+                nullable_prefix = True
+                if rhs == [EPSILON]:
+                    if EPSILON not in first[A]:
+                        first[A].add(EPSILON)
+                        changed = True
+                    continue
+
+                for X in rhs:
+                    for a in first.setdefault(X, set()):
+                        if a != EPSILON and a not in first[A]:
+                            first[A].add(a)
+                            changed = True
+                    if EPSILON not in first.setdefault(X, set()):
+                        nullable_prefix = False
+                        break
+
+                if nullable_prefix:
+                    if EPSILON not in first[A]:
+                        first[A].add(EPSILON)
+                        changed = True
+
+    return first
+
+
+def first_of_sequence(seq: List[str],
+                      first_sets: Dict[str, Set[str]]) -> Set[str]:
+    if not seq or seq == [EPSILON]:
+        return {EPSILON}
+
+    result: Set[str] = set()
+    nullable_prefix = True
+
+    for X in seq:
+        sym_first = first_sets.get(X, {X})
+        result |= {a for a in sym_first if a != EPSILON}
+        if EPSILON not in sym_first:
+            nullable_prefix = False
+            break
+
+    if nullable_prefix:
+        result.add(EPSILON)
+
+    return result
+
+
+def compute_follow_sets(g: Grammar,
+                        first_sets: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    follow: Dict[str, Set[str]] = {nt: set() for nt in g.nonterminals}
+    follow[g.start_symbol].add(ENDMARK)
+
+    changed = True
+    while changed:
+        changed = False
+        for A, prods in g.productions.items():
+            for rhs in prods:
+                trailer = follow[A].copy()
+                for X in reversed(rhs):
+                    if X in g.nonterminals:
+                        before = len(follow[X])
+                        follow[X] |= trailer
+                        if len(follow[X]) > before:
+                            changed = True
+
+                        first_X = first_sets.get(X, set())
+                        if EPSILON in first_X:
+                            trailer = trailer | {a for a in first_X if a != EPSILON}
+                        else:
+                            trailer = {a for a in first_X if a != EPSILON}
+                    else:
+                        trailer = {X}
+
+    return follow
+
+
+# ---------------------------
+# LL(1) table construction
+# ---------------------------
+
+class LL1Conflict(ValueError):
+    """Two productions of nonterminal claim the same (nonterminal, terminal) cell."""
+
+    def __init__(self, nonterminal: str, terminal: str):
+        super().__init__(f"LL(1) conflict at table[{nonterminal}][{terminal}]")
+        self.nonterminal = nonterminal
+        self.terminal = terminal
+
+
+def build_ll1_table(
+    g: Grammar,
+    first_sets: Dict[str, Set[str]],
+    follow_sets: Dict[str, Set[str]]
+) -> Dict[str, Dict[str, List[str]]]:
+    table: Dict[str, Dict[str, List[str]]] = {nt: {} for nt in g.nonterminals}
+
+    for A, prods in g.productions.items():
+        for rhs in prods:
+            first_rhs = first_of_sequence(rhs, first_sets)
+            # for each terminal in FIRST(rhs) \ {epsilon}
+            for a in (first_rhs - {EPSILON}):
+                if a in table[A]:
+                    raise LL1Conflict(A, a)
+                table[A][a] = rhs
+
+            # if epsilon in FIRST(rhs)
+            if EPSILON in first_rhs:
+                for b in follow_sets[A]:
+                    if b in table[A]:
+                        raise LL1Conflict(A, b)
+                    table[A][b] = rhs
+
+    return table
+
+
+# ---------------------------
+# Instrumentation
+# ---------------------------
+
+# trace(event, symbol id, token index, production id or -1); events are
+# "expand" (nonterminal on top replaced by production) and "match"
+Tracer = Callable[[str, int, int, int], None]
+
+
+@dataclass
+class ParserStats:
+    """
+    Counters filled by the instrumented drivers and phase timings (seconds).
+    The plain drivers never touch it, so parsing without stats costs nothing extra.
+    """
+    tokens: int = 0
+    steps: int = 0  # stack pops
+    expansions: int = 0
+    matches: int = 0  # including the final ENDMARK
+    max_stack_depth: int = 0
+    expansions_by_nonterminal: Dict[str, int] = field(default_factory=dict)
+    lookups_by_terminal: Dict[str, int] = field(default_factory=dict)
+    phases: Dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "tokens": self.tokens,
+            "steps": self.steps,
+            "expansions": self.expansions,
+            "matches": self.matches,
+            "max_stack_depth": self.max_stack_depth,
+            "expansions_by_nonterminal": self.expansions_by_nonterminal,
+            "lookups_by_terminal": self.lookups_by_terminal,
+            "phases": self.phases,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+
+def _phase(stats: Optional[ParserStats], name: str):
+    return stats.phase(name) if stats is not None else nullcontext()
+
+
+# ---------------------------
+# Compiled (integer) grammar
+# ---------------------------
+
+class CompiledGrammar:
+    """
+    Integer form of a Grammar used by the parsing engines.
+
+    Terminals get ids 0..n_terminals-1 (ENDMARK is the last terminal),
+    nonterminals get the ids after them, so "is terminal" is `sym < n_terminals`.
+    Productions are numbered in grammar order; epsilon productions have an
+    empty RHS. The LL(1) table is a flat array holding production ids:
+    table[sym * n_terminals + terminal] (-1 = no rule, terminal rows are empty).
+    """
+
+    def __init__(self, g: Grammar):
+        terminals = sorted(g.terminals) + [ENDMARK]
+        nonterminals = sorted(g.nonterminals)
+
+        self.symbols: List[str] = terminals + nonterminals
+        self.symbol_id: Dict[str, int] = {s: i for i, s in enumerate(self.symbols)}
+        self.n_terminals: int = len(terminals)
+        self.endmark: int = self.symbol_id[ENDMARK]
+        if g.start_symbol not in g.nonterminals:
+            raise ValueError(f"Start symbol '{g.start_symbol}' is not a nonterminal")
+        self.start: int = self.symbol_id[g.start_symbol]
+
+        self.prod_lhs = array("i")
+        self.prod_rhs: List[Tuple[int, ...]] = []
+        self.prod_rhs_rev: List[Tuple[int, ...]] = []  # pushed as-is by the drivers
+        self.prod_names: List[Tuple[str, List[str]]] = []  # (A, rhs) as in the Grammar
+        for A, prods in g.productions.items():
+            if A not in g.nonterminals:
+                raise ValueError(f"Left side '{A}' is not a declared nonterminal")
+            for rhs in prods:
+                ids = [] if rhs == [EPSILON] else [self._id_in_rule(X, A, rhs) for X in rhs]
+                self.prod_lhs.append(self.symbol_id[A])
+                self.prod_rhs.append(tuple(ids))
+                self.prod_rhs_rev.append(tuple(reversed(ids)))
+                self.prod_names.append((A, rhs))
+
+        self.table = array("i", [-1]) * (len(self.symbols) * self.n_terminals)
+
+        # FIRST/FOLLOW as bitsets over terminal ids; eps_bit marks nullability.
+        # suffix_first[p][k] = FIRST(rhs[k:]) of production p (k = len(rhs) -> eps_bit)
+        self.eps_bit: int = 1 << self.n_terminals
+        self.first: List[int] = []
+        self.follow: List[int] = []
+        self.suffix_first: List[Tuple[int, ...]] = []
+
+    def _id_in_rule(self, X: str, A: str, rhs: List[str]) -> int:
+        if X == ENDMARK or X not in self.symbol_id:
+            raise ValueError(f"Undeclared symbol '{X}' in {A} -> {' '.join(rhs)}")
+        return self.symbol_id[X]
+
+    @staticmethod
+    def from_table(g: Grammar,
+                   table: Dict[str, Dict[str, List[str]]]) -> "CompiledGrammar":
+        """Compiles g with the entries of a dict table (A -> a -> rhs)."""
+        cg = CompiledGrammar(g)
+        prod_of = {(A, tuple(rhs)): p for p, (A, rhs) in enumerate(cg.prod_names)}
+        for A, row in table.items():
+            base = cg.symbol_id[A] * cg.n_terminals
+            for a, rhs in row.items():
+                p = prod_of.get((A, tuple(rhs)))
+                if p is None:
+                    raise ValueError(f"Table entry ({A}, {a}) is not a production: "
+                                     f"{A} -> {' '.join(rhs)}")
+                cg.table[base + cg.symbol_id[a]] = p
+        return cg
+
+    def is_terminal(self, sym: int) -> bool:
+        return sym < self.n_terminals
+
+    def bits_to_set(self, bits: int) -> Set[str]:
+        names = {self.symbols[t] for t in range(self.n_terminals) if bits >> t & 1}
+        if bits & self.eps_bit:
+            names.add(EPSILON)
+        return names
+
+    def encode(self, tokens: Iterable[str]) -> Iterator[int]:
+        """Maps terminal names to ids lazily."""
+        symbol_id = self.symbol_id
+        n_t = self.n_terminals
+        for t in tokens:
+            sym = symbol_id.get(t, -1)
+            if not 0 <= sym < n_t:
+                raise ValueError(f"Unknown terminal in input: {t}")
+            yield sym
+
+
+def strongly_connected(n: int, succ: List[List[int]]) -> List[List[int]]:
+    """
+    Iterative Tarjan over nodes 0..n-1. Components are returned so that every
+    component comes after all components reachable from it.
+    """
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            v, k = work[-1]
+            if k < len(succ[v]):
+                work[-1] = (v, k + 1)
+                w = succ[v][k]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work and low[v] < low[work[-1][0]]:
+                low[work[-1][0]] = low[v]
+            if low[v] == index[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                components.append(component)
+
+    return components
+
+
+def _first_of_rhs(rhs: Tuple[int, ...], first: List[int], eps: int) -> int:
+    bits = 0
+    for X in rhs:
+        f = first[X]
+        bits |= f
+        if not f & eps:
+            return bits & ~eps
+    return bits | eps
+
+
+def compute_first_bits(cg: CompiledGrammar) -> List[int]:
+    """
+    FIRST of every symbol as a bitset. Nonterminals are solved one strongly
+    connected component at a time (dependencies first); inside a component
+    a worklist only revisits productions whose RHS symbols changed.
+    """
+    n_t = cg.n_terminals
+    n_sym = len(cg.symbols)
+    eps = cg.eps_bit
+    first = [1 << t for t in range(n_t)] + [0] * (n_sym - n_t)
+
+    prods_of: List[List[int]] = [[] for _ in range(n_sym)]
+    for p, A in enumerate(cg.prod_lhs):
+        prods_of[A].append(p)
+
+    # A depends on every nonterminal in its right-hand sides
+    succ: List[List[int]] = [[] for _ in range(n_sym)]
+    users: List[List[int]] = [[] for _ in range(n_sym)]  # productions using a symbol
+    for p, rhs in enumerate(cg.prod_rhs):
+        A = cg.prod_lhs[p]
+        for X in set(rhs):
+            if X >= n_t:
+                succ[A].append(X)
+                users[X].append(p)
+
+    for component in strongly_connected(n_sym, succ):
+        if component[0] < n_t:
+            continue
+        members = set(component)
+        work = [p for A in component for p in prods_of[A]]
+        queued = set(work)
+        while work:
+            p = work.pop()
+            queued.discard(p)
+            A = cg.prod_lhs[p]
+            new = first[A] | _first_of_rhs(cg.prod_rhs[p], first, eps)
+            if new != first[A]:
+                first[A] = new
+                if len(members) > 1 or A in succ[A]:
+                    for q in users[A]:
+                        if cg.prod_lhs[q] in members and q not in queued:
+                            queued.add(q)
+                            work.append(q)
+
+    return first
+
+
+def compute_suffix_first(cg: CompiledGrammar, first: List[int]) -> List[Tuple[int, ...]]:
+    eps = cg.eps_bit
+    result: List[Tuple[int, ...]] = []
+    for rhs in cg.prod_rhs:
+        suffix = [eps] * (len(rhs) + 1)
+        for k in range(len(rhs) - 1, -1, -1):
+            f = first[rhs[k]]
+            suffix[k] = (f & ~eps) | suffix[k + 1] if f & eps else f
+        result.append(tuple(suffix))
+    return result
+
+
+def compute_follow_bits(cg: CompiledGrammar,
+                        suffix_first: List[Tuple[int, ...]]) -> List[int]:
+    """
+    FOLLOW of every nonterminal as a bitset. Each production adds constant
+    FIRST-of-suffix bits once; FOLLOW(A) -> FOLLOW(X) edges for nullable
+    suffixes are then propagated once per strongly connected component.
+    """
+    n_t = cg.n_terminals
+    n_sym = len(cg.symbols)
+    eps = cg.eps_bit
+    follow = [0] * n_sym
+    follow[cg.start] |= 1 << cg.endmark
+
+    flows_to: List[List[int]] = [[] for _ in range(n_sym)]
+    for p, rhs in enumerate(cg.prod_rhs):
+        A = cg.prod_lhs[p]
+        suffix = suffix_first[p]
+        for k, X in enumerate(rhs):
+            if X < n_t:
+                continue
+            follow[X] |= suffix[k + 1] & ~eps
+            if suffix[k + 1] & eps and X != A:
+                flows_to[A].append(X)
+
+    for component in reversed(strongly_connected(n_sym, flows_to)):
+        bits = 0
+        for A in component:
+            bits |= follow[A]
+        for A in component:
+            follow[A] = bits
+            for X in flows_to[A]:
+                follow[X] |= bits
+
+    return follow
+
+
+def build_ll1_table_bits(cg: CompiledGrammar) -> None:
+    """Fills cg.table from the bitset FIRST-of-RHS and FOLLOW sets."""
+    n_t = cg.n_terminals
+    eps = cg.eps_bit
+    table = cg.table
+    for p, A in enumerate(cg.prod_lhs):
+        lookahead = cg.suffix_first[p][0]
+        if lookahead & eps:
+            lookahead = (lookahead & ~eps) | cg.follow[A]
+        base = A * n_t
+        while lookahead:
+            low = lookahead & -lookahead
+            a = low.bit_length() - 1
+            lookahead ^= low
+            if table[base + a] != -1:
+                raise LL1Conflict(cg.symbols[A], cg.symbols[a])
+            table[base + a] = p
+
+
+def compile_grammar(g: Grammar, ll1_table: bool = True,
+                    stats: Optional[ParserStats] = None) -> CompiledGrammar:
+    """
+    Ids, FIRST and FOLLOW for g. With ll1_table=False the LL(1) table is left
+    empty, so grammars that are not LL(1) can be compiled (see lalr.py).
+    With stats, every step is timed as a phase.
+    """
+    with _phase(stats, "symbols"):
+        cg = CompiledGrammar(g)
+    with _phase(stats, "first"):
+        cg.first = compute_first_bits(cg)
+        cg.suffix_first = compute_suffix_first(cg, cg.first)
+    with _phase(stats, "follow"):
+        cg.follow = compute_follow_bits(cg, cg.suffix_first)
+    if ll1_table:
+        with _phase(stats, "table"):
+            build_ll1_table_bits(cg)
+    return cg
+
+
+# ---------------------------
+# Parse tree representation
+# ---------------------------
+
+@dataclass
+class Node:
+    index: int
+    symbol: str
+    father: int  # -1 if none
+    sibling: int  # -1 if none
+
+
+class ParseTree:
+    """
+    Parse tree as parallel int arrays indexed by node index (struct of arrays):
+    symbol id, father, next sibling and first child (-1 if none), plus the
+    index of the input token the node starts at (for terminal leaves, the
+    token it matched; use it to get the PIF position of a leaf).
+    Children of a node are allocated together, so they have consecutive indices.
+    Indexing/iterating yields Node views built on demand.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = names  # symbol id -> name
+        self.symbol = array("i")
+        self.father = array("i")
+        self.sibling = array("i")
+        self.first_child = array("i")
+        self.token = array("i")
+
+    def add_root(self, sym: int) -> int:
+        self.symbol.append(sym)
+        self.father.append(-1)
+        self.sibling.append(-1)
+        self.first_child.append(-1)
+        self.token.append(-1)
+        return len(self.symbol) - 1
+
+    def add_children(self, parent: int, syms: Tuple[int, ...]) -> int:
+        """Appends the children of parent (in order); returns the first index."""
+        first = len(self.symbol)
+        k = len(syms)
+        self.symbol.extend(syms)
+        self.father.extend(repeat(parent, k))
+        self.sibling.extend(range(first + 1, first + k))
+        self.sibling.append(-1)
+        self.first_child.extend(repeat(-1, k))
+        self.token.extend(repeat(-1, k))
+        self.first_child[parent] = first
+        return first
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def __getitem__(self, i: int) -> Node:
+        if i < 0:
+            i += len(self.symbol)
+        return Node(index=i, symbol=self.names[self.symbol[i]],
+                    father=self.father[i], sibling=self.sibling[i])
+
+    def __iter__(self) -> Iterator[Node]:
+        for i in range(len(self.symbol)):
+            yield self[i]
+
+    def symbol_name(self, i: int) -> str:
+        return self.names[self.symbol[i]]
+
+    def children(self, i: int) -> Iterator[int]:
+        c = self.first_child[i]
+        sibling = self.sibling
+        while c != -1:
+            yield c
+            c = sibling[c]
+
+    def preorder(self, root: int = 0) -> Iterator[int]:
+        """Node indices in preorder, walking the links (no auxiliary stack)."""
+        if not len(self.symbol):
+            return
+        first_child, sibling, father = self.first_child, self.sibling, self.father
+        i = root
+        while True:
+            yield i
+            if first_child[i] != -1:
+                i = first_child[i]
+                continue
+            while i != root and sibling[i] == -1:
+                i = father[i]
+            if i == root:
+                return
+            i = sibling[i]
+
+    def postorder(self, root: int = 0) -> Iterator[int]:
+        """Node indices in postorder, walking the links (no auxiliary stack)."""
+        if not len(self.symbol):
+            return
+        first_child, sibling, father = self.first_child, self.sibling, self.father
+        i = root
+        while first_child[i] != -1:
+            i = first_child[i]
+        while True:
+            yield i
+            if i == root:
+                return
+            if sibling[i] != -1:
+                i = sibling[i]
+                while first_child[i] != -1:
+                    i = first_child[i]
+            else:
+                i = father[i]
+
+
+# ---------------------------
+# Parsing algorithms
+# ---------------------------
+
+def iter_productions(cg: CompiledGrammar, token_ids: Iterable[int]) -> Iterator[int]:
+    """
+    Streaming LL(1) driver over token ids (no ENDMARK at the end).
+    Tokens are pulled from the iterator one at a time and the id of every
+    applied production is yielded immediately (leftmost-derivation order),
+    so memory is bounded by the parser stack.
+    """
+    n_t = cg.n_terminals
+    table = cg.table
+    rhs_rev = cg.prod_rhs_rev
+    endmark = cg.endmark
+    next_token = iter(token_ids).__next__
+
+    stack: List[int] = [endmark, cg.start]
+    pop = stack.pop
+    push_all = stack.extend
+
+    try:
+        current = next_token()
+    except StopIteration:
+        current = endmark
+
+    while stack:
+        top = pop()
+        if top < n_t:
+            if top != current:
+                raise ValueError(
+                    f"Parsing error: expected {cg.symbols[top]}, got {cg.symbols[current]}"
+                )
+            try:
+                current = next_token()
+            except StopIteration:
+                current = endmark
+        else:
+            p = table[top * n_t + current]
+            if p < 0:
+                raise ValueError(
+                    f"No rule for ({cg.symbols[top]}, {cg.symbols[current]}) in LL(1) table"
+                )
+            yield p
+            push_all(rhs_rev[p])
+
+
+def parse_ids(cg: CompiledGrammar, token_ids: Iterable[int]) -> List[int]:
+    """
+    LL(1) driver over token ids (no ENDMARK at the end).
+    Output: ids of the productions used, in leftmost-derivation order
+    """
+    return list(iter_productions(cg, token_ids))
+
+
+def parse_tree_ids(cg: CompiledGrammar, token_ids: Iterable[int]) -> ParseTree:
+    """
+    LL(1) driver over token ids building the father/sibling parse tree.
+    The children of a node are contiguous, so the driver walks blocks of
+    siblings (node, end) instead of pushing every node index; the node arrays
+    grow as lists in the loop, and father/sibling are derived afterwards from
+    the (parent, child count) of every expansion.
+    """
+    n_t = cg.n_terminals
+    table = cg.table
+    rhs = cg.prod_rhs
+    pad = [(-1,) * len(r) for r in rhs]
+    names = cg.symbols
+    endmark = cg.endmark
+    next_token = iter(token_ids).__next__
+
+    node_sym: List[int] = [cg.start]
+    node_token: List[int] = [-1]
+    first_child: List[int] = [-1]
+    extend_sym = node_sym.extend
+    extend_token = node_token.extend
+    extend_child = first_child.extend
+    parents: List[int] = []  # expanded node of every non-epsilon expansion
+    counts: List[int] = []  # ... and its number of children
+    add_parent = parents.append
+    add_count = counts.append
+
+    # pending sibling blocks, as flat (node, end) pairs
+    blocks: List[int] = []
+    push_block = blocks.extend
+    pop_block = blocks.pop
+    node, end = 0, 1
+
+    i = 0
+    try:
+        current = next_token()
+    except StopIteration:
+        current = endmark
+
+    while True:
+        if node == end:
+            if not blocks:
+                break
+            end = pop_block()
+            node = pop_block()
+            continue
+        top = node_sym[node]
+        node_token[node] = i
+        if top < n_t:
+            if top != current:
+                raise ValueError(
+                    f"Parsing error at token {i}: expected {names[top]}, got {names[current]}"
+                )
+            i += 1
+            try:
+                current = next_token()
+            except StopIteration:
+                current = endmark
+            node += 1
+        else:
+            p = table[top * n_t + current]
+            if p < 0:
+                raise ValueError(f"No rule for ({names[top]}, {names[current]}) in LL(1) table")
+            children = rhs[p]
+            if children:
+                first = len(node_sym)
+                first_child[node] = first
+                extend_sym(children)
+                extend_token(pad[p])
+                extend_child(pad[p])
+                add_parent(node)
+                add_count(len(children))
+                if node + 1 != end:
+                    push_block((node + 1, end))
+                node, end = first, first + len(children)
+            else:  # epsilon -> no children
+                node += 1
+
+    if current != endmark:
+        raise ValueError(
+            f"Parsing error at token {i}: expected {names[endmark]}, got {names[current]}"
+        )
+
+    sibling = list(range(1, len(node_sym) + 1))
+    for after_last in accumulate(counts, initial=1):
+        sibling[after_last - 1] = -1
+
+    tree = ParseTree(names)
+    tree.symbol = array("i", node_sym)
+    tree.father = array("i", chain((-1,), chain.from_iterable(map(repeat, parents, counts))))
+    tree.sibling = array("i", sibling)
+    tree.first_child = array("i", first_child)
+    tree.token = array("i", node_token)
+    return tree
+
+
+@dataclass
+class RecoveredError:
+    index: int  # token index where the error was detected
+    message: str
+
+
+def parse_with_recovery(cg: CompiledGrammar,
+                        token_ids: Iterable[int]) -> Tuple[ParseTree, List[RecoveredError]]:
+    """
+    LL(1) driver with panic-mode recovery, in one linear pass:
+    - terminal on top that does not match: report it and pop it (as if inserted);
+    - no table entry for (A, a): if a is in FOLLOW(A) (or is ENDMARK), report and
+      pop A; otherwise skip input tokens until one has a rule for A or is in
+      FOLLOW(A) (one error per skipped run);
+    - tokens left after the start symbol is complete are reported once and skipped.
+    Returns the (partial) tree and all errors; nodes popped by recovery have no children.
+    """
+    n_t = cg.n_terminals
+    table = cg.table
+    rhs = cg.prod_rhs
+    names = cg.symbols
+    endmark = cg.endmark
+    follow = cg.follow
+    next_token = iter(token_ids).__next__
+
+    tree = ParseTree(names)
+    tree.add_root(cg.start)
+    node_sym = tree.symbol
+    node_token = tree.token
+    add_children = tree.add_children
+    errors: List[RecoveredError] = []
+
+    stack: List[int] = [-1, 0]
+    pop = stack.pop
+    push_all = stack.extend
+
+    i = 0
+    try:
+        current = next_token()
+    except StopIteration:
+        current = endmark
+    skipping = False  # inside a run of skipped tokens
+
+    while stack:
+        top_idx = stack[-1]
+        top = node_sym[top_idx] if top_idx >= 0 else endmark
+        if top < n_t:
+            pop()
+            if top_idx >= 0:
+                node_token[top_idx] = i
+            if top == current:
+                skipping = False
+                i += 1
+                try:
+                    current = next_token()
+                except StopIteration:
+                    current = endmark
+            elif top == endmark:
+                errors.append(RecoveredError(i, f"Unexpected {names[current]} after the end of the program"))
+                for _ in iter(next_token, None):
+                    pass
+                break
+            else:
+                errors.append(RecoveredError(i, f"Expected {names[top]}, got {names[current]}"))
+            continue
+
+        p = table[top * n_t + current]
+        if p >= 0:
+            pop()
+            skipping = False
+            node_token[top_idx] = i
+            children = rhs[p]
+            if children:
+                first = add_children(top_idx, children)
+                push_all(range(first + len(children) - 1, first - 1, -1))
+        elif current == endmark or follow[top] >> current & 1:
+            pop()
+            node_token[top_idx] = i
+            if not skipping:
+                errors.append(RecoveredError(i, f"No rule for ({names[top]}, {names[current]}); "
+                                                f"{names[top]} abandoned"))
+            skipping = False
+        else:
+            if not skipping:
+                errors.append(RecoveredError(i, f"No rule for ({names[top]}, {names[current]}); "
+                                                f"skipping input"))
+                skipping = True
+            i += 1
+            try:
+                current = next_token()
+            except StopIteration:
+                current = endmark
+
+    return tree, errors
+
+
+def iter_productions_instrumented(cg: CompiledGrammar, token_ids: Iterable[int],
+                                  stats: ParserStats,
+                                  trace: Optional[Tracer] = None,
+                                  tree: Optional[ParseTree] = None) -> Iterator[int]:
+    """
+    iter_productions that also counts into stats (kept up to date even when
+    parsing fails) and reports every step to trace. Given an empty tree, it
+    also builds the parse tree like parse_tree_ids.
+    """
+    n_t = cg.n_terminals
+    table = cg.table
+    rhs = cg.prod_rhs
+    names = cg.symbols
+    endmark = cg.endmark
+    next_token = iter(token_ids).__next__
+    expanded = [0] * len(names)
+    looked_up = [0] * n_t
+
+    if tree is not None:
+        tree.add_root(cg.start)
+        node_token = tree.token
+    stack: List[int] = [endmark, cg.start]
+    nodes: List[int] = [-1, 0]  # tree node of every stack entry
+    steps = matches = expansions = 0
+    max_depth = len(stack)
+    i = 0
+    finished = False
+    try:
+        try:
+            current = next_token()
+        except StopIteration:
+            current = endmark
+        while stack:
+            top = stack.pop()
+            node = nodes.pop()
+            steps += 1
+            if tree is not None and node >= 0:
+                node_token[node] = i
+            if top < n_t:
+                if top != current:
+                    raise ValueError(
+                        f"Parsing error at token {i}: expected {names[top]}, got {names[current]}"
+                    )
+                matches += 1
+                if trace is not None:
+                    trace("match", top, i, -1)
+                i += 1
+                try:
+                    current = next_token()
+                except StopIteration:
+                    current = endmark
+            else:
+                looked_up[current] += 1
+                p = table[top * n_t + current]
+                if p < 0:
+                    raise ValueError(f"No rule for ({names[top]}, {names[current]}) in LL(1) table")
+                expansions += 1
+                expanded[top] += 1
+                if trace is not None:
+                    trace("expand", top, i, p)
+                yield p
+                children = rhs[p]
+                if children:
+                    stack.extend(reversed(children))
+                    if tree is not None:
+                        first = tree.add_children(node, children)
+                        nodes.extend(range(first + len(children) - 1, first - 1, -1))
+                    else:
+                        nodes.extend(repeat(-1, len(children)))
+                    if len(stack) > max_depth:
+                        max_depth = len(stack)
+        finished = True
+    finally:
+        stats.tokens += i - 1 if finished else i  # the last match is ENDMARK
+        stats.steps += steps
+        stats.matches += matches
+        stats.expansions += expansions
+        stats.max_stack_depth = max(stats.max_stack_depth, max_depth)
+        for sym, count in enumerate(expanded):
+            if count:
+                stats.expansions_by_nonterminal[names[sym]] = \
+                    stats.expansions_by_nonterminal.get(names[sym], 0) + count
+        for a, count in enumerate(looked_up):
+            if count:
+                stats.lookups_by_terminal[names[a]] = stats.lookups_by_terminal.get(names[a], 0) + count
+
+
+def parse_tree_instrumented(cg: CompiledGrammar, token_ids: Iterable[int],
+                            stats: ParserStats,
+                            trace: Optional[Tracer] = None) -> ParseTree:
+    tree = ParseTree(cg.symbols)
+    for _ in iter_productions_instrumented(cg, token_ids, stats, trace, tree):
+        pass
+    return tree
+
+
+def trace_printer(cg: CompiledGrammar, file: Optional[TextIO] = None) -> Tracer:
+    """Tracer writing one line per parser step (to stderr by default)."""
+    out = file if file is not None else sys.stderr
+    names = cg.symbols
+
+    def trace(event: str, sym: int, i: int, p: int) -> None:
+        if event == "expand":
+            out.write(f"{i:>6}  expand {names[sym]} -> {' '.join(cg.prod_names[p][1])}\n")
+        else:
+            out.write(f"{i:>6}  match  {names[sym]}\n")
+
+    return trace
+
+
+# (grammar, dict table, compiled) of the last dict table seen by the wrappers below;
+# a table from build_ll1_table is not modified after it is built.
+_last_compiled: List[Tuple[Grammar, Dict[str, Dict[str, List[str]]], CompiledGrammar]] = []
+
+
+def _as_compiled(g: Grammar,
+                 table: Union[CompiledGrammar, Dict[str, Dict[str, List[str]]]]) -> CompiledGrammar:
+    """The compiled form of table, compiling a dict table once per (grammar, table)."""
+    if isinstance(table, CompiledGrammar):
+        return table
+    if _last_compiled and _last_compiled[0][0] is g and _last_compiled[0][1] is table:
+        return _last_compiled[0][2]
+    cg = CompiledGrammar.from_table(g, table)
+    _last_compiled[:] = [(g, table, cg)]
+    return cg
+
+
+def parse_sequence(
+    g: Grammar,
+    table: Union[CompiledGrammar, Dict[str, Dict[str, List[str]]]],
+    tokens: List[str]
+) -> List[Tuple[str, List[str]]]:
+    """
+    Requirement 1:
+    Input: grammar, sequence of terminals (tokens)
+    Output: list of productions used as (A, RHS)
+    """
+    cg = _as_compiled(g, table)
+    return [cg.prod_names[p] for p in parse_ids(cg, cg.encode(tokens))]
+
+
+def parse_with_tree(
+    g: Grammar,
+    table: Union[CompiledGrammar, Dict[str, Dict[str, List[str]]]],
+    tokens: List[str]
+) -> ParseTree:
+    """
+    Requirement 2:
+    Input: grammar, sequence of tokens (e.g. from PIF, but here just raw terminals)
+    Output: parse tree as a list of Nodes (father + sibling representation)
+    """
+    cg = _as_compiled(g, table)
+    return parse_tree_ids(cg, cg.encode(tokens))
+
+
+# ---------------------------
+# Utility: print parse tree table
+# ---------------------------
+
+def print_parse_tree(nodes: Union[ParseTree, List[Node]], file: Optional[TextIO] = None) -> None:
+    print(f"{'Idx':<5} {'Symbol':<10} {'Father':<10} {'Sibling':<10}", file=file)
+    print("-" * 40, file=file)
+    for n in nodes:
+        print(f"{n.index:<5} {n.symbol:<15} {n.father:<10} {n.sibling:<10}", file=file)
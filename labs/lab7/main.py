@@ -1,391 +1,292 @@
-from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
-from typing import List, Dict, Set, Tuple
+from typing import List, Optional
+import argparse
 import sys
 import subprocess
 
-EPSILON = "epsilon"
-ENDMARK = "$"
+from ll1 import (
+    EPSILON,
+    ENDMARK,
+    Grammar,
+    CompiledGrammar,
+    Node,
+    ParseTree,
+    ParserStats,
+    compute_first_sets,
+    first_of_sequence,
+    compute_follow_sets,
+    build_ll1_table,
+    compile_grammar,
+    iter_productions,
+    iter_productions_instrumented,
+    parse_ids,
+    parse_tree_ids,
+    parse_with_recovery,
+    parse_sequence,
+    parse_with_tree,
+    parse_tree_instrumented,
+    print_parse_tree,
+    trace_printer,
+)
+from cache import load_compiled
+from lalr import iter_reductions, load_lalr, parse_tree_lalr
+from pif import PIF_to_tokens, open_PIF_ids
+from pipeline import parse_source_productions, parse_source_recovering, parse_source_tree
 
-class Grammar:
-    def __init__(self):
-        self.nonterminals: Set[str] = set()
-        self.terminals: Set[str] = set()
-        self.start_symbol: str = ""
-        self.productions: Dict[str, List[List[str]]] = {}  # productions[nonterminal] = list of RHS (each RHS = list of symbols)
 
-    @staticmethod
-    def from_file(path: Path) -> "Grammar":
-        g = Grammar()
-        section = None
-
-        with open(path, "r") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # NEW: section headers start with '#'
-                if line.startswith("# NonTerminals"):
-                    section = "NonTerminals"
-                    continue
-                if line.startswith("# Terminals"):
-                    section = "Terminals"
-                    continue
-                if line.startswith("# StartSymbol"):
-                    section = "StartSymbol"
-                    continue
-                if line.startswith("# Productions"):
-                    section = "Productions"
-                    continue
-
-                if line == "---":
-                    section = None
-                    continue
-
-                if section == "NonTerminals":
-                    g.nonterminals.add(line)
-                elif section == "Terminals":
-                    g.terminals.add(line)
-                elif section == "StartSymbol":
-                    g.start_symbol = line
-                elif section == "Productions":
-                    left, right = map(str.strip, line.split("->"))
-                    rhs_symbols = right.split()
-                    g.productions.setdefault(left, []).append(rhs_symbols)
-
-        return g
-
-
-# ---------------------------
-# FIRST and FOLLOW sets
-# ---------------------------
-
-def compute_first_sets(g: Grammar) -> Dict[str, Set[str]]:
-    first: Dict[str, Set[str]] = {}
-
-    # initialize
-    for t in g.terminals:
-        first[t] = {t}
-    for nt in g.nonterminals:
-        first.setdefault(nt, set())
-    first[EPSILON] = {EPSILON}
-
-    changed = True
-    while changed:
-        changed = False
-        for A, prods in g.productions.items():
-            for rhs in prods:
-                # FIRST(rhs)
-                nullable_prefix = True
-                if rhs == [EPSILON]:
-                    if EPSILON not in first[A]:
-                        first[A].add(EPSILON)
-                        changed = True
-                    continue
-
-                for X in rhs:
-                    for a in first.setdefault(X, set()):
-                        if a != EPSILON and a not in first[A]:
-                            first[A].add(a)
-                            changed = True
-                    if EPSILON not in first.setdefault(X, set()):
-                        nullable_prefix = False
-                        break
-
-                if nullable_prefix:
-                    if EPSILON not in first[A]:
-                        first[A].add(EPSILON)
-                        changed = True
-
-    return first
-
-
-def first_of_sequence(seq: List[str],
-                      first_sets: Dict[str, Set[str]]) -> Set[str]:
-    if not seq or seq == [EPSILON]:
-        return {EPSILON}
-
-    result: Set[str] = set()
-    nullable_prefix = True
-
-    for X in seq:
-        sym_first = first_sets.get(X, {X})
-        result |= {a for a in sym_first if a != EPSILON}
-        if EPSILON not in sym_first:
-            nullable_prefix = False
-            break
-
-    if nullable_prefix:
-        result.add(EPSILON)
-
-    return result
-
-
-def compute_follow_sets(g: Grammar,
-                        first_sets: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
-    follow: Dict[str, Set[str]] = {nt: set() for nt in g.nonterminals}
-    follow[g.start_symbol].add(ENDMARK)
-
-    changed = True
-    while changed:
-        changed = False
-        for A, prods in g.productions.items():
-            for rhs in prods:
-                trailer = follow[A].copy()
-                for X in reversed(rhs):
-                    if X in g.nonterminals:
-                        before = len(follow[X])
-                        follow[X] |= trailer
-                        if len(follow[X]) > before:
-                            changed = True
-
-                        first_X = first_sets.get(X, set())
-                        if EPSILON in first_X:
-                            trailer = trailer | {a for a in first_X if a != EPSILON}
-                        else:
-                            trailer = {a for a in first_X if a != EPSILON}
-                    else:
-                        trailer = {X}
-
-    return follow
-
-
-# ---------------------------
-# LL(1) table construction
-# ---------------------------
-
-def build_ll1_table(
-    g: Grammar,
-    first_sets: Dict[str, Set[str]],
-    follow_sets: Dict[str, Set[str]]
-) -> Dict[str, Dict[str, List[str]]]:
-    table: Dict[str, Dict[str, List[str]]] = {nt: {} for nt in g.nonterminals}
-
-    for A, prods in g.productions.items():
-        for rhs in prods:
-            first_rhs = first_of_sequence(rhs, first_sets)
-            # for each terminal in FIRST(rhs) \ {epsilon}
-            for a in (first_rhs - {EPSILON}):
-                if a in table[A]:
-                    raise ValueError(f"LL(1) conflict at table[{A}][{a}]")
-                table[A][a] = rhs
-
-            # if epsilon in FIRST(rhs)
-            if EPSILON in first_rhs:
-                for b in follow_sets[A]:
-                    if b in table[A]:
-                        raise ValueError(f"LL(1) conflict at table[{A}][{b}]")
-                    table[A][b] = rhs
-
-    return table
-
-
-# ---------------------------
-# Parse tree representation
-# ---------------------------
-
-@dataclass
-class Node:
-    index: int
-    symbol: str
-    father: int  # -1 if none
-    sibling: int  # -1 if none
-
-
-# ---------------------------
-# Parsing algorithms
-# ---------------------------
+class OutputType(Enum):
+    PRODUCTIONS = 1
+    PARSE_TREE = 2
 
-def parse_sequence(
-    g: Grammar,
-    table: Dict[str, Dict[str, List[str]]],
-    tokens: List[str]
-) -> List[Tuple[str, List[str]]]:
-    """
-    Requirement 1:
-    Input: grammar, sequence of terminals (tokens)
-    Output: list of productions used as (A, RHS)
-    """
-    tokens = tokens + [ENDMARK]
-    stack: List[str] = [ENDMARK, g.start_symbol]
-    i = 0
-    productions_used: List[Tuple[str, List[str]]] = []
 
-    while stack:
-        top = stack.pop()
-        current = tokens[i]
+def main(
+        grammar_file_path: Path,
+        output_type: OutputType,
+        pif_file_path: Path = None,
+        sequence: List[str] = None,
+        use_cache: bool = True,
+        source_file_path: Path = None,
+        pipeline_mode: str = "thread",
+        write_pif_path: Path = None,
+        recover: bool = False,
+        lalr: bool = False,
+        stats: Optional[ParserStats] = None,
+        trace: bool = False
+):
+    if stats is not None or trace:
+        return main_instrumented(grammar_file_path, output_type, pif_file_path, sequence,
+                                 use_cache, source_file_path, pipeline_mode, write_pif_path,
+                                 stats, trace)
+    if lalr:
+        return main_lalr(grammar_file_path, output_type, pif_file_path, sequence,
+                         source_file_path, pipeline_mode, write_pif_path)
+
+    if use_cache:
+        cg = load_compiled(grammar_file_path)
+    else:
+        cg = compile_grammar(Grammar.from_file(grammar_file_path))
 
-        if top in g.terminals or top == ENDMARK:
-            if top == current:
-                i += 1
-            else:
-                raise ValueError(f"Parsing error: expected {top}, got {current}")
-        elif top in g.nonterminals:
-            if current not in table[top]:
-                raise ValueError(f"No rule for ({top}, {current}) in LL(1) table")
-            rhs = table[top][current]
-            productions_used.append((top, rhs))
-            # push RHS in reverse order (ignore epsilon)
-            if rhs != [EPSILON]:
-                for sym in reversed(rhs):
-                    stack.append(sym)
+    if output_type == OutputType.PRODUCTIONS:
+        if source_file_path is not None:
+            prods = parse_source_productions(cg, source_file_path, pipeline_mode, write_pif_path)
+        elif pif_file_path is not None:
+            prods = iter_productions(cg, open_PIF_ids(cg, pif_file_path))
         else:
-            raise ValueError(f"Unknown symbol on stack: {top}")
-
-        if current == ENDMARK and not stack:
-            break
-
-    return productions_used
-
-
-def parse_with_tree(
-    g: Grammar,
-    table: Dict[str, Dict[str, List[str]]],
-    tokens: List[str]
-) -> List[Node]:
-    """
-    Requirement 2:
-    Input: grammar, sequence of tokens (e.g. from PIF, but here just raw terminals)
-    Output: parse tree as a list of Nodes (father + sibling representation)
-    """
-    tokens = tokens + [ENDMARK]
-    nodes: List[Node] = []
-    # root
-    root_index = 0
-    nodes.append(Node(index=root_index, symbol=g.start_symbol, father=-1, sibling=-1))
-
-    # stack elements: (symbol, node_index)
-    stack: List[Tuple[str, int]] = [(ENDMARK, -1), (g.start_symbol, root_index)]
-    i = 0
-
-    while stack:
-        top_sym, top_idx = stack.pop()
-        current = tokens[i]
-
-        if top_sym in g.terminals or top_sym == ENDMARK:
-            if top_sym == current:
-                i += 1
-            else:
-                raise ValueError(
-                    f"Parsing error at token {i}: expected {top_sym}, got {current}"
-                )
-        elif top_sym in g.nonterminals:
-            if current not in table[top_sym]:
-                raise ValueError(f"No rule for ({top_sym}, {current}) in LL(1) table")
-            rhs = table[top_sym][current]
-
-            if rhs != [EPSILON]:
-                child_indices: List[int] = []
-                for sym in rhs:
-                    idx = len(nodes)
-                    nodes.append(Node(index=idx, symbol=sym, father=top_idx, sibling=-1))
-                    child_indices.append(idx)
-
-                # set sibling pointers
-                for j in range(len(child_indices) - 1):
-                    nodes[child_indices[j]].sibling = child_indices[j + 1]
-
-                # push RHS in reverse with their node indices
-                for sym, idx in reversed(list(zip(rhs, child_indices))):
-                    stack.append((sym, idx))
-            # epsilon -> no children
+            prods = iter_productions(cg, cg.encode(sequence))
+        print("Productions used:")
+        for p in prods:
+            left, rhs = cg.prod_names[p]
+            print(f"{left} -> {' '.join(rhs)}")
+    elif output_type == OutputType.PARSE_TREE and recover:
+        if source_file_path is not None:
+            nodes, errors = parse_source_recovering(cg, source_file_path, pipeline_mode, write_pif_path)
         else:
-            raise ValueError(f"Unknown symbol on stack: {top_sym}")
-
-        if current == ENDMARK and not stack:
-            break
-
-    return nodes
-
-
-# ---------------------------
-# Utility: print parse tree table
-# ---------------------------
-
-def print_parse_tree(nodes: List[Node]) -> None:
-    print(f"{'Idx':<5} {'Symbol':<10} {'Father':<10} {'Sibling':<10}")
-    print("-" * 40)
-    for n in nodes:
-        print(f"{n.index:<5} {n.symbol:<15} {n.father:<10} {n.sibling:<10}")
-
-
-class OutputType(Enum):
-    PRODUCTIONS = 1
-    PARSE_TREE = 2
-
+            nodes, errors = parse_with_recovery(cg, open_PIF_ids(cg, pif_file_path))
+        for e in errors:
+            print(f"Syntax error at token {e.index}: {e.message}")
+        print_parse_tree(nodes)
+    elif output_type == OutputType.PARSE_TREE:
+        if source_file_path is not None:
+            nodes = parse_source_tree(cg, source_file_path, pipeline_mode, write_pif_path)
+        else:
+            nodes = parse_tree_ids(cg, open_PIF_ids(cg, pif_file_path))
+        print_parse_tree(nodes)
 
-def PIF_to_tokens(pif_file_path: Path) -> List[str]:
-    code_to_terminal = {
-        256: "LOAD",
-        257: "REPLACE",
-        258: "WITH",
-        259: "SPLIT",
-        260: "BY",
-        261: "JOIN",
-        262: "TRIM",
-        263: "UPPERCASE",
-        264: "LOWERCASE",
-        265: "SAVE",
-        266: "ASSIGN",
-        267: "ID",
-        268: "STRING",
-    }
 
-    tokens: List[str] = []
-    with open(pif_file_path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            comma_idx = line.find(",")
-            if comma_idx == -1 or not line.startswith("("):
-                raise ValueError(f"Malformed PIF line: {line}")
-            code = int(line[1:comma_idx].strip())
-            if code not in code_to_terminal:
-                raise ValueError(f"Unknown token code in PIF: {code}")
-            tokens.append(code_to_terminal[code])
+def main_instrumented(
+        grammar_file_path: Path,
+        output_type: OutputType,
+        pif_file_path: Path = None,
+        sequence: List[str] = None,
+        use_cache: bool = True,
+        source_file_path: Path = None,
+        pipeline_mode: str = "thread",
+        write_pif_path: Path = None,
+        stats: Optional[ParserStats] = None,
+        trace: bool = False
+) -> ParserStats:
+    """main() with counters, phase timings and optionally a step trace on stderr."""
+    if stats is None:
+        stats = ParserStats()
+    with stats.phase("grammar"):
+        if use_cache:
+            cg = load_compiled(grammar_file_path)
+        else:
+            cg = compile_grammar(Grammar.from_file(grammar_file_path), stats=stats)
+    tracer = trace_printer(cg) if trace else None
 
-    return tokens
+    if output_type == OutputType.PRODUCTIONS:
+        # productions are printed while parsing, so the two share a phase
+        with stats.phase("parse+output"):
+            if source_file_path is not None:
+                prods = parse_source_productions(
+                    cg, source_file_path, pipeline_mode, write_pif_path,
+                    driver=lambda ids: iter_productions_instrumented(cg, ids, stats, tracer))
+            elif pif_file_path is not None:
+                prods = iter_productions_instrumented(cg, open_PIF_ids(cg, pif_file_path), stats, tracer)
+            else:
+                prods = iter_productions_instrumented(cg, cg.encode(sequence), stats, tracer)
+            print("Productions used:")
+            for p in prods:
+                left, rhs = cg.prod_names[p]
+                print(f"{left} -> {' '.join(rhs)}")
+    elif output_type == OutputType.PARSE_TREE:
+        with stats.phase("parse"):
+            if source_file_path is not None:
+                nodes = parse_source_tree(
+                    cg, source_file_path, pipeline_mode, write_pif_path,
+                    driver=lambda ids: parse_tree_instrumented(cg, ids, stats, tracer))
+            else:
+                nodes = parse_tree_instrumented(cg, open_PIF_ids(cg, pif_file_path), stats, tracer)
+        with stats.phase("output"):
+            print_parse_tree(nodes)
+    return stats
 
 
-def main(
+def main_lalr(
         grammar_file_path: Path,
         output_type: OutputType,
         pif_file_path: Path = None,
-        sequence: List[str] = None
+        sequence: List[str] = None,
+        source_file_path: Path = None,
+        pipeline_mode: str = "thread",
+        write_pif_path: Path = None
 ):
-    g = Grammar.from_file(grammar_file_path)
-
-    first_sets = compute_first_sets(g)
-    follow_sets = compute_follow_sets(g, first_sets)
-    table = build_ll1_table(g, first_sets, follow_sets)
+    tables = load_lalr(grammar_file_path)
+    cg = tables.cg
 
     if output_type == OutputType.PRODUCTIONS:
-        prods = parse_sequence(g, table, sequence)
-        print("Productions used:")
-        for left, rhs in prods:
+        if source_file_path is not None:
+            prods = parse_source_productions(cg, source_file_path, pipeline_mode, write_pif_path,
+                                             driver=lambda ids: iter_reductions(tables, ids))
+        elif pif_file_path is not None:
+            prods = iter_reductions(tables, open_PIF_ids(cg, pif_file_path))
+        else:
+            prods = iter_reductions(tables, cg.encode(sequence))
+        print("Productions used (reductions, in order):")
+        for p in prods:
+            left, rhs = cg.prod_names[p]
             print(f"{left} -> {' '.join(rhs)}")
     elif output_type == OutputType.PARSE_TREE:
-        sequence = PIF_to_tokens(pif_file_path)
-        nodes = parse_with_tree(g, table, sequence)
+        if source_file_path is not None:
+            nodes = parse_source_tree(cg, source_file_path, pipeline_mode, write_pif_path,
+                                      driver=lambda ids: parse_tree_lalr(tables, ids))
+        else:
+            nodes = parse_tree_lalr(tables, open_PIF_ids(cg, pif_file_path))
         print_parse_tree(nodes)
-    
+
+
+def prebuild(grammar_paths: List[Path]) -> None:
+    for path in grammar_paths:
+        load_compiled(path, rebuild=True)
+        print(f"Compiled {path}")
+
 
 if __name__ == "__main__":
-    req = sys.argv[1] if len(sys.argv) > 1 else "req1"
+    arg_parser = argparse.ArgumentParser(description="LL(1) parser (lab 7)")
+    arg_parser.add_argument("req", nargs="?", default="req1", choices=["req1", "req2"])
+    arg_parser.add_argument("--prebuild", nargs="+", type=Path, metavar="GRAMMAR",
+                            help="compile the given grammars into the cache and exit")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always recompile the grammar")
+    arg_parser.add_argument("--pif", type=Path,
+                            help="parse this PIF file (streamed) instead of the req1/req2 inputs")
+    arg_parser.add_argument("--source", type=Path,
+                            help="scan and parse this program in memory (no PIF files)")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt",
+                            help="grammar used with --pif/--source")
+    arg_parser.add_argument("--tree", action="store_true",
+                            help="with --pif/--source, print the parse tree instead of the productions")
+    arg_parser.add_argument("--pipeline-mode", default="thread",
+                            choices=["inline", "thread", "process"],
+                            help="where the scanner runs when scanning in memory")
+    arg_parser.add_argument("--write-pif", type=Path,
+                            help="also write the scanned tokens to this PIF file")
+    arg_parser.add_argument("--recover", action="store_true",
+                            help="with --tree, report every syntax error and print the partial tree")
+    arg_parser.add_argument("--lalr", action="store_true",
+                            help="use the LALR(1) engine (left-recursive grammars allowed; "
+                                 "with --tree, a left-recursive list is one node)")
+    arg_parser.add_argument("--stats", nargs="?", const="-", metavar="JSON_FILE",
+                            help="collect parser counters and phase timings; write them as JSON "
+                                 "to this file (stderr if omitted)")
+    arg_parser.add_argument("--trace", action="store_true",
+                            help="print every parser step to stderr")
+    arg_parser.add_argument("--pif-files", action="store_true",
+                            help="req2: run the lab3 flex scanner and parse its PIF files")
+    args = arg_parser.parse_args()
+
+    if args.prebuild:
+        prebuild(args.prebuild)
+        sys.exit(0)
+
+    if (args.stats or args.trace) and (args.lalr or args.recover):
+        arg_parser.error("--stats/--trace only instrument the LL(1) driver (not --lalr/--recover)")
+    if args.recover and args.lalr:
+        arg_parser.error("--recover is only implemented for the LL(1) driver (not --lalr)")
+    if args.recover and (args.pif is not None or args.source is not None) and not args.tree:
+        arg_parser.error("--recover needs --tree (it prints the partial parse tree)")
+    if args.recover and args.pif is None and args.source is None and args.req == "req1":
+        arg_parser.error("--recover needs a parse tree; req1 prints productions")
+    if args.pif_files and (args.lalr or args.recover):
+        arg_parser.error("--pif-files parses with the plain LL(1) driver (not --lalr/--recover)")
+    parser_stats = ParserStats() if args.stats else None
+
+    def write_stats() -> None:
+        if args.stats == "-":
+            print(parser_stats.to_json(), file=sys.stderr)
+        elif args.stats:
+            Path(args.stats).write_text(parser_stats.to_json() + "\n")
+
+    if args.pif is not None or args.source is not None:
+        main(
+            grammar_file_path=args.grammar,
+            pif_file_path=args.pif,
+            source_file_path=args.source,
+            output_type=OutputType.PARSE_TREE if args.tree else OutputType.PRODUCTIONS,
+            use_cache=not args.no_cache,
+            pipeline_mode=args.pipeline_mode,
+            write_pif_path=args.write_pif,
+            recover=args.recover,
+            lalr=args.lalr,
+            stats=parser_stats,
+            trace=args.trace
+        )
+        write_stats()
+        sys.exit(0)
 
-    if req == "req2":
+    if args.req == "req2" and args.pif_files:
         subprocess.run(["./req2/get_PIFs.sh > /dev/null"], check=True, shell=True)
         main(
             grammar_file_path=Path("req2") / "grammar.txt",
             pif_file_path=Path("req2") / "prog1_PIF.txt",
-            output_type=OutputType.PARSE_TREE
+            output_type=OutputType.PARSE_TREE,
+            use_cache=not args.no_cache,
+            stats=parser_stats,
+            trace=args.trace
+        )
+    elif args.req == "req2":
+        main(
+            grammar_file_path=Path("req2") / "grammar.txt",
+            source_file_path=Path("..") / "lab3" / "prog1.txt",
+            output_type=OutputType.PARSE_TREE,
+            use_cache=not args.no_cache,
+            pipeline_mode=args.pipeline_mode,
+            write_pif_path=args.write_pif,
+            recover=args.recover,
+            lalr=args.lalr,
+            stats=parser_stats,
+            trace=args.trace
         )
     else:
         main(
             grammar_file_path=Path("req1") / "seminar_grammar.txt",
             sequence=["a", "+", "a"],
-            output_type=OutputType.PRODUCTIONS
+            output_type=OutputType.PRODUCTIONS,
+            use_cache=not args.no_cache,
+            lalr=args.lalr,
+            stats=parser_stats,
+            trace=args.trace
         )
+    write_stats()
@@ -0,0 +1,428 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import argparse
+
+from cache import load_compiled
+from interpreter import (CHUNK_SIZE, Instr, Pipeline, compile_program, plan, read_blocks,
+                         record_op, run_pipeline)
+
+IDENTITY = bytes(range(256))
+
+# ("translate", table) | ("replace", old, new) | ("trim",), applied to bytes
+TextOp = Tuple
+TextFunction = Callable[[bytes], bytes]
+
+
+# ---------------------------
+# Dead code
+# ---------------------------
+
+def eliminate_dead_code(program: List[Instr]) -> Tuple[List[Instr], List[Tuple[Instr, str]]]:
+    """
+    Drops statements whose effect is never saved (operations after the last
+    SAVE of a LOAD, and whole LOADs without a SAVE), then assignments that
+    are overwritten or never read. Returns the program and the dropped
+    statements with the reason.
+    """
+    dead = [""] * len(program)
+    end = len(program)
+    for k in range(len(program) - 1, -1, -1):
+        if program[k].op != "LOAD":
+            continue
+        steps = [j for j in range(k + 1, end) if program[j].op != "ASSIGN"]
+        saves = [j for j in steps if program[j].op == "SAVE"]
+        if not saves:
+            dead[k] = "no SAVE after this LOAD"
+            for j in steps:
+                dead[j] = "no SAVE after the LOAD"
+        else:
+            for j in steps:
+                if j > saves[-1]:
+                    dead[j] = "after the last SAVE"
+        end = k
+
+    live = set()
+    for k in range(len(program) - 1, -1, -1):
+        ins = program[k]
+        if dead[k]:
+            continue
+        if ins.op == "ASSIGN":
+            if ins.args[0] not in live:
+                dead[k] = "dead assignment"
+            live.discard(ins.args[0])
+        elif ins.op in ("LOAD", "SAVE"):
+            live.add(ins.args[0])
+
+    kept = [ins for ins, why in zip(program, dead) if not why]
+    dropped = [(ins, why) for ins, why in zip(program, dead) if why]
+    return kept, dropped
+
+
+# ---------------------------
+# Fusion
+# ---------------------------
+
+@dataclass
+class Stage:
+    """
+    One pass of a fused pipeline over a chunk of text (whole lines):
+    "text" applies ops to the chunk, "fields" splits every line by sep,
+    applies ops to each field and joins with join, "records" runs the
+    unfused statements line by line and "save" writes the chunk to output.
+    sources are the statements the stage stands for.
+    """
+    kind: str
+    ops: List[TextOp] = field(default_factory=list)
+    sep: bytes = b""
+    join: bytes = b""
+    output: str = ""
+    sources: List[Instr] = field(default_factory=list)
+
+    def passes(self) -> int:
+        """Passes over the data this stage makes."""
+        if self.kind == "save":
+            return 0
+        if self.kind == "records":
+            return len(self.sources)
+        if self.kind == "fields":
+            return 1
+        return len(self.ops)
+
+    def describe(self) -> str:
+        if self.kind == "save":
+            return f"SAVE {self.output}"
+        if self.kind == "records":
+            return "records: " + "; ".join(str(s) for s in self.sources)
+        ops = ", ".join(_describe_op(op) for op in self.ops) or "identity"
+        if self.kind == "fields":
+            return f"fields {self.sep!r} -> {self.join!r}: {ops}"
+        return f"text: {ops}"
+
+
+def _describe_op(op: TextOp) -> str:
+    if op[0] == "translate":
+        changed = sum(1 for a, b in enumerate(op[1]) if a != b)
+        return f"translate ({changed} bytes)"
+    if op[0] == "replace":
+        return f"replace {op[1]!r} -> {op[2]!r}"
+    return "trim"
+
+
+def add_text_op(ops: List[TextOp], ins: Instr) -> None:
+    """
+    Appends the statement to ops, merging it with the op before it:
+    single-byte REPLACEs and case mappings compose into one translate
+    table, and a TRIM right after a TRIM does nothing.
+    """
+    if ins.op == "REPLACE":
+        old, new = (a.encode() for a in ins.args)
+        if old == new:
+            return
+        if len(old) != 1 or len(new) != 1:
+            ops.append(("replace", old, new))
+            return
+    elif ins.op == "TRIM":
+        if not ops or ops[-1][0] != "trim":
+            ops.append(("trim",))
+        return
+
+    if ops and ops[-1][0] == "translate":
+        table = ops.pop()[1]
+    else:
+        table = IDENTITY
+    if ins.op == "REPLACE":
+        table = table.replace(old, new)
+    elif ins.op == "UPPERCASE":
+        table = table.upper()
+    else:
+        table = table.lower()
+    if table != IDENTITY:
+        ops.append(("translate", table))
+
+
+def fusible(pipeline: Pipeline) -> bool:
+    """
+    Fused stages work on chunks of text, treating every newline as a record
+    end; a pattern, separator or replacement with a newline would break that.
+    """
+    return all("\n" not in a for s in pipeline.steps if s.op != "SAVE" for a in s.args)
+
+
+def fuse(pipeline: Pipeline) -> List[Stage]:
+    """
+    Groups the steps of a pipeline into stages. Runs of unsplit statements
+    become one text stage; a SPLIT ... JOIN region becomes a fields stage,
+    or folds into the text stage around it when it amounts to a replace or a
+    translate (e.g. SPLIT BY "," JOIN WITH ";"). A region with a nested
+    SPLIT runs statement by statement.
+    """
+    stages: List[Stage] = []
+
+    def text_stage() -> Stage:
+        if not stages or stages[-1].kind != "text":
+            stages.append(Stage("text"))
+        return stages[-1]
+
+    steps = pipeline.steps
+    k = 0
+    while k < len(steps):
+        ins = steps[k]
+        if ins.op == "SAVE":
+            stages.append(Stage("save", output=ins.args[0], sources=[ins]))
+            k += 1
+            continue
+        if ins.op != "SPLIT":
+            stage = text_stage()
+            add_text_op(stage.ops, ins)
+            stage.sources.append(ins)
+            k += 1
+            continue
+
+        end = k + 1
+        while end < len(steps) and steps[end].op != "JOIN":
+            end += 1
+        region = steps[k:end + 1]
+        if end == len(steps) or any(s.op == "SPLIT" for s in region[1:]):
+            stages.append(Stage("records", sources=region))
+            k = end + 1
+            continue
+        for stage in _fields_stages(region):
+            if stage.kind != "text":
+                stages.append(stage)
+                continue
+            text = text_stage()
+            for op in stage.ops:
+                if op[0] == "translate":
+                    _add_translate(text.ops, op[1])
+                else:
+                    text.ops.append(op)
+            text.sources.extend(stage.sources)
+        k = end + 1
+
+    # e.g. REPLACE "a" WITH "a" leaves nothing to run
+    return [s for s in stages if s.kind != "text" or s.ops]
+
+
+def _add_translate(ops: List[TextOp], table: bytes) -> None:
+    if ops and ops[-1][0] == "translate":
+        table = ops.pop()[1].translate(table)
+    if table != IDENTITY:
+        ops.append(("translate", table))
+
+
+def _fields_stages(region: List[Instr]) -> List[Stage]:
+    """
+    A SPLIT, field operations and a JOIN. Translates that commute with the
+    split or the join move out into text stages; with no field operations
+    left the region is a replace of the separator by the join string.
+    """
+    sep = region[0].args[0].encode()
+    join = region[-1].args[0].encode()
+    ops: List[TextOp] = []
+    for ins in region[1:-1]:
+        add_text_op(ops, ins)
+    if len(ops) == 1 and ops[0][0] == "translate" and len(sep) == 1 and len(join) == 1:
+        # fields are translated independently, so mapping sep -> join as well
+        # gives the same text
+        table = bytearray(ops[0][1])
+        table[sep[0]] = join[0]
+        return [Stage("text", ops=[("translate", bytes(table))], sources=region)]
+
+    before: List[TextOp] = []
+    after: List[TextOp] = []
+    if ops and ops[0][0] == "translate" and len(sep) == 1 and \
+            ops[0][1][sep[0]] == sep[0] and ops[0][1].count(sep) == 1:
+        before.append(ops.pop(0))  # sep stays sep and nothing else becomes sep
+    if ops and ops[-1][0] == "translate" and all(ops[-1][1][b] == b for b in join):
+        after.append(ops.pop())  # the join string is left alone
+    if not ops:
+        middle: List[TextOp] = list(before)
+        add_text_op(middle, Instr("REPLACE", (region[0].args[0], region[-1].args[0])))
+        for op in after:
+            _add_translate(middle, op[1])
+        return [Stage("text", ops=middle, sources=region)]
+    stages = [Stage("text", ops=before)] if before else []
+    stages.append(Stage("fields", ops=ops, sep=sep, join=join, sources=region))
+    if after:
+        stages.append(Stage("text", ops=after))
+    return stages
+
+
+# ---------------------------
+# Execution
+# ---------------------------
+
+def text_function(ops: List[TextOp], lines: bool = True) -> TextFunction:
+    """ops as one function; lines tells whether the text may hold several lines."""
+    funcs: List[TextFunction] = []
+    for op in ops:
+        if op[0] == "translate":
+            funcs.append(lambda s, t=op[1]: s.translate(t))
+        elif op[0] == "replace":
+            funcs.append(lambda s, a=op[1], b=op[2]: s.replace(a, b))
+        elif lines:
+            funcs.append(_trim_lines)
+        else:
+            funcs.append(bytes.strip)
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def run(s: bytes) -> bytes:
+        for f in funcs:
+            s = f(s)
+        return s
+
+    return run
+
+
+def _trim_lines(text: bytes) -> bytes:
+    return b"\n".join([line.strip() for line in text.split(b"\n")])
+
+
+def _split_lines(text: bytes) -> Tuple[List[bytes], bool]:
+    if text[-1:] == b"\n":
+        return text[:-1].split(b"\n"), True
+    return text.split(b"\n"), False
+
+
+def _stage_function(stage: Stage) -> TextFunction:
+    if stage.kind == "text":
+        return text_function(stage.ops)
+
+    if stage.kind == "fields":
+        sep, join = stage.sep, stage.join
+        fn = text_function(stage.ops, lines=False)
+        if not any(op[0] == "trim" for op in stage.ops):
+            # sep never spans a line end, and without trim the ops act the
+            # same on a field that runs over one
+            fn = text_function(stage.ops)
+            return lambda text: join.join([fn(f) for f in text.split(sep)])
+        j = join.join
+
+        def fields(text: bytes) -> bytes:
+            lines, terminated = _split_lines(text)
+            out = b"\n".join([j([fn(f) for f in line.split(sep)]) for line in lines])
+            return out + b"\n" if terminated else out
+
+        return fields
+
+    ops = []
+    split = False
+    for ins in stage.sources:
+        ops.append(record_op(ins, split))
+        if ins.op == "SPLIT":
+            split = True
+        elif ins.op == "JOIN":
+            split = False
+
+    def records(text: bytes) -> bytes:
+        recs, terminated = _split_lines(text)
+        for f in ops:
+            recs = f(recs)
+        out = b"\n".join(recs)
+        return out + b"\n" if terminated else out
+
+    return records
+
+
+def fused_function(stages: List[Stage]) -> Callable[[bytes], List[bytes]]:
+    """Chunk of text -> the text written to each SAVE, in SAVE order."""
+    funcs: List[Optional[TextFunction]] = [
+        None if s.kind == "save" else _stage_function(s) for s in stages]
+
+    def run(text: bytes) -> List[bytes]:
+        saved = []
+        for f in funcs:
+            if f is None:
+                saved.append(text)
+            else:
+                text = f(text)
+        return saved
+
+    return run
+
+
+@dataclass
+class FusedPipeline:
+    """A pipeline and its stages; stages is None when it cannot be fused."""
+    pipeline: Pipeline
+    stages: Optional[List[Stage]]
+
+    def statements(self) -> int:
+        return sum(1 for s in self.pipeline.steps if s.op != "SAVE")
+
+    def passes(self) -> int:
+        if self.stages is None:
+            return self.statements()
+        return sum(s.passes() for s in self.stages)
+
+
+@dataclass
+class Plan:
+    pipelines: List[FusedPipeline]
+    dropped: List[Tuple[Instr, str]]
+
+    def report(self) -> str:
+        lines = []
+        for ins, why in self.dropped:
+            lines.append(f"removed  {ins}  ({why})")
+        for p in self.pipelines:
+            lines.append(f"LOAD {p.pipeline.source}: "
+                         f"{p.statements()} statement pass(es) -> {p.passes()}")
+            if p.stages is None:
+                lines.append("  not fused (newline in a pattern or replacement)")
+                continue
+            for s in p.stages:
+                lines.append(f"  {s.describe()}")
+        return "\n".join(lines)
+
+
+def optimize(program: List[Instr], base_dir: Path = Path(".")) -> Plan:
+    plan(program, base_dir)  # reports errors of the original program
+    kept, dropped = eliminate_dead_code(program)
+    pipelines = [FusedPipeline(p, fuse(p) if fusible(p) else None)
+                 for p in plan(kept, base_dir)]
+    return Plan(pipelines, dropped)
+
+
+def run_fused(fused: FusedPipeline, chunk_size: int = CHUNK_SIZE) -> int:
+    """Streams one fused pipeline; returns the number of records read."""
+    if fused.stages is None:
+        return run_pipeline(fused.pipeline, chunk_size)
+    fn = fused_function(fused.stages)
+    files = []
+    count = 0
+    try:
+        for path in fused.pipeline.outputs:
+            files.append(open(path, "wb"))
+        for block in read_blocks(fused.pipeline.source, chunk_size):
+            count += block.count(b"\n") + (block[-1:] != b"\n")
+            for out, text in zip(files, fn(block)):
+                out.write(text)
+    finally:
+        for out in files:
+            out.close()
+    return count
+
+
+def execute_plan(p: Plan, chunk_size: int = CHUNK_SIZE) -> int:
+    return sum(run_fused(pipeline, chunk_size) for pipeline in p.pipelines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Optimise (and run) a text-transform program")
+    arg_parser.add_argument("program", type=Path, nargs="?",
+                            default=Path("..") / "lab3" / "prog1.txt")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--base-dir", type=Path, default=Path("."),
+                            help="directory the LOAD/SAVE file names are relative to")
+    arg_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    arg_parser.add_argument("--run", action="store_true", help="run the optimised program")
+    args = arg_parser.parse_args()
+
+    optimized = optimize(compile_program(load_compiled(args.grammar), args.program), args.base_dir)
+    print(optimized.report())
+    if args.run:
+        n = execute_plan(optimized, args.chunk_size)
+        print(f"Processed {n} records")
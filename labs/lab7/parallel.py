@@ -0,0 +1,140 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+import argparse
+import os
+
+from cache import load_compiled
+from interpreter import CHUNK_SIZE, chunk_function, compile_program
+from optimizer import FusedPipeline, Plan, fused_function, optimize, run_fused
+
+PARALLEL_CHUNK_SIZE = 8 * CHUNK_SIZE  # bytes per task; large enough to amortise the IPC
+IN_FLIGHT = 2  # tasks queued per worker, bounding the output held in memory
+
+Range = Tuple[int, int]
+
+# set in every worker by _init_worker
+_worker_fn: Optional[Callable[[bytes], List[bytes]]] = None
+
+
+def pipeline_text_function(fused: FusedPipeline) -> Callable[[bytes], List[bytes]]:
+    """Chunk of whole lines -> the text written to each SAVE, fused or not."""
+    if fused.stages is not None:
+        return fused_function(fused.stages)
+    fn = chunk_function(fused.pipeline)
+
+    def run(text: bytes) -> List[bytes]:
+        terminated = text[-1:] == b"\n"
+        records = (text[:-1] if terminated else text).split(b"\n")
+        end = b"\n" if terminated else b""
+        return [b"\n".join(saved) + end for saved in fn(records)]
+
+    return run
+
+
+def _init_worker(fused: FusedPipeline) -> None:
+    global _worker_fn
+    _worker_fn = pipeline_text_function(fused)
+
+
+def _worker_run(task: Tuple[str, int, int]) -> Tuple[int, List[bytes]]:
+    path, start, end = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start)
+    records = text.count(b"\n") + (text[-1:] != b"\n")
+    return records, _worker_fn(text)
+
+
+def line_ranges(path: Path, chunk_size: int = PARALLEL_CHUNK_SIZE) -> Iterator[Range]:
+    """
+    Byte ranges of about chunk_size covering the file, each cut right after
+    a newline so no record is split between two ranges.
+    """
+    size = os.path.getsize(path)
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                yield start, size
+                return
+            f.seek(end)
+            while True:
+                block = f.read(1 << 16)
+                if not block:
+                    end = size
+                    break
+                cut = block.find(b"\n")
+                if cut >= 0:
+                    end += cut + 1
+                    break
+                end += len(block)
+            yield start, end
+            start = end
+
+
+def run_parallel(fused: FusedPipeline, jobs: int,
+                 chunk_size: int = PARALLEL_CHUNK_SIZE) -> int:
+    """
+    Runs one pipeline on line-aligned ranges of its input in a process pool
+    and writes the results in input order; returns the number of records.
+    Every statement works on one record at a time, so the ranges are
+    independent. Small inputs run in this process.
+    """
+    source = fused.pipeline.source
+    outputs = fused.pipeline.outputs
+    if not outputs:
+        return 0
+    if jobs == 1 or os.path.getsize(source) <= chunk_size:
+        return run_fused(fused, chunk_size)
+
+    files = []
+    count = 0
+    try:
+        for path in outputs:
+            files.append(open(path, "wb"))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(fused,)) as pool:
+            pending: deque = deque()
+            for start, end in line_ranges(source, chunk_size):
+                pending.append(pool.submit(_worker_run, (str(source), start, end)))
+                if len(pending) >= jobs * IN_FLIGHT:
+                    count += _write(pending.popleft().result(), files)
+            while pending:
+                count += _write(pending.popleft().result(), files)
+    finally:
+        for out in files:
+            out.close()
+    return count
+
+
+def _write(result: Tuple[int, List[bytes]], files: list) -> int:
+    records, texts = result
+    for out, text in zip(files, texts):
+        out.write(text)
+    return records
+
+
+def execute_parallel(p: Plan, jobs: Optional[int] = None,
+                     chunk_size: int = PARALLEL_CHUNK_SIZE) -> int:
+    """Runs the pipelines one after another (a LOAD may read an earlier SAVE)."""
+    jobs = jobs or os.cpu_count() or 1
+    return sum(run_parallel(fused, jobs, chunk_size) for fused in p.pipelines)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run a text-transform program on several cores")
+    arg_parser.add_argument("program", type=Path, nargs="?",
+                            default=Path("..") / "lab3" / "prog1.txt")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--base-dir", type=Path, default=Path("."),
+                            help="directory the LOAD/SAVE file names are relative to")
+    arg_parser.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+    arg_parser.add_argument("--chunk-size", type=int, default=PARALLEL_CHUNK_SIZE)
+    args = arg_parser.parse_args()
+
+    optimized = optimize(compile_program(load_compiled(args.grammar), args.program), args.base_dir)
+    n = execute_parallel(optimized, args.jobs, args.chunk_size)
+    print(f"Processed {n} records")
@@ -0,0 +1,231 @@
+from array import array
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+import argparse
+import mmap
+import struct
+import sys
+
+from ll1 import CompiledGrammar
+
+# token codes written by the lab3 scanner (see TokenCode in text_transform.lxi)
+CODE_TO_TERMINAL = {
+    256: "LOAD",
+    257: "REPLACE",
+    258: "WITH",
+    259: "SPLIT",
+    260: "BY",
+    261: "JOIN",
+    262: "TRIM",
+    263: "UPPERCASE",
+    264: "LOWERCASE",
+    265: "SAVE",
+    266: "ASSIGN",
+    267: "ID",
+    268: "STRING",
+}
+
+PIFSource = Union[Path, str, IO[str]]
+
+
+def _lines(source: PIFSource) -> Iterator[str]:
+    if isinstance(source, (str, Path)):
+        with open(source, "r") as f:
+            yield from f
+    else:
+        yield from source
+
+
+def parse_PIF_line(line: str) -> Tuple[int, int, int]:
+    """
+    "(267, (28,0))" -> (267, 28, 0); "(266, -)" -> (266, -1, -1)
+    """
+    comma_idx = line.find(",")
+    if comma_idx == -1 or not line.startswith("("):
+        raise ValueError(f"Malformed PIF line: {line}")
+    code = int(line[1:comma_idx].strip())
+    rest = line[comma_idx + 1:].strip()
+    if rest.startswith("-"):
+        return code, -1, -1
+    inner_comma = rest.find(",")
+    close = rest.find(")")
+    if not rest.startswith("(") or inner_comma == -1 or close < inner_comma:
+        raise ValueError(f"Malformed PIF line: {line}")
+    return code, int(rest[1:inner_comma]), int(rest[inner_comma + 1:close])
+
+
+def iter_PIF_codes(source: PIFSource) -> Iterator[int]:
+    """Lazily yields the token codes of a text PIF (path or open file)."""
+    for line in _lines(source):
+        line = line.strip()
+        if not line:
+            continue
+        comma_idx = line.find(",")
+        if comma_idx == -1 or not line.startswith("("):
+            raise ValueError(f"Malformed PIF line: {line}")
+        yield int(line[1:comma_idx])
+
+
+def iter_PIF_tokens(source: PIFSource) -> Iterator[str]:
+    for code in iter_PIF_codes(source):
+        if code not in CODE_TO_TERMINAL:
+            raise ValueError(f"Unknown token code in PIF: {code}")
+        yield CODE_TO_TERMINAL[code]
+
+
+def PIF_to_tokens(pif_file_path: Path) -> List[str]:
+    return list(iter_PIF_tokens(pif_file_path))
+
+
+def code_lookup(cg: CompiledGrammar) -> List[int]:
+    """lookup[code] = terminal id of the grammar, -1 for unknown codes"""
+    lookup = [-1] * (max(CODE_TO_TERMINAL) + 1)
+    for code, name in CODE_TO_TERMINAL.items():
+        sym = cg.symbol_id.get(name, -1)
+        if 0 <= sym < cg.n_terminals:
+            lookup[code] = sym
+    return lookup
+
+
+def codes_to_ids(cg: CompiledGrammar, codes: Iterable[int]) -> Iterator[int]:
+    """Maps scanner token codes to terminal ids of cg, lazily."""
+    lookup = code_lookup(cg)
+    size = len(lookup)
+    for code in codes:
+        sym = lookup[code] if 0 <= code < size else -1
+        if sym < 0:
+            raise ValueError(f"Unknown token code in PIF: {code}")
+        yield sym
+
+
+def iter_PIF_ids(cg: CompiledGrammar, source: PIFSource) -> Iterator[int]:
+    """Streams a text PIF straight into terminal ids of cg."""
+    return codes_to_ids(cg, iter_PIF_codes(source))
+
+
+# ---------------------------
+# Binary PIF
+# ---------------------------
+#
+# 16-byte header: magic "PIFB", uint32 version, uint64 number of entries,
+# then one record per token: int32 code, int32 bucket, int32 position
+# (bucket/position are -1 for tokens without a symbol table entry).
+# Everything is little-endian.
+
+BINARY_MAGIC = b"PIFB"
+BINARY_VERSION = 1
+_HEADER = struct.Struct("<4sIQ")
+_RECORD_INTS = 3
+
+
+def is_binary_PIF(path: Union[Path, str]) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def convert_text_to_binary(text_path: PIFSource, binary_path: Union[Path, str],
+                           batch: int = 1 << 16) -> int:
+    """Streams a text PIF into the binary format; returns the number of entries."""
+    count = 0
+    with open(binary_path, "wb") as out:
+        out.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0))
+        buf = array("i")
+        for line in _lines(text_path):
+            line = line.strip()
+            if not line:
+                continue
+            buf.extend(parse_PIF_line(line))
+            if len(buf) >= batch * _RECORD_INTS:
+                count += _flush(out, buf)
+        count += _flush(out, buf)
+        out.seek(0)
+        out.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, count))
+    return count
+
+
+def _flush(out, buf: array) -> int:
+    if sys.byteorder != "little":
+        buf.byteswap()
+    buf.tofile(out)
+    n = len(buf) // _RECORD_INTS
+    del buf[:]
+    return n
+
+
+class BinaryPIF:
+    """
+    Memory-mapped binary PIF. codes, buckets and positions are strided
+    int views over the mapping (no copy); entry k is codes[k], buckets[k],
+    positions[k].
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Not a binary PIF: {path}")
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f"Not a binary PIF: {path}")
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            self.close()
+            raise ValueError(f"Not a binary PIF (version {BINARY_VERSION}): {path}")
+        end = _HEADER.size + count * _RECORD_INTS * 4
+        if end > len(self._map):
+            self.close()
+            raise ValueError(f"Truncated binary PIF: {path}")
+
+        self._raw: Optional[memoryview] = memoryview(self._map)[_HEADER.size:end]
+        if sys.byteorder == "little":
+            self.entries = self._raw.cast("i")
+        else:
+            swapped = array("i", self._raw.tobytes())
+            swapped.byteswap()
+            self.entries = memoryview(swapped)
+        self.codes = self.entries[0::_RECORD_INTS]
+        self.buckets = self.entries[1::_RECORD_INTS]
+        self.positions = self.entries[2::_RECORD_INTS]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, k: int) -> Tuple[int, int, int]:
+        return self.codes[k], self.buckets[k], self.positions[k]
+
+    def close(self) -> None:
+        for view in ("codes", "buckets", "positions", "entries", "_raw"):
+            mv = getattr(self, view, None)
+            if mv is not None:
+                mv.release()
+                setattr(self, view, None)
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> "BinaryPIF":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_PIF_ids(cg: CompiledGrammar, path: Union[Path, str]) -> Iterator[int]:
+    """Terminal ids of a PIF file in either format."""
+    if not is_binary_PIF(path):
+        yield from iter_PIF_ids(cg, path)
+        return
+    with BinaryPIF(path) as pif:
+        yield from codes_to_ids(cg, pif.codes)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Convert a text PIF to the binary format")
+    arg_parser.add_argument("text_pif", type=Path)
+    arg_parser.add_argument("binary_pif", type=Path)
+    args = arg_parser.parse_args()
+    n = convert_text_to_binary(args.text_pif, args.binary_pif)
+    print(f"Wrote {n} entries to {args.binary_pif}")
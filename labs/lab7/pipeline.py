@@ -0,0 +1,243 @@
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+import multiprocessing
+import queue
+import sys
+import threading
+
+from ll1 import (CompiledGrammar, ParseTree, RecoveredError, iter_productions,
+                 parse_tree_ids, parse_with_recovery)
+from pif import codes_to_ids
+
+# the scanner stage is the lab4 lexer; appended so lab7 modules keep precedence
+LAB4_PATH = Path(__file__).resolve().parent.parent / "lab4"
+if str(LAB4_PATH) not in sys.path:
+    sys.path.append(str(LAB4_PATH))
+
+from lexer import T_ID, T_STRING, LexError, Lexer, SymbolTable  # noqa: E402
+
+Token = Tuple[int, bytes]  # (token code, lexeme)
+
+BATCH_SIZE = 4096
+QUEUE_BATCHES = 16
+STOP_POLL = 0.05  # seconds a blocked producer waits before rechecking its stop event
+
+
+def _scan_batches(source: Path, out, stop, batch_size: int) -> None:
+    """
+    Producer: scans source and sends ("tokens", [...], new errors) batches, then
+    ("done", errors). Stops early once stop is set (the consumer went away).
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=STOP_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        data = Path(source).read_bytes()
+        errors: List[LexError] = []
+        sent = 0
+        batch: List[Token] = []
+        for tok in Lexer.text_transform().scan(data, errors):
+            batch.append(tok)
+            if len(batch) >= batch_size:
+                # errors are recorded before the tokens after them are produced
+                if not put(("tokens", batch, [(e.line, e.what) for e in errors[sent:]])):
+                    return
+                sent = len(errors)
+                batch = []
+        if batch and not put(("tokens", batch, [(e.line, e.what) for e in errors[sent:]])):
+            return
+        put(("done", [(e.line, e.what) for e in errors[sent:]]))
+    except Exception as e:  # reported to the consumer
+        put(("failed", f"{type(e).__name__}: {e}"))
+
+
+class TokenChannel:
+    """
+    Scanner -> parser channel. mode "inline" scans lazily in the caller,
+    "thread" runs the scanner in a thread and "process" in a separate process;
+    the two concurrent modes hand over batches of tokens through a bounded
+    queue, so scanning and parsing overlap with bounded memory.
+    `errors` holds the lexical errors before the last token handed out, and
+    all of them once the stream is exhausted.
+    """
+
+    def __init__(self, source: Union[Path, str], mode: str = "thread",
+                 batch_size: int = BATCH_SIZE, max_batches: int = QUEUE_BATCHES):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        self.source = Path(source)
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.errors: List[LexError] = []
+        self._worker = None
+        self._queue = None
+        self._stop = None
+
+    def __iter__(self) -> Iterator[Token]:
+        if self.mode == "inline":
+            data = self.source.read_bytes()
+            yield from Lexer.text_transform().scan(data, self.errors)
+            return
+
+        if self.mode == "thread":
+            self._queue = queue.Queue(self.max_batches)
+            self._stop = threading.Event()
+            self._worker = threading.Thread(
+                target=_scan_batches,
+                args=(self.source, self._queue, self._stop, self.batch_size),
+                daemon=True)
+        else:
+            self._queue = multiprocessing.Queue(self.max_batches)
+            self._stop = multiprocessing.Event()
+            self._worker = multiprocessing.Process(
+                target=_scan_batches,
+                args=(self.source, self._queue, self._stop, self.batch_size),
+                daemon=True)
+        self._worker.start()
+
+        get = self._queue.get
+        errors = self.errors
+        try:
+            while True:
+                message = get()
+                if message[0] == "tokens":
+                    errors.extend(LexError(line, what) for line, what in message[2])
+                    yield from message[1]
+                elif message[0] == "done":
+                    errors.extend(LexError(line, what) for line, what in message[1])
+                    return
+                else:
+                    raise ValueError(f"Scanner failed: {message[1]}")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stops the scanner (it may be blocked on a full queue) and waits for it."""
+        worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        self._stop.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        if isinstance(worker, multiprocessing.Process) and worker.is_alive():
+            worker.terminate()
+        worker.join()
+
+    def __enter__(self) -> "TokenChannel":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _tee_PIF(tokens: Iterator[Token], pif_path: Path) -> Iterator[Token]:
+    """Passes tokens through while writing them as a text PIF."""
+    st = SymbolTable()
+    with open(pif_path, "w") as f:
+        for code, lexeme in tokens:
+            if code == T_ID or code == T_STRING:
+                b, p = st.insert(lexeme)
+                f.write(f"({code}, ({b},{p}))\n")
+            else:
+                f.write(f"({code}, -)\n")
+            yield code, lexeme
+
+
+def _tee_lexemes(tokens: Iterator[Token], lexemes: List[bytes]) -> Iterator[Token]:
+    for tok in tokens:
+        lexemes.append(tok[1])
+        yield tok
+
+
+def token_ids(cg: CompiledGrammar, tokens: Iterator[Token],
+              pif_path: Optional[Path] = None,
+              lexemes: Optional[List[bytes]] = None) -> Iterator[int]:
+    """Token ids for the parser; lexemes, if given, collects the lexeme of every token."""
+    if pif_path is not None:
+        tokens = _tee_PIF(tokens, pif_path)
+    if lexemes is not None:
+        tokens = _tee_lexemes(tokens, lexemes)
+    return codes_to_ids(cg, (code for code, _ in tokens))
+
+
+def parse_source_productions(cg: CompiledGrammar, source: Union[Path, str],
+                             mode: str = "thread",
+                             pif_path: Optional[Path] = None,
+                             driver: Optional[Callable[[Iterable[int]], Iterator[int]]] = None
+                             ) -> Iterator[int]:
+    """
+    Scans and parses source in one pass, yielding production ids. driver
+    replaces the LL(1) driver (e.g. an LALR(1) one bound to its tables).
+    """
+    if driver is None:
+        driver = lambda ids: iter_productions(cg, ids)  # noqa: E731
+    with TokenChannel(source, mode) as channel:
+        try:
+            yield from driver(token_ids(cg, iter(channel), pif_path))
+        except ValueError as e:
+            _raise_with_lex_errors(channel, e)
+    if channel.errors:
+        raise ValueError(_lex_error_message(channel.errors))
+
+
+def parse_source_tree(cg: CompiledGrammar, source: Union[Path, str],
+                      mode: str = "thread",
+                      pif_path: Optional[Path] = None,
+                      driver: Optional[Callable[[Iterable[int]], ParseTree]] = None,
+                      lexemes: Optional[List[bytes]] = None
+                      ) -> ParseTree:
+    """
+    Scans and parses source into a parse tree. If lexemes is given, the
+    lexeme of token k is appended as lexemes[k] (tree.token indexes it).
+    """
+    if driver is None:
+        driver = lambda ids: parse_tree_ids(cg, ids)  # noqa: E731
+    with TokenChannel(source, mode) as channel:
+        try:
+            tree = driver(token_ids(cg, iter(channel), pif_path, lexemes))
+        except ValueError as e:
+            _raise_with_lex_errors(channel, e)
+    if channel.errors:
+        raise ValueError(_lex_error_message(channel.errors))
+    return tree
+
+
+def parse_source_recovering(cg: CompiledGrammar, source: Union[Path, str],
+                            mode: str = "thread",
+                            pif_path: Optional[Path] = None
+                            ) -> Tuple[ParseTree, List[RecoveredError]]:
+    with TokenChannel(source, mode) as channel:
+        try:
+            tree, errors = parse_with_recovery(cg, token_ids(cg, iter(channel), pif_path))
+        except ValueError as e:
+            _raise_with_lex_errors(channel, e)
+    if channel.errors:
+        raise ValueError(_lex_error_message(channel.errors))
+    return tree, errors
+
+
+def _raise_with_lex_errors(channel: TokenChannel, error: ValueError) -> None:
+    """
+    Re-raises a parse error. The input is not scanned past the failing token;
+    lexical errors before it are the likely cause and lead the message.
+    """
+    channel.close()
+    if channel.errors:
+        raise ValueError(f"{_lex_error_message(channel.errors)}\n"
+                         f"Parsing stopped: {error}") from error
+    raise error
+
+
+def _lex_error_message(errors: List[LexError]) -> str:
+    lines = [f"Line {e.line}: {e.what}" for e in errors]
+    return f"{len(errors)} lexical error(s):\n  " + "\n  ".join(lines)
@@ -0,0 +1,208 @@
+from array import array
+from html import escape
+from pathlib import Path
+from typing import Optional, TextIO, Tuple
+import argparse
+import sys
+
+from cache import load_compiled
+from ll1 import ParseTree, parse_tree_ids
+from pif import open_PIF_ids
+
+CHAR_WIDTH = 7.0  # px per label character at FONT_SIZE
+FONT_SIZE = 12
+BOX_PADDING = 10.0
+BOX_HEIGHT = 20.0
+H_GAP = 8.0  # between neighbouring subtrees
+LEVEL_HEIGHT = 50.0
+MARGIN = 10.0
+FLUSH_EVERY = 4096  # nodes per chunk written to the SVG file
+
+STYLE = """\
+path { fill: none; stroke: gray; stroke-width: 1; }
+rect { stroke: gray; rx: 6; }
+rect.n { fill: #e0f7fa; }
+rect.t { fill: #fff9c4; }
+text { font: 12px monospace; text-anchor: middle; dominant-baseline: central; }
+"""
+
+
+# ---------------------------
+# Input
+# ---------------------------
+
+def read_tree_file(path: Path) -> ParseTree:
+    """
+    Reads a tree printed by print_parse_tree (Idx Symbol Father Sibling
+    rows). Symbol ids are assigned in order of appearance.
+    """
+    names = []
+    ids = {}
+    tree = ParseTree(names)
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 4 or not parts[0].lstrip("-").isdigit():
+                continue  # header and separator
+            idx, symbol, father, sibling = int(parts[0]), parts[1], int(parts[2]), int(parts[3])
+            if idx != len(tree.symbol):
+                raise ValueError(f"{path}: expected node {len(tree.symbol)}, got {idx}")
+            sym = ids.get(symbol)
+            if sym is None:
+                sym = ids[symbol] = len(names)
+                names.append(symbol)
+            tree.symbol.append(sym)
+            tree.father.append(father)
+            tree.sibling.append(sibling)
+            tree.first_child.append(-1)
+            tree.token.append(-1)
+    n = len(tree.symbol)
+    is_sibling = bytearray(n)
+    for s in tree.sibling:
+        if s >= 0:
+            is_sibling[s] = 1
+    for i in range(n):
+        f = tree.father[i]
+        if f >= 0 and not is_sibling[i]:
+            tree.first_child[f] = i
+    return tree
+
+
+# ---------------------------
+# Layout
+# ---------------------------
+
+def layout(tree: ParseTree, root: int = 0) -> Tuple[array, array, array, float, float]:
+    """
+    Tidy layout in two linear passes: postorder computes every subtree's
+    width (its own box or its children side by side, whichever is wider),
+    preorder gives each node its interval and centres it there. Subtrees
+    never overlap and parents sit above the middle of their children.
+    Returns per-node centre x, depth and box width, plus the image size.
+    """
+    n = len(tree)
+    names = tree.names
+    symbol = tree.symbol
+    first_child = tree.first_child
+    sibling = tree.sibling
+
+    box = array("d", [0.0]) * n
+    for i in range(n):
+        box[i] = len(names[symbol[i]]) * CHAR_WIDTH + BOX_PADDING
+    subtree = array("d", [0.0]) * n
+    children_width = array("d", [0.0]) * n
+    for i in tree.postorder(root):
+        c = first_child[i]
+        if c == -1:
+            subtree[i] = box[i]
+            continue
+        total = -H_GAP
+        while c != -1:
+            total += subtree[c] + H_GAP
+            c = sibling[c]
+        children_width[i] = total
+        subtree[i] = total if total > box[i] else box[i]
+
+    x = array("d", [0.0]) * n
+    depth = array("i", [0]) * n
+    left = array("d", [0.0]) * n
+    left[root] = MARGIN
+    max_depth = 0
+    for i in tree.preorder(root):
+        x[i] = left[i] + subtree[i] / 2
+        c = first_child[i]
+        if c == -1:
+            continue
+        d = depth[i] + 1
+        if d > max_depth:
+            max_depth = d
+        pos = left[i] + (subtree[i] - children_width[i]) / 2
+        while c != -1:
+            left[c] = pos
+            depth[c] = d
+            pos += subtree[c] + H_GAP
+            c = sibling[c]
+
+    width = subtree[root] + 2 * MARGIN if n else 2 * MARGIN
+    height = max_depth * LEVEL_HEIGHT + BOX_HEIGHT + 2 * MARGIN
+    return x, depth, box, width, height
+
+
+# ---------------------------
+# SVG output
+# ---------------------------
+
+def write_svg(tree: ParseTree, out: TextIO, root: int = 0) -> int:
+    """Streams the tree as SVG (edges first, then boxes); returns the node count."""
+    x, depth, box, width, height = layout(tree, root)
+    names = tree.names
+    symbol = tree.symbol
+    father = tree.father
+    first_child = tree.first_child
+    top = MARGIN + BOX_HEIGHT / 2
+
+    out.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+              f'viewBox="0 0 {width:.0f} {height:.0f}">\n<style>\n{STYLE}</style>\n')
+
+    order = list(tree.preorder(root)) if len(tree) else []
+    for start in range(0, len(order), FLUSH_EVERY):
+        segments = []
+        for i in order[start:start + FLUSH_EVERY]:
+            f = father[i]
+            if i != root and f >= 0:
+                segments.append(f"M{x[f]:.1f} {top + depth[f] * LEVEL_HEIGHT:.0f}"
+                                f"L{x[i]:.1f} {top + depth[i] * LEVEL_HEIGHT:.0f}")
+        if segments:
+            out.write(f'<path d="{"".join(segments)}"/>\n')
+
+    labels = [escape(name) for name in names]
+    for start in range(0, len(order), FLUSH_EVERY):
+        chunk = []
+        for i in order[start:start + FLUSH_EVERY]:
+            cy = top + depth[i] * LEVEL_HEIGHT
+            w = box[i]
+            kind = "t" if first_child[i] == -1 else "n"
+            chunk.append(f'<rect class="{kind}" x="{x[i] - w / 2:.1f}" y="{cy - BOX_HEIGHT / 2:.0f}" '
+                         f'width="{w:.0f}" height="{BOX_HEIGHT:.0f}"/>'
+                         f'<text x="{x[i]:.1f}" y="{cy:.0f}">{labels[symbol[i]]}</text>\n')
+        out.write("".join(chunk))
+
+    out.write("</svg>\n")
+    return len(order)
+
+
+def render(tree: ParseTree, path: Path, root: int = 0) -> int:
+    with open(path, "w", encoding="utf-8") as out:
+        return write_svg(tree, out, root)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Render a parse tree as SVG")
+    arg_parser.add_argument("out", type=Path, help="SVG file to write ('-' for stdout)")
+    source = arg_parser.add_mutually_exclusive_group()
+    source.add_argument("--tree-file", type=Path,
+                        help="tree printed by main.py --tree / batch.py --tree")
+    source.add_argument("--pif", type=Path, help="parse this PIF file")
+    source.add_argument("--source", type=Path,
+                        help="scan and parse this program (default ../lab3/prog1.txt)")
+    arg_parser.add_argument("--grammar", type=Path, default=Path("req2") / "grammar.txt")
+    arg_parser.add_argument("--pipeline-mode", default="inline",
+                            choices=["inline", "thread", "process"])
+    args = arg_parser.parse_args()
+
+    if args.tree_file is not None:
+        parse_tree: Optional[ParseTree] = read_tree_file(args.tree_file)
+    else:
+        cg = load_compiled(args.grammar)
+        if args.pif is not None:
+            parse_tree = parse_tree_ids(cg, open_PIF_ids(cg, args.pif))
+        else:
+            from pipeline import parse_source_tree
+            program = args.source if args.source is not None else Path("..") / "lab3" / "prog1.txt"
+            parse_tree = parse_source_tree(cg, program, args.pipeline_mode)
+
+    if str(args.out) == "-":
+        write_svg(parse_tree, sys.stdout)
+    else:
+        count = render(parse_tree, args.out)
+        print(f"Wrote {count} nodes to {args.out}")
@@ -0,0 +1,400 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import signal
+
+from cache import text_digest
+from ll1 import CompiledGrammar, Grammar, compile_grammar, iter_productions, parse_tree_ids
+from pif import iter_PIF_ids
+
+REGISTRY_SIZE = 32  # compiled grammars kept per process
+INLINE_BYTES = 64 << 10  # requests up to this size are answered on the event loop
+MAX_REQUEST = 64 << 20  # bytes in one request line
+MAX_IN_FLIGHT = 64  # requests of one connection answered concurrently
+
+Request = Dict[str, Any]
+Response = Dict[str, Any]
+
+
+# ---------------------------
+# Grammar registry
+# ---------------------------
+
+class GrammarRegistry:
+    """
+    LRU map from grammar content (its cache digest) to the compiled grammar,
+    holding at most capacity grammars. Grammars that failed to compile are
+    remembered the same way, with their error message.
+    """
+
+    def __init__(self, capacity: int = REGISTRY_SIZE):
+        self.capacity = capacity
+        self.grammars: "OrderedDict[str, CompiledGrammar]" = OrderedDict()
+        self.failures: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[CompiledGrammar]:
+        """The compiled grammar, None if unknown; ValueError if it failed to compile."""
+        cg = self.grammars.get(digest)
+        if cg is not None:
+            self.grammars.move_to_end(digest)
+            self.hits += 1
+            return cg
+        error = self.failures.get(digest)
+        if error is not None:
+            self.failures.move_to_end(digest)
+            self.hits += 1
+            raise ValueError(error)
+        return None
+
+    def put(self, digest: str, cg: CompiledGrammar) -> None:
+        self._store(self.grammars, digest, cg)
+
+    def fail(self, digest: str, error: str) -> None:
+        self._store(self.failures, digest, error)
+
+    def _store(self, entries: OrderedDict, digest: str, value: Any) -> None:
+        entries[digest] = value
+        entries.move_to_end(digest)
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def compiled(self, digest: str, text: str) -> CompiledGrammar:
+        """Returns the grammar, compiling it on a miss."""
+        cg = self.get(digest)
+        if cg is None:
+            self.misses += 1
+            try:
+                cg = compile_text(text)
+            except Exception as e:
+                self.fail(digest, compile_error(e))
+                raise ValueError(compile_error(e)) from e
+            self.put(digest, cg)
+        return cg
+
+
+def compile_text(text: str) -> CompiledGrammar:
+    return compile_grammar(Grammar.from_text(text))
+
+
+def compile_error(e: Exception) -> str:
+    return f"Grammar does not compile: {e if isinstance(e, ValueError) else repr(e)}"
+
+
+# ---------------------------
+# Requests
+# ---------------------------
+
+def grammar_file(name: Any, root: Optional[Path]) -> Path:
+    """The file a "grammar_path" names; it must lie under root (resolved)."""
+    if root is None:
+        raise ValueError("grammar_path is disabled (the server has no --grammar-root)")
+    if not isinstance(name, str):
+        raise ValueError("grammar_path must be a string")
+    path = (root / name).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"grammar_path {name!r} is outside the grammar root")
+    return path
+
+
+def request_grammar(req: Request, root: Optional[Path]) -> str:
+    """The grammar text: "grammar" itself, or the file under root named by "grammar_path"."""
+    if "grammar" in req:
+        return req["grammar"]
+    if "grammar_path" in req:
+        return grammar_file(req["grammar_path"], root).read_text()
+    raise ValueError("request names no grammar")
+
+
+def parse_request(cg: CompiledGrammar, req: Request) -> Response:
+    """
+    Parses the "tokens" (terminal names) or "pif" (text PIF) of a request;
+    the answer holds "productions" or, with "output": "tree", "tree" rows
+    of [index, symbol, father, sibling].
+    """
+    if "tokens" in req:
+        tokens = req["tokens"]
+        if not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens):
+            raise ValueError("tokens must be a list of terminal names")
+        ids = cg.encode(tokens)
+    elif "pif" in req:
+        ids = iter_PIF_ids(cg, req["pif"].splitlines())
+    else:
+        raise ValueError("request has neither tokens nor pif")
+    output = req.get("output", "productions")
+    if output == "tree":
+        tree = parse_tree_ids(cg, ids)
+        names = tree.names
+        rows = [[i, names[s], f, b] for i, (s, f, b)
+                in enumerate(zip(tree.symbol, tree.father, tree.sibling))]
+        return {"ok": True, "tree": rows}
+    if output != "productions":
+        raise ValueError(f"Unknown output: {output}")
+    prods = cg.prod_names
+    return {"ok": True, "productions": [prods[p] for p in iter_productions(cg, ids)]}
+
+
+# set in every worker by _init_worker
+_worker_registry: Optional[GrammarRegistry] = None
+_worker_grammar_root: Optional[Path] = None
+
+
+def _init_worker(capacity: int, grammar_root: Optional[Path]) -> None:
+    global _worker_registry, _worker_grammar_root
+    _worker_registry = GrammarRegistry(capacity)
+    _worker_grammar_root = grammar_root
+    # workers are forked after serve() installed the loop's handlers: drop the
+    # inherited wakeup fd so their signals do not reach the server's loop
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the server shuts the pool down
+
+
+def error_response(e: Exception) -> Response:
+    if isinstance(e, (ValueError, OSError)):  # JSONDecodeError is a ValueError
+        return {"ok": False, "error": str(e)}
+    return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def encode_response(resp: Response, req: Request) -> bytes:
+    if "id" in req:
+        resp["id"] = req["id"]
+    return json.dumps(resp, separators=(",", ":")).encode() + b"\n"
+
+
+def _decode(line: bytes) -> Request:
+    req = json.loads(line)
+    if not isinstance(req, dict):
+        raise ValueError("request is not a JSON object")
+    return req
+
+
+def _worker_answer(line: bytes) -> Tuple[bool, bytes]:
+    """
+    A whole large parse request, from JSON in to JSON out, in a worker;
+    returns whether it succeeded and the answer line.
+    """
+    req: Request = {}
+    try:
+        req = _decode(line)
+        if req.get("op", "parse") != "parse":
+            raise ValueError(f"Unknown op for a large request: {req['op']}")
+        text = request_grammar(req, _worker_grammar_root)
+        resp = parse_request(_worker_registry.compiled(text_digest(text.encode()), text), req)
+    except Exception as e:  # reported to the client
+        resp = error_response(e)
+    return resp["ok"], encode_response(resp, req)
+
+
+# ---------------------------
+# Server
+# ---------------------------
+
+class ParseService:
+    """
+    Answers JSON-lines requests. Each request names its grammar by content
+    ("grammar": the grammar text, or "grammar_path": a file under grammar_root,
+    read by the server) and gives "tokens" or "pif"; "op" may also be "stats"
+    or "ping". Compiled grammars live in an LRU registry. Grammars are
+    compiled, and large requests decoded, parsed and encoded, in a process
+    pool whose workers keep registries of their own, so the event loop only
+    does small ones. At most max_in_flight requests of a connection run at once.
+    """
+
+    def __init__(self, workers: Optional[int] = None, capacity: int = REGISTRY_SIZE,
+                 inline_bytes: int = INLINE_BYTES, grammar_root: Optional[Path] = None,
+                 max_in_flight: int = MAX_IN_FLIGHT):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.registry = GrammarRegistry(capacity)
+        self.inline_bytes = inline_bytes
+        self.grammar_root = Path(grammar_root).resolve() if grammar_root is not None else None
+        self.max_in_flight = max_in_flight
+        self.pool: Executor = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            initializer=_init_worker, initargs=(capacity, self.grammar_root))
+        self._compiling: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.inline = 0
+        self.offloaded = 0
+        self.errors = 0
+
+    async def grammar_text(self, req: Request) -> str:
+        """request_grammar, with the file read off the event loop."""
+        if "grammar" not in req and "grammar_path" in req:
+            path = grammar_file(req["grammar_path"], self.grammar_root)
+            return await asyncio.get_running_loop().run_in_executor(None, path.read_text)
+        return request_grammar(req, self.grammar_root)
+
+    async def grammar(self, req: Request) -> CompiledGrammar:
+        text = await self.grammar_text(req)
+        digest = text_digest(text.encode())
+        cg = self.registry.get(digest)
+        if cg is not None:
+            return cg
+        # one compilation per grammar, however many requests wait for it
+        pending = self._compiling.get(digest)
+        if pending is None:
+            self.registry.misses += 1
+            loop = asyncio.get_running_loop()
+            pending = self._compiling[digest] = loop.run_in_executor(self.pool, compile_text, text)
+            try:
+                cg = await pending
+            except Exception as e:
+                self.registry.fail(digest, compile_error(e))
+                raise ValueError(compile_error(e)) from e
+            finally:
+                del self._compiling[digest]
+            self.registry.put(digest, cg)
+            return cg
+        try:
+            return await asyncio.shield(pending)
+        except Exception as e:
+            raise ValueError(compile_error(e)) from e
+
+    def stats(self) -> Response:
+        return {
+            "ok": True,
+            "requests": self.requests,
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "errors": self.errors,
+            "grammars": len(self.registry.grammars),
+            "registry_hits": self.registry.hits,
+            "registry_misses": self.registry.misses,
+        }
+
+    async def handle(self, req: Request) -> Response:
+        op = req.get("op", "parse")
+        if op == "ping":
+            return {"ok": True}
+        if op == "stats":
+            return self.stats()
+        if op != "parse":
+            raise ValueError(f"Unknown op: {op}")
+        return parse_request(await self.grammar(req), req)
+
+    async def answer(self, line: bytes) -> bytes:
+        """The encoded answer line to one request line."""
+        self.requests += 1
+        if len(line) > self.inline_bytes:
+            self.offloaded += 1
+            loop = asyncio.get_running_loop()
+            ok, data = await loop.run_in_executor(self.pool, _worker_answer, line)
+        else:
+            self.inline += 1
+            req: Request = {}
+            try:
+                req = _decode(line)
+                resp = await self.handle(req)
+            except Exception as e:  # reported to the client; the service keeps running
+                resp = error_response(e)
+            ok = resp["ok"]
+            data = encode_response(resp, req)
+        if not ok:
+            self.errors += 1
+        return data
+
+    async def serve_client(self, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+        """
+        Requests of one connection run concurrently, at most max_in_flight at
+        a time (reading waits for a slot); answers are written as they
+        complete, so clients match them up by "id".
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        def done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            in_flight.release()
+
+        async def send(data: bytes) -> None:
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+
+        async def respond(line: bytes) -> None:
+            await send(await self.answer(line))
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # longer than MAX_REQUEST; the stream cannot resync
+                    self.requests += 1
+                    self.errors += 1
+                    await send(encode_response(
+                        {"ok": False, "error": f"request longer than {MAX_REQUEST} bytes"}, {}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await in_flight.acquire()
+                    task = asyncio.create_task(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(done)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(service: ParseService, socket_path: Optional[Path] = None,
+                host: str = "127.0.0.1", port: int = 7070) -> None:
+    if socket_path is not None:
+        server = await asyncio.start_unix_server(service.serve_client, path=str(socket_path),
+                                                 limit=MAX_REQUEST)
+        where = str(socket_path)
+    else:
+        server = await asyncio.start_server(service.serve_client, host, port, limit=MAX_REQUEST)
+        where = f"{host}:{port}"
+
+    stop = asyncio.get_running_loop().create_future()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # a process group signal may arrive more than once
+        asyncio.get_running_loop().add_signal_handler(
+            sig, lambda: stop.done() or stop.set_result(None))
+    print(f"Serving on {where}", flush=True)
+    async with server:
+        await stop
+    if socket_path is not None:
+        Path(socket_path).unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="LL(1) parse service (JSON lines)")
+    where = arg_parser.add_mutually_exclusive_group()
+    where.add_argument("--socket", type=Path, help="listen on this Unix socket")
+    where.add_argument("--port", type=int, default=7070, help="listen on localhost:PORT")
+    arg_parser.add_argument("--workers", type=int, help="parse processes (default: CPU count)")
+    arg_parser.add_argument("--registry-size", type=int, default=REGISTRY_SIZE)
+    arg_parser.add_argument("--inline-bytes", type=int, default=INLINE_BYTES,
+                            help="answer requests up to this size on the event loop")
+    arg_parser.add_argument("--grammar-root", type=Path,
+                            help="directory \"grammar_path\" requests may read from "
+                                 "(default: grammar_path is refused)")
+    arg_parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                            help="requests of one connection answered concurrently")
+    args = arg_parser.parse_args()
+    if args.max_in_flight < 1:
+        arg_parser.error("--max-in-flight must be at least 1")
+
+    parse_service = ParseService(args.workers, args.registry_size, args.inline_bytes,
+                                 args.grammar_root, args.max_in_flight)
+    try:
+        asyncio.run(serve(parse_service, args.socket, port=args.port))
+    finally:
+        parse_service.close()